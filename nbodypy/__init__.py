@@ -1,8 +1,11 @@
+from .main.centre import *
+from .main.chunked import *
 from .main.cluster import *
 from .main.functions import *
 from .main.load import *
 from .main.operations import *
 from .main.orbit import *
+from .main.pipeline import *
 from .main.profiles import *
 from .main.initialize import *
 
@@ -14,6 +17,7 @@ from .util.coordinates import *
 from .util.output import *
 from .util.plots import *
 from .util.recipes import *
+from .util.table import *
 
 from .custom.custom_output import *
 from .custom.custom_functions import *
@@ -9,6 +9,8 @@ __author__ = "Jeremy Webb"
 
 import numpy as np
 
+from ..util.recipes import shrinking_sphere_centre
+
 
 #############################################################################
 # CODE
@@ -32,25 +34,22 @@ def def_dc(m, x, v=None, r_min=0.0045):
 
     """
     calc_vdc = v is not None
-    x_ = x.copy()
-    xdc = np.zeros(3)
-    vdc = np.zeros(3)
-    v_ = v.copy() if calc_vdc else None
-    r_lim = np.sqrt(np.max(np.sum(x ** 2, axis=1)))
-    num_iter = 0
-
-    while (r_lim > r_min) and (num_iter < 100):
-        ncm, mcm, xcm, vcm = cenmas_lim(m, x_, v_, r_lim)
-        if (mcm > 0) and (ncm > 100):
-            x_ -= xcm
-            xdc += xcm
-            if calc_vdc:
-                v_ -= vcm
-                vdc += vcm
-        else:
-            break
-        r_lim *= 0.8
-        num_iter += 1
+    x_ = np.asarray(x, dtype=float)
+    v_ = np.asarray(v, dtype=float) if calc_vdc else np.zeros(x_.shape)
+
+    # shrinking sphere with a single radial sort per recentering
+    xdc0, xdc1, xdc2, vdc0, vdc1, vdc2 = shrinking_sphere_centre(
+        np.asarray(m, dtype=float),
+        x_[:, 0],
+        x_[:, 1],
+        x_[:, 2],
+        v_[:, 0],
+        v_[:, 1],
+        v_[:, 2],
+        r_min,
+    )
+    xdc = np.array([xdc0, xdc1, xdc2])
+    vdc = np.array([vdc0, vdc1, vdc2])
 
     if calc_vdc:
         return xdc, vdc
@@ -8,6 +8,7 @@ import os
 
 from ..main.cluster import sub_cluster
 from ..util.coordinates import sky_coords
+from ..util.table import TableWriter
 from ..main.functions import *
 from ..main.profiles import *
 from ..main.operations import *
@@ -16,15 +17,12 @@ from ..observations.observations import *
 
 def p_prof_out(cluster, fileout, nrad=20, projected=False):
     # Write density profile (pprof.npy)
-    fileout.write("%f " % (cluster.tphys))
+    # (fileout can also be a TableWriter, in which case values are written as columns of the table)
     if cluster.rn == None or len(cluster.rn) != nrad:
         rn = rlagrange(cluster, nlagrange=nrad, projected=projected)
     mn = cluster.mtot / float(nrad)
     p_prof = []
 
-    for r in rn:
-        fileout.write("%f " % (r))
-
     for i in range(0, len(rn)):
         if i == 0:
             rmin = 0.0
@@ -36,7 +34,19 @@ def p_prof_out(cluster, fileout, nrad=20, projected=False):
             vol = 4.0 * np.pi * (rmax ** 3.0) / 3.0 - 4.0 * np.pi * (rmin ** 3.0) / 3.0
 
         p_prof.append(mn / vol)
-        fileout.write("%f " % (p_prof[-1]))
+
+    if isinstance(fileout, TableWriter):
+        fileout.declare_columns(["tphys", ("rn", nrad), ("pprof", nrad)])
+        fileout.write({"tphys": cluster.tphys, "rn": rn, "pprof": p_prof})
+        return
+
+    fileout.write("%f " % (cluster.tphys))
+
+    for r in rn:
+        fileout.write("%f " % (r))
+
+    for p in p_prof:
+        fileout.write("%f " % (p))
 
     fileout.write("\n")
 
@@ -51,13 +61,15 @@ def alpha_prof_out(
     kwmin=None,
     kwmax=None,
     projected=False,
+    nmass=10,
+    nrad=20,
 ):
     # Write alpha_profile and dalpha for a given mass and radius range (alpha_prof.npy)
     m_mean, m_hist, dm, alpha, ealpha, yalpha, eyalpha = mass_function(
         cluster,
         mmin=mmin,
         mmax=mmax,
-        nmass=10,
+        nmass=nmass,
         rmin=rmin,
         rmax=rmax,
         kwmin=kwmin,
@@ -68,12 +80,39 @@ def alpha_prof_out(
         cluster,
         mmin=mmin,
         mmax=mmax,
-        nmass=10,
+        nmass=nmass,
+        nrad=nrad,
         kwmin=kwmin,
         kwmax=kwmax,
         projected=projected,
     )
 
+    if isinstance(fileout, TableWriter):
+        # Profiles are given their largest length, as bins can be dropped
+        fileout.declare_columns(
+            ["tphys", "alpha", "ealpha", "yalpha", "eyalpha"]
+            + [("m_mean", nmass), ("dm", nmass), ("lrprofn", nrad), ("aprof", nrad)]
+            + ["dalpha", "edalpha", "ydalpha", "eydalpha"]
+        )
+        fileout.write(
+            {
+                "tphys": cluster.tphys,
+                "alpha": alpha,
+                "ealpha": ealpha,
+                "yalpha": yalpha,
+                "eyalpha": eyalpha,
+                "m_mean": m_mean,
+                "dm": dm,
+                "lrprofn": lrprofn,
+                "aprof": aprof,
+                "dalpha": dalpha,
+                "edalpha": edalpha,
+                "ydalpha": ydalpha,
+                "eydalpha": eydalpha,
+            }
+        )
+        return
+
     fileout.write("%f %f %f %f %f " % (cluster.tphys, alpha, ealpha, yalpha, eyalpha))
     for i in range(0, len(m_mean)):
         fileout.write("%f " % m_mean[i])
@@ -186,6 +225,46 @@ def obs_alpha_prof_out(
     print(alpha,aprof,dalpha,cluster.rm)
     print(mbincorr < 0.5)
 
+    if isinstance(fileout, TableWriter):
+        # Profiles are given their largest length, as bins can be dropped
+        try:
+            nrad = len(omask.r_mean)
+        except:
+            nrad = kwargs.get("nrad", 20)
+
+        fileout.declare_columns(
+            ["tphys", "mtot", "rm", "trh"]
+            + ["alpha50", "ealpha50", "yalpha50", "eyalpha50"]
+            + ["alpha", "ealpha", "yalpha", "eyalpha"]
+            + [("m_mean", nmass), ("dm", nmass), ("lrprofn", nrad), ("aprof", nrad)]
+            + ["dalpha", "edalpha", "ydalpha", "eydalpha"]
+        )
+        fileout.write(
+            {
+                "tphys": cluster.tphys,
+                "mtot": mtot,
+                "rm": rm,
+                "trh": trh,
+                "alpha50": alpha50,
+                "ealpha50": ealpha50,
+                "yalpha50": yalpha50,
+                "eyalpha50": eyalpha50,
+                "alpha": alpha,
+                "ealpha": ealpha,
+                "yalpha": yalpha,
+                "eyalpha": eyalpha,
+                "m_mean": m_mean,
+                "dm": dm,
+                "lrprofn": lrprofn,
+                "aprof": aprof,
+                "dalpha": dalpha,
+                "edalpha": edalpha,
+                "ydalpha": ydalpha,
+                "eydalpha": eydalpha,
+            }
+        )
+        return
+
     fileout.write("%f %f %f %f " % (cluster.tphys, mtot, rm, trh))
     fileout.write("%f %f %f %f " % (alpha50, ealpha50, yalpha50, eyalpha50))
     fileout.write("%f %f %f %f " % (alpha, ealpha, yalpha, eyalpha))
@@ -214,7 +293,7 @@ def dalpha_out(
 ):
     # Output alpha and dalpha for a range of values (dalpha_prof.npy)
 
-    fileout.write("%f %f " % (cluster.tphys, cluster.mtot))
+    alphas, dalphas, ydalphas = [], [], []
 
     for i in range(0, len(mmin)):
         m_mean, m_hist, dm, alpha, ealpha, yalpha, eyalpha = mass_function(
@@ -228,21 +307,65 @@ def dalpha_out(
             kwmax=kwmax,
             projected=projected,
         )
-        fileout.write("%f " % alpha)
+        alphas.append(alpha)
 
     for i in range(0, len(mmin)):
         lrprofn, aprof, da, eda, yda, eyda = alpha_prof(
             cluster, mmin=mmin[i], mmax=mmax[i], nmass=10, projected=projected
         )
+        dalphas.append(da)
+        ydalphas.append(yda)
+
+    if isinstance(fileout, TableWriter):
+        nm = len(mmin)
+        fileout.declare_columns(
+            ["tphys", "mtot", ("alpha", nm), ("dalpha", nm), ("ydalpha", nm), "rm"]
+        )
+        fileout.write(
+            {
+                "tphys": cluster.tphys,
+                "mtot": cluster.mtot,
+                "alpha": alphas,
+                "dalpha": dalphas,
+                "ydalpha": ydalphas,
+                "rm": cluster.rm,
+            }
+        )
+        return
+
+    fileout.write("%f %f " % (cluster.tphys, cluster.mtot))
+
+    for alpha in alphas:
+        fileout.write("%f " % alpha)
+
+    for da, yda in zip(dalphas, ydalphas):
         fileout.write("%f %f %f\n " % (da, yda, cluster.rm))
 
 
-def sigv_out(cluster, fileout, projected=False):
+def sigv_out(cluster, fileout, projected=False, nrad=20):
     # Output velocity dispersion profile and anisotropy profile (dvprof.npy)
 
-    fileout.write("%f %f " % (cluster.tphys, cluster.mtot))
+    lrprofn, sigvprof, betaprof = sigv_prof(cluster, nrad=nrad, projected=projected)
 
-    lrprofn, sigvprof, betaprof = sigv_prof(cluster, projected=projected)
+    if isinstance(fileout, TableWriter):
+        # Profiles are given their largest length, as bins can be dropped
+        fileout.declare_columns(
+            ["tphys", "mtot", ("lrprofn", nrad), ("sigvprof", nrad)]
+            + [("betaprof", nrad), "rm"]
+        )
+        fileout.write(
+            {
+                "tphys": cluster.tphys,
+                "mtot": cluster.mtot,
+                "lrprofn": lrprofn,
+                "sigvprof": sigvprof,
+                "betaprof": betaprof,
+                "rm": cluster.rm,
+            }
+        )
+        return
+
+    fileout.write("%f %f " % (cluster.tphys, cluster.mtot))
 
     for lr in lrprofn:
         fileout.write("%f " % lr)
@@ -264,6 +387,8 @@ def eta_prof_out(
     kwmin=0,
     kwmax=1,
     projected=False,
+    nmass=10,
+    nrad=20,
 ):
     # output eta profile (eta_prof.npy)
 
@@ -271,7 +396,7 @@ def eta_prof_out(
         cluster,
         mmin=mmin,
         mmax=mmax,
-        nmass=10,
+        nmass=nmass,
         rmin=rmin,
         rmax=rmax,
         kwmin=kwmin,
@@ -282,12 +407,39 @@ def eta_prof_out(
         cluster,
         mmin=mmin,
         mmax=mmax,
-        nmass=10,
+        nmass=nmass,
+        nrad=nrad,
         kwmin=kwmin,
         kwmax=kwmax,
         projected=projected,
     )
 
+    if isinstance(fileout, TableWriter):
+        # Profiles are given their largest length, as bins can be dropped
+        fileout.declare_columns(
+            ["tphys", "eta", "eeta", "yeta", "eyeta"]
+            + [("m_mean", nmass), ("sigvm", nmass), ("lrprofn", nrad), ("eprof", nrad)]
+            + ["deta", "edeta", "ydeta", "eydeta"]
+        )
+        fileout.write(
+            {
+                "tphys": cluster.tphys,
+                "eta": eta,
+                "eeta": eeta,
+                "yeta": yeta,
+                "eyeta": eyeta,
+                "m_mean": m_mean,
+                "sigvm": sigvm,
+                "lrprofn": lrprofn,
+                "eprof": eprof,
+                "deta": deta,
+                "edeta": edeta,
+                "ydeta": ydeta,
+                "eydeta": eydeta,
+            }
+        )
+        return
+
     fileout.write("%f %f %f %f %f " % (cluster.tphys, eta, eeta, yeta, eyeta))
     for i in range(0, len(m_mean)):
         fileout.write("%f " % m_mean[i])
@@ -314,7 +466,7 @@ def eta_out(
 ):
     # Output eta and deta for a range of values (deta_prof.npy)
 
-    fileout.write("%f %f " % (cluster.tphys, cluster.mtot))
+    etas, detas, ydetas = [], [], []
 
     for i in range(0, len(mmin)):
         m_mean, sigvm, eta, eeta, yeta, eyeta = eta_function(
@@ -328,7 +480,7 @@ def eta_out(
             kwmax=kwmax,
             projected=projected,
         )
-        fileout.write("%f " % eta)
+        etas.append(eta)
 
     for i in range(0, len(mmin)):
         lrprofn, eprof, deta, edeta, ydeta, eydeta = eta_prof(
@@ -340,15 +492,57 @@ def eta_out(
             kwmax=kwmax,
             projected=projected,
         )
-        fileout.write("%f %f %f\n " % deta, ydeta, cluster.rm)
+        detas.append(deta)
+        ydetas.append(ydeta)
+
+    if isinstance(fileout, TableWriter):
+        nm = len(mmin)
+        fileout.declare_columns(
+            ["tphys", "mtot", ("eta", nm), ("deta", nm), ("ydeta", nm), "rm"]
+        )
+        fileout.write(
+            {
+                "tphys": cluster.tphys,
+                "mtot": cluster.mtot,
+                "eta": etas,
+                "deta": detas,
+                "ydeta": ydetas,
+                "rm": cluster.rm,
+            }
+        )
+        return
+
+    fileout.write("%f %f " % (cluster.tphys, cluster.mtot))
+
+    for eta in etas:
+        fileout.write("%f " % eta)
+
+    for deta, ydeta in zip(detas, ydetas):
+        fileout.write("%f %f %f\n " % (deta, ydeta, cluster.rm))
 
 
-def v_out(cluster, fileout, coord=None, projected=False):
+def v_out(cluster, fileout, coord=None, projected=False, nrad=20):
     # Output mean velocity profile (vprof.npy)
 
-    fileout.write("%f %f " % (cluster.tphys, cluster.mtot))
+    lrprofn, vprof = v_prof(cluster, nrad=nrad, coord=coord, projected=projected)
 
-    lrprofn, vprof = v_prof(cluster, coord=coord, projected=projected)
+    if isinstance(fileout, TableWriter):
+        # Profiles are given their largest length, as bins can be dropped
+        fileout.declare_columns(
+            ["tphys", "mtot", ("lrprofn", nrad), ("vprof", nrad), "rm"]
+        )
+        fileout.write(
+            {
+                "tphys": cluster.tphys,
+                "mtot": cluster.mtot,
+                "lrprofn": lrprofn,
+                "vprof": vprof,
+                "rm": cluster.rm,
+            }
+        )
+        return
+
+    fileout.write("%f %f " % (cluster.tphys, cluster.mtot))
 
     for lr in lrprofn:
         fileout.write("%f " % lr)
@@ -4,12 +4,15 @@
 
 Routine Listings
 ----------------
+centre :
+chunked :
 cluster :
 functions :
 initialize :
 load :
 operations :
 orbit :
+pipeline :
 profiles :
 
 
@@ -22,22 +25,28 @@ __author__ = "Jeremy Webb"
 
 # import modules
 from . import (
+    centre as main_centre,
+    chunked as main_chunked,
     cluster as main_cluster,
     functions as main_functions,
     load as main_load,
     operations,
     orbit as main_orbit,
+    pipeline as main_pipeline,
     profiles as main_profiles,
     initialize as main_initialize,
 )
 
 # import functions
 
+from .centre import *
+from .chunked import *
 from .cluster import *
 from .functions import *
 from .load import *
 from .operations import *
 from .orbit import *
+from .pipeline import *
 from .profiles import *
 from .initialize import *
 
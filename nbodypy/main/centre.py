@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+
+"""Centre.
+
+Track the centre of a cluster across a series of snapshots
+
+"""
+
+__author__ = "Jeremy Webb"
+
+#############################################################################
+# IMPORTS
+
+import numpy as np
+
+
+#############################################################################
+# CODE
+
+
+class CentreTracker(object):
+    """
+    NAME:
+
+       CentreTracker
+
+    PURPOSE:
+
+       Carry the centre of a cluster from one snapshot to the next, so that find_centre only has to
+       search the neighbourhood of where the centre is expected to be
+       --> The expected centre is the previous centre moved by the previous centre velocity over the
+           time between snapshots
+       --> If too few stars are near the expected centre, or the centre found is not near it,
+           a full search of all stars is performed instead
+       --> A separate centre is kept for each combination of units and origin
+
+    INPUT:
+
+       rsearch - radius around the expected centre to search (default: None, set to twice the
+                 distance to the nsearch'th closest star after each search)
+
+       nsearch - number of stars used to set rsearch (default: 1000)
+
+       nmin - minimum number of stars needed within rsearch for a local search (default: 100)
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+
+    def __init__(self, rsearch=None, nsearch=1000, nmin=100):
+
+        self.rsearch = rsearch
+        self.nsearch = nsearch
+        self.nmin = nmin
+
+        # Centres of previous snapshots, keyed by (units,origin)
+        self.centres = {}
+
+        # Number of local and global searches performed
+        self.nlocal = 0
+        self.nglobal = 0
+
+    def reset(self):
+        """
+        NAME:
+
+           reset
+
+        PURPOSE:
+
+           Forget all previous centres, so the next search is a full one
+
+        INPUT:
+
+           None
+
+        OUTPUT:
+
+           None
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        self.centres = {}
+
+    def predict(self, cluster):
+        """
+        NAME:
+
+           predict
+
+        PURPOSE:
+
+           Find the expected centre of a cluster from the centre of the previous snapshot
+
+        INPUT:
+
+           cluster - StarCluster instance
+
+        OUTPUT:
+
+           xc,yc,zc,vxc,vyc,vzc,rsearch (None if there is no previous centre)
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        key = (cluster.units, cluster.origin)
+
+        if key not in self.centres:
+            return None
+
+        tphys, xc, yc, zc, vxc, vyc, vzc, rsearch = self.centres[key]
+
+        # Convert velocities to distance per unit time
+        if cluster.units == "realpc":
+            # pc/Myr per km/s
+            vfac = 1.022712165
+        elif cluster.units == "realkpc":
+            # kpc/Myr per km/s
+            vfac = 1.022712165e-3
+        elif cluster.units == "nbody" or cluster.units == "galpy":
+            vfac = 1.0
+        else:
+            vfac = 0.0
+
+        dt = cluster.tphys - tphys
+
+        return (
+            xc + vfac * vxc * dt,
+            yc + vfac * vyc * dt,
+            zc + vfac * vzc * dt,
+            vxc,
+            vyc,
+            vzc,
+            rsearch,
+        )
+
+    def find_centre(self, cluster, **kwargs):
+        """
+        NAME:
+
+           find_centre
+
+        PURPOSE:
+
+           Find the centre of a cluster, starting from the expected centre if a previous
+           centre is known
+
+        INPUT:
+
+           cluster - StarCluster instance
+
+        KWARGS:
+
+           same as StarCluster.find_centre
+
+        OUTPUT:
+
+           None
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        kwargs["track"] = False
+        prediction = self.predict(cluster)
+        found = False
+
+        if prediction is not None:
+            xp, yp, zp, vxp, vyp, vzp, rsearch = prediction
+
+            rp = np.sqrt(
+                (cluster.x - xp) ** 2.0 + (cluster.y - yp) ** 2.0 + (cluster.z - zp) ** 2.0
+            )
+            indx = rp < rsearch
+            if kwargs.get("indx", None) is not None:
+                indx *= kwargs["indx"]
+
+            if np.sum(indx) > self.nmin:
+                local_kwargs = kwargs.copy()
+                local_kwargs.update(
+                    {
+                        "xstart": xp,
+                        "ystart": yp,
+                        "zstart": zp,
+                        "vxstart": vxp,
+                        "vystart": vyp,
+                        "vzstart": vzp,
+                        "indx": indx,
+                    }
+                )
+                cluster.find_centre(**local_kwargs)
+                xc, yc, zc = self.get_centre(cluster)[:3]
+
+                # The search has converged if the centre is well within the searched region
+                dr = np.sqrt((xc - xp) ** 2.0 + (yc - yp) ** 2.0 + (zc - zp) ** 2.0)
+                found = dr < 0.5 * rsearch
+
+        if found:
+            self.nlocal += 1
+        else:
+            cluster.find_centre(**kwargs)
+            self.nglobal += 1
+
+        self.update(cluster)
+
+    def get_centre(self, cluster):
+        """
+        NAME:
+
+           get_centre
+
+        PURPOSE:
+
+           Get the centre of a cluster in its current origin
+
+        INPUT:
+
+           cluster - StarCluster instance
+
+        OUTPUT:
+
+           xc,yc,zc,vxc,vyc,vzc
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        if cluster.origin == "galaxy" or cluster.origin == "sky":
+            return (
+                cluster.xgc,
+                cluster.ygc,
+                cluster.zgc,
+                cluster.vxgc,
+                cluster.vygc,
+                cluster.vzgc,
+            )
+        else:
+            return cluster.xc, cluster.yc, cluster.zc, cluster.vxc, cluster.vyc, cluster.vzc
+
+    def update(self, cluster):
+        """
+        NAME:
+
+           update
+
+        PURPOSE:
+
+           Store the current centre of a cluster for use with the next snapshot
+
+        INPUT:
+
+           cluster - StarCluster instance
+
+        OUTPUT:
+
+           None
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        xc, yc, zc, vxc, vyc, vzc = self.get_centre(cluster)
+
+        if self.rsearch is not None:
+            rsearch = self.rsearch
+        else:
+            r = np.sqrt(
+                (cluster.x - xc) ** 2.0 + (cluster.y - yc) ** 2.0 + (cluster.z - zc) ** 2.0
+            )
+            nsearch = min(self.nsearch, len(r) - 1)
+            rsearch = 2.0 * np.partition(r, nsearch)[nsearch]
+
+        self.centres[(cluster.units, cluster.origin)] = (
+            cluster.tphys,
+            xc,
+            yc,
+            zc,
+            vxc,
+            vyc,
+            vzc,
+            rsearch,
+        )
+
+
+#############################################################################
+# END
@@ -0,0 +1,535 @@
+# -*- coding: utf-8 -*-
+
+"""Chunked.
+
+Measure profiles, mass functions and lagrange radii of clusters that do not fit in memory,
+reading their stars in blocks
+
+"""
+
+__author__ = "Jeremy Webb"
+
+#############################################################################
+# IMPORTS
+
+import numpy as np
+
+from ..util.recipes import bin_index
+
+
+#############################################################################
+# CODE
+
+
+def iter_chunks(cluster, chunksize=1000000, origin=None, projected=False):
+    """
+    NAME:
+
+       iter_chunks
+
+    PURPOSE:
+
+       Step through the stars of a cluster in blocks of chunksize stars
+       --> Only one block of stars is read and converted at a time, so clusters whose arrays are
+           memory-mapped (e.g. load_cluster('npy',do_key_params=False)) never need to fit in memory
+       --> Positions and velocities are shifted to the origin and scaled to the units of the view
+           block by block, exactly as StarCluster.view does for all stars at once
+
+    INPUT:
+
+       cluster - StarCluster instance
+
+       chunksize - number of stars in each block (default: 1000000)
+
+       origin - origin to measure positions and velocities from (default: None, origin of the cluster)
+
+       projected - r and v are projected radii and velocities (default: False)
+
+    OUTPUT:
+
+       generator of dictionaries with the slice of stars in the block ("indx") and their
+       m, r, v, id and kw (and etot, if energies have been calculated)
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    view = cluster.view(origin=origin)
+
+    # A view converts the phase space buffer of the viewed cluster with a shift and scaling
+    if hasattr(view, "shift"):
+        base, shift, scale = view.cluster, view.shift, view.scale
+    else:
+        base, shift, scale = view, np.zeros(7), np.ones(7)
+
+    ntot = len(base.phase)
+    has_etot = len(base.etot) == ntot
+
+    for start in range(0, ntot, chunksize):
+        stop = min(start + chunksize, ntot)
+        phase = (np.asarray(base.phase[start:stop]) + shift) * scale
+
+        if projected:
+            r = np.sqrt(phase[:, 0] ** 2.0 + phase[:, 1] ** 2.0)
+            v = np.sqrt(phase[:, 4] ** 2.0 + phase[:, 5] ** 2.0)
+        else:
+            r = np.sqrt(phase[:, 0] ** 2.0 + phase[:, 1] ** 2.0 + phase[:, 2] ** 2.0)
+            v = np.sqrt(phase[:, 4] ** 2.0 + phase[:, 5] ** 2.0 + phase[:, 6] ** 2.0)
+
+        chunk = {
+            "indx": slice(start, stop),
+            "m": phase[:, 3],
+            "r": r,
+            "v": v,
+            "id": np.asarray(base.id[start:stop]),
+            "kw": np.asarray(base.kw[start:stop]),
+        }
+        if has_etot:
+            chunk["etot"] = np.asarray(base.etot[start:stop])
+
+        yield chunk
+
+
+def chunk_mask(
+    chunk,
+    mmin=None,
+    mmax=None,
+    rmin=None,
+    rmax=None,
+    vmin=None,
+    vmax=None,
+    emin=None,
+    emax=None,
+    kwmin=None,
+    kwmax=None,
+    indx=None,
+):
+    """
+    NAME:
+
+       chunk_mask
+
+    PURPOSE:
+
+       Select the stars of a block (see iter_chunks) within given ranges
+       --> Ranges that are None are not applied
+
+    INPUT:
+
+       chunk - block of stars from iter_chunks
+
+       mmin/mmax,rmin/rmax,vmin/vmax,emin/emax,kwmin/kwmax - ranges of stellar mass, radius,
+                                                             velocity, energy and type (kw)
+
+       indx - user defined boolean array of all stars in the cluster from which to extract the subset
+
+    OUTPUT:
+
+       boolean array of the stars in the block that are selected
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    if indx is None:
+        mask = chunk["id"] > -1
+    else:
+        mask = np.array(indx[chunk["indx"]], dtype=bool)
+
+    for name, lower, upper in [
+        ("m", mmin, mmax),
+        ("r", rmin, rmax),
+        ("v", vmin, vmax),
+        ("etot", emin, emax),
+        ("kw", kwmin, kwmax),
+    ]:
+        if lower is not None:
+            mask &= chunk[name] >= lower
+        if upper is not None:
+            mask &= chunk[name] <= upper
+
+    return mask
+
+
+def chunked_order_statistics(chunks, ranks, weights=False, nbin=1024, nmax=1000000):
+    """
+    NAME:
+
+       chunked_order_statistics
+
+    PURPOSE:
+
+       Find the values at given positions of a sorted array that is only available in blocks
+       --> Each pass through the blocks adds up histograms of the values, which are merged to find
+           the bin holding each position. Bins are split again until they hold fewer than nmax values,
+           which are then sorted to find the exact value at each position
+       --> With weights, positions are cumulative weights, and the value returned is the first value
+           (in sorted order) at which the cumulative weight reaches the position
+
+    INPUT:
+
+       chunks - function that returns an iterator of blocks of values
+                (or of (values,weights) if weights is True)
+
+       ranks - positions in the sorted array (indices starting at 0, or cumulative weights)
+
+       weights - values are weighted (default: False)
+
+       nbin - number of histogram bins in each pass (default: 1024)
+
+       nmax - largest number of values sorted at once (default: 1000000)
+
+    OUTPUT:
+
+       array of values at each position (the largest value for cumulative weights that are never reached)
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    ranks = np.asarray(ranks, dtype=float)
+
+    def blocks():
+        for chunk in chunks():
+            if weights:
+                x, w = chunk
+                yield np.asarray(x, dtype=float), np.asarray(w, dtype=float)
+            else:
+                x = np.asarray(chunk, dtype=float)
+                yield x, np.ones(len(x))
+
+    def in_bins(x, bins):
+        mask = np.ones(len(x), dtype=bool)
+        for lower, upper, n, b in bins:
+            mask &= bin_number(x, lower, upper, n) == b
+        return mask
+
+    # First pass - range and number of all values
+    xmin, xmax, ntot = np.inf, -np.inf, 0
+    for x, w in blocks():
+        if len(x) > 0:
+            xmin = min(xmin, np.min(x))
+            xmax = max(xmax, np.max(x))
+            ntot += len(x)
+
+    result = np.full(len(ranks), xmax)
+
+    if ntot == 0:
+        return result
+
+    # Each search keeps the bins (lower,upper,nbin,bin) its values fall in, the range used to split them
+    # next, the number of values in them, and the weight of all values that come before them
+    searches = dict([(i, ([], xmin, xmax, ntot, 0.0)) for i in range(0, len(ranks))])
+
+    while len(searches) > 0:
+        # Values in bins small enough to sort are collected, once for searches that share bins
+        small = [i for i in searches if searches[i][3] <= nmax]
+        if len(small) > 0:
+            collected = dict([(tuple(searches[i][0]), ([], [])) for i in small])
+            for x, w in blocks():
+                for key in collected:
+                    mask = in_bins(x, key)
+                    collected[key][0].append(x[mask])
+                    collected[key][1].append(w[mask])
+
+            for key in collected:
+                x = np.concatenate(collected[key][0])
+                w = np.concatenate(collected[key][1])
+                order = np.argsort(x, kind="stable")
+                collected[key] = (x[order], np.cumsum(w[order]))
+
+            for i in small:
+                bins, lower, upper, n, wbefore = searches.pop(i)
+                x, wcum = collected[tuple(bins)]
+                j = np.searchsorted(wcum + wbefore, ranks[i], side="left" if weights else "right")
+                if j < len(x):
+                    result[i] = x[j]
+
+        if len(searches) == 0:
+            break
+
+        # Split the bins of the remaining searches, with one pass through the blocks
+        hists = {}
+        for i in searches:
+            bins, lower, upper, n, wbefore = searches[i]
+            hists[tuple(bins)] = (lower, upper, np.zeros(nbin), np.zeros(nbin), [np.inf, -np.inf])
+
+        for x, w in blocks():
+            for key in hists:
+                lower, upper, nhist, whist, xrange = hists[key]
+                mask = in_bins(x, key)
+                if np.any(mask):
+                    b = bin_number(x[mask], lower, upper, nbin)
+                    nhist += np.bincount(b, minlength=nbin)
+                    whist += np.bincount(b, weights=w[mask], minlength=nbin)
+                    xrange[0] = min(xrange[0], np.min(x[mask]))
+                    xrange[1] = max(xrange[1], np.max(x[mask]))
+
+        for i in list(searches.keys()):
+            bins, lower, upper, n, wbefore = searches[i]
+            lower, upper, nhist, whist, xrange = hists[tuple(bins)]
+            wcum = wbefore + np.cumsum(whist)
+            b = np.searchsorted(wcum, ranks[i], side="left" if weights else "right")
+
+            if b >= nbin:
+                # Cumulative weight is never reached
+                del searches[i]
+            elif xrange[0] == xrange[1]:
+                # All values in the bins are the same
+                result[i] = xrange[0]
+                del searches[i]
+            else:
+                searches[i] = (
+                    bins + [(lower, upper, nbin, b)],
+                    lower + (upper - lower) * float(b) / float(nbin),
+                    lower + (upper - lower) * float(b + 1) / float(nbin),
+                    int(nhist[b]),
+                    wcum[b] - whist[b],
+                )
+
+    return result
+
+
+def bin_number(x, lower, upper, nbin):
+    """
+    NAME:
+
+       bin_number
+
+    PURPOSE:
+
+       Find which of nbin equal width bins between lower and upper values fall in
+       (values equal to upper are in the last bin)
+
+    INPUT:
+
+       x - values
+
+       lower,upper - range of the bins
+
+       nbin - number of bins
+
+    OUTPUT:
+
+       array of bin numbers
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    if upper == lower:
+        return np.zeros(len(x), dtype=int)
+
+    b = np.floor((np.asarray(x) - lower) / (upper - lower) * nbin).astype(int)
+
+    return np.clip(b, 0, nbin - 1)
+
+
+def chunked_nbinmaker(chunks, nbin=10):
+    """
+    NAME:
+
+       chunked_nbinmaker
+
+    PURPOSE:
+
+       Split values that are only available in blocks into nbin bins of equal number elements
+       --> Bins are the same as those of nbinmaker for all values at once
+
+    INPUT:
+
+       chunks - function that returns an iterator of blocks of values
+
+       nbin - number of bins
+
+    OUTPUT:
+
+       x_lower,x_mid,x_upper,x_hist
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    ntot = 0
+    for x in chunks():
+        ntot += len(x)
+
+    if ntot == 0:
+        return np.array([]), np.array([]), np.array([]), np.array([])
+
+    lower_ranks = [int(float(i) * float(ntot) / float(nbin)) for i in range(0, nbin)]
+    upper_ranks = [
+        int(float(i + 1) * float(ntot) / float(nbin)) - 1 for i in range(0, nbin)
+    ]
+
+    values = chunked_order_statistics(chunks, lower_ranks + upper_ranks)
+    x_lower, x_upper = values[:nbin], values[nbin:]
+
+    indx = x_lower != x_upper
+    x_lower = x_lower[indx]
+    x_upper = x_upper[indx]
+
+    x_hist, x_sum = chunked_bin_sums(((x, x) for x in chunks()), x_lower, x_upper)
+
+    return x_lower, x_sum / x_hist, x_upper, x_hist
+
+
+def chunked_bin_sums(chunks, x_lower, x_upper, cumulative=False):
+    """
+    NAME:
+
+       chunked_bin_sums
+
+    PURPOSE:
+
+       Add up the number of values in bins, and the sum of their weights, one block at a time
+
+    INPUT:
+
+       chunks - iterator of blocks of (values,weights)
+
+       x_lower,x_upper - bins, which hold values with x_lower <= x < x_upper (x_lower must be increasing
+                         and bins must not overlap)
+
+       cumulative - bins hold all values with x < x_upper instead (default: False)
+
+    OUTPUT:
+
+       x_hist,w_sum
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    nbin = len(x_lower)
+    x_hist = np.zeros(nbin)
+    w_sum = np.zeros(nbin)
+
+    for x, w in chunks:
+        if cumulative:
+            # Values are in every bin whose upper edge is above them
+            b = np.searchsorted(x_upper, x, side="right")
+            indx = b < nbin
+            x_hist += np.cumsum(np.bincount(b[indx], minlength=nbin))
+            w_sum += np.cumsum(np.bincount(b[indx], weights=w[indx], minlength=nbin))
+        else:
+            b = bin_index(x, x_lower, x_upper)
+            indx = b >= 0
+            x_hist += np.bincount(b[indx], minlength=nbin)
+            w_sum += np.bincount(b[indx], weights=w[indx], minlength=nbin)
+
+    return x_hist, w_sum
+
+
+def chunked_radial_bins(
+    cluster,
+    chunksize,
+    nrad,
+    mmin=None,
+    mmax=None,
+    rmin=None,
+    rmax=None,
+    vmin=None,
+    vmax=None,
+    emin=None,
+    emax=None,
+    kwmin=0,
+    kwmax=15,
+    indx=None,
+    projected=False,
+    cumulative=False,
+):
+    """
+    NAME:
+
+       chunked_radial_bins
+
+    PURPOSE:
+
+       Find radial bins with equal numbers of stars, and the number and mass of stars in each,
+       reading the stars of the cluster in blocks (see rho_prof and m_prof)
+
+    INPUT:
+
+       cluster - StarCluster instance
+
+       chunksize - number of stars in each block
+
+       nrad - number of radial bins
+
+       mmin/mmax,rmin/rmax,vmin/vmax,emin/emax,kwmin/kwmax,indx,projected - same as rho_prof
+
+       cumulative - the number and mass of stars are those of all stars inside each bin (default: False)
+
+    OUTPUT:
+
+       r_lower,r_mean,r_upper,n_sum,m_sum
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+
+    def chunks():
+        for chunk in iter_chunks(cluster, chunksize, origin="centre", projected=projected):
+            mask = chunk_mask(
+                chunk, mmin, mmax, rmin, rmax, vmin, vmax, emin, emax, kwmin, kwmax, indx
+            )
+            yield chunk["r"][mask], chunk["m"][mask]
+
+    r_lower, r_mean, r_upper, r_hist = chunked_nbinmaker(
+        lambda: (r for r, m in chunks()), nrad
+    )
+    n_sum, m_sum = chunked_bin_sums(chunks(), r_lower, r_upper, cumulative=cumulative)
+
+    return r_lower, r_mean, r_upper, n_sum, m_sum
+
+
+def chunked_rlagrange(cluster, chunksize, nlagrange=10, projected=False):
+    """
+    NAME:
+
+       chunked_rlagrange
+
+    PURPOSE:
+
+       Calculate lagrange radii of the cluster by mass, reading its stars in blocks (see rlagrange)
+
+    INPUT:
+
+       cluster - StarCluster instance
+
+       chunksize - number of stars in each block
+
+       nlagrange - number of lagrange radii bins (default: 10)
+
+       projected - calculate projected lagrange radii (default: False)
+
+    OUTPUT:
+
+       rn
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+
+    def chunks():
+        for chunk in iter_chunks(cluster, chunksize, origin="centre", projected=projected):
+            yield chunk["r"], chunk["m"]
+
+    mtot = 0.0
+    for r, m in chunks():
+        mtot += np.sum(m)
+
+    mfrac = [mtot * float(nfrac) / float(nlagrange) for nfrac in range(1, nlagrange + 1)]
+
+    return list(chunked_order_statistics(chunks, mfrac, weights=True))
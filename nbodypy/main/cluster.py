@@ -11,7 +11,8 @@ from galpy.potential import MWPotential2014
 from .orbit import rtidal, rlimiting, initialize_orbit, calc_actions
 from .functions import *
 from .profiles import *
-from copy import copy
+from copy import copy, deepcopy
+from scipy.spatial import cKDTree
 
 
 class TestDocStringCluster(object):
@@ -102,6 +103,99 @@ class TestDocStringCluster(object):
         return ntot
 
 
+def derived_property(name, calc):
+    """
+    NAME:
+
+       derived_property
+
+    PURPOSE:
+
+       Make a StarCluster property that is calculated by the method calc when it is first needed.
+       The value is stored in StarCluster.derived until the quantities it depends on change
+       (see StarCluster.derived_dependencies). Setting the property stores the given value instead.
+
+    INPUT:
+
+       name - name of the property
+
+       calc - name of the StarCluster method that calculates the property
+
+    OUTPUT:
+
+       property
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+
+    def fget(self):
+        if name not in self.derived:
+            getattr(self, calc)()
+        return self.derived[name]
+
+    def fset(self, value):
+        self.derived[name] = value
+
+    return property(fget, fset)
+
+
+def phase_column(column):
+    """
+    NAME:
+
+       phase_column
+
+    PURPOSE:
+
+       Make a StarCluster property for one column of the phase space buffer StarCluster.phase
+       --> Getting the property returns a view of the column, so no data is copied
+       --> Setting the property copies the given values into the column. If the number of values differs
+           from the number of rows, the buffer is resized first (keeping the rows it already had),
+           so that all arrays can still be replaced one at a time
+
+    INPUT:
+
+       column - column of the buffer
+
+    OUTPUT:
+
+       property
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+
+    def fget(self):
+        return self.phase[:, column]
+
+    def fset(self, value):
+        phase = self.phase
+        value = np.asarray(value)
+
+        if value.ndim > 0 and len(value) != len(phase):
+            new_phase = np.zeros((len(value), phase.shape[1]))
+            nrow = min(len(value), len(phase))
+            new_phase[:nrow] = phase[:nrow]
+            self.phase = new_phase
+            phase = self.phase
+
+        current = phase[:, column]
+
+        # In place operations (cluster.x*=...) set the column to itself
+        if (
+            value.ctypes.data != current.ctypes.data
+            or value.strides != current.strides
+        ):
+            current[:] = value
+
+    return property(fget, fset)
+
+
 class StarCluster(object):
     r"""A class that represents a star cluster population that functions can be performed on
 
@@ -168,6 +262,8 @@ class StarCluster(object):
         id : star id
         x,y,z: position of stars
         vx,vy,vz: velocity of stars
+        m : mass of stars
+        phase : (ntot,7) array with columns x,y,z,m,vx,vy,vz, which x,y,z,m,vx,vy,vz are views of
         kw : stellar type of stars
         zmbar : scaling from N-body masses to solar masses
         rbar : scaling from N-body units to parsecs
@@ -219,13 +315,150 @@ class StarCluster(object):
     >>> cluster=Starcluster(units='realpc',origin='cluster',ctype='snapshot')
     >>> cluster.add_stars(x,y,z,vx,vy,vz,m,id)
     >>> print(cluster.rm)
-    10.0
+        10.0
     """
-    
+
+    # Derived quantities that are no longer valid when a given attribute changes
+    derived_dependencies = {
+        "x": (
+            "r",
+            "rpro",
+            "rorder",
+            "rproorder",
+            "kdtree",
+            "kdtree_pro",
+            "rho_local",
+            "views",
+        ),
+        "y": (
+            "r",
+            "rpro",
+            "rorder",
+            "rproorder",
+            "kdtree",
+            "kdtree_pro",
+            "rho_local",
+            "views",
+        ),
+        "z": ("r", "rorder", "kdtree", "rho_local", "views"),
+        "vx": ("v", "vpro", "views"),
+        "vy": ("v", "vpro", "views"),
+        "vz": ("v", "views"),
+        "m": ("mtot", "mmean", "rm", "r10", "rmpro", "r10pro", "rho_local", "views"),
+        "lum": ("rh", "rh10", "rhpro", "rh10pro", "views"),
+        "units": ("r", "rpro", "v", "vpro", "rorder", "rproorder", "views"),
+        "projected": ("rmpro", "r10pro", "rhpro", "rh10pro", "views"),
+        "phase": (
+            "r",
+            "rpro",
+            "v",
+            "vpro",
+            "rorder",
+            "rproorder",
+            "mtot",
+            "mmean",
+            "kdtree",
+            "kdtree_pro",
+            "rho_local",
+            "views",
+        ),
+        # Views of the cluster (see view) also depend on its origin, centre, and nbody scaling
+        "origin": ("views",),
+        "xc": ("views",),
+        "yc": ("views",),
+        "zc": ("views",),
+        "vxc": ("views",),
+        "vyc": ("views",),
+        "vzc": ("views",),
+        "xgc": ("views",),
+        "ygc": ("views",),
+        "zgc": ("views",),
+        "vxgc": ("views",),
+        "vygc": ("views",),
+        "vzgc": ("views",),
+        "rbar": ("views",),
+        "vstar": ("views",),
+        "zmbar": ("views",),
+    }
+
+    # Key parameters, which depend on stellar positions as well
+    key_names = (
+        "rmean",
+        "rmax",
+        "rm",
+        "r10",
+        "rmpro",
+        "r10pro",
+        "rh",
+        "rh10",
+        "rhpro",
+        "rh10pro",
+    )
+
+    r = derived_property("r", "calc_r")
+    rpro = derived_property("rpro", "calc_r")
+    v = derived_property("v", "calc_v")
+    vpro = derived_property("vpro", "calc_v")
+    rorder = derived_property("rorder", "calc_rorder")
+    rproorder = derived_property("rproorder", "calc_rproorder")
+    mtot = derived_property("mtot", "calc_mass_params")
+    mmean = derived_property("mmean", "calc_mass_params")
+    rmean = derived_property("rmean", "calc_radius_params")
+    rmax = derived_property("rmax", "calc_radius_params")
+    rm = derived_property("rm", "calc_mass_radii")
+    r10 = derived_property("r10", "calc_mass_radii")
+    rmpro = derived_property("rmpro", "calc_mass_radii_pro")
+    r10pro = derived_property("r10pro", "calc_mass_radii_pro")
+    rh = derived_property("rh", "calc_light_radii")
+    rh10 = derived_property("rh10", "calc_light_radii")
+    rhpro = derived_property("rhpro", "calc_light_radii_pro")
+    rh10pro = derived_property("rh10pro", "calc_light_radii_pro")
+
+    # Arrays with one entry per star or binary, kept in buffers with room to grow (see append_rows)
+    star_names = ("phase", "id", "kw")
+    se_names = ("logl", "logr", "lum", "ep", "ospin")
+    energy_names = ("kin", "pot", "etot")
+    bse_names = (
+        "id1",
+        "id2",
+        "kw1",
+        "kw2",
+        "kcm",
+        "ecc",
+        "pb",
+        "semi",
+        "m1",
+        "m2",
+        "logl1",
+        "logl2",
+        "logr1",
+        "logr2",
+        "ep1",
+        "ep2",
+        "ospin1",
+        "ospin2",
+        "eb",
+    )
+
+    # Columns of the phase space buffer (masses are next to positions, as needed by the numba kernels)
+    x = phase_column(0)
+    y = phase_column(1)
+    z = phase_column(2)
+    m = phase_column(3)
+    vx = phase_column(4)
+    vy = phase_column(5)
+    vz = phase_column(6)
+
     def __init__(
         self, ntot=0, tphys=0.0, units=None, origin=None, ctype="snapshot", **kwargs
     ):
 
+        # Derived quantities (r,v,rorder,key parameters,...) calculated when first needed
+        self.derived = {}
+
+        # Storage behind arrays that stars are added to (see append_rows)
+        self.buffers = {}
+
         # Total Number of Stars + Binaries in the cluster
         self.ntot = ntot
         self.nb = 0
@@ -248,16 +481,14 @@ class StarCluster(object):
         self.bfile = kwargs.get("bfile", "")
         self.projected = kwargs.get("projected", True)
         self.centre_method = kwargs.get("centre_method", None)
+        self.centre_tracker = kwargs.get("centre_tracker", None)
+        self.prefetcher = kwargs.get("prefetcher", None)
+        self.columns = kwargs.get("columns", None)
+        self.where = kwargs.get("where", None)
 
-        # Initial arrays
+        # Initial arrays (positions, masses, and velocities are stored together in phase)
         self.id = np.array([])
-        self.m = np.array([])
-        self.x = np.array([])
-        self.y = np.array([])
-        self.z = np.array([])
-        self.vx = np.array([])
-        self.vy = np.array([])
-        self.vz = np.array([])
+        self.phase = np.zeros((0, 7))
         self.kw = np.array([])
 
         self.zmbar = 1.0
@@ -330,13 +561,9 @@ class StarCluster(object):
 
         # Lagrange Radii,limiting radius, tidal radius, and virial radius
         self.rn = None
-        self.r10 = None
-        self.rm = None
         self.rl = None
         self.rt = None
         self.rv = None
-        self.rorder = None
-        self.rproorder = None
 
         # Additional Parameters
         self.trh = None
@@ -347,6 +574,161 @@ class StarCluster(object):
         self.units = units
         self.origin = origin
 
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+
+        # Forget derived quantities that depend on the attribute that was just set
+        if name in self.derived_dependencies:
+            for dname in self.derived_dependencies[name]:
+                self.derived.pop(dname, None)
+            if name in ["x", "y", "z", "phase"]:
+                for dname in self.key_names:
+                    self.derived.pop(dname, None)
+
+    def __getstate__(self):
+        # Copies get their own buffers when stars are next added, rather than sharing (or copying) these
+        state = self.__dict__.copy()
+        if "buffers" in state:
+            state["buffers"] = {}
+        return state
+
+    def append_rows(self, name, values, start=None, truncate=True):
+        """
+        NAME:
+
+           append_rows
+
+        PURPOSE:
+
+           Write rows into an array of the cluster, starting at row start
+           --> The array is a view of a larger buffer (self.buffers[name]), so rows can be added without
+               copying the rows already present. When the buffer is full its capacity is doubled,
+               so adding stars in chunks takes linear time
+           --> If the array has been set directly (not through append_rows), a new buffer is started
+
+        INPUT:
+
+           name - name of the array (e.g. 'phase','id','kw','logl')
+
+           values - rows to be written
+
+           start - row where values are written (default: None, the end of the array)
+
+           truncate - remove any rows after the ones written (default: True)
+
+        OUTPUT:
+
+           None
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        values = np.atleast_1d(np.asarray(values))
+        current = np.asarray(getattr(self, name, np.asarray([])))
+        buffer = self.buffers.get(name, None)
+
+        if start is None:
+            start = len(current)
+        end = start + len(values)
+
+        if truncate:
+            nrows = end
+        else:
+            nrows = max(end, len(current))
+
+        if truncate:
+            nkeep = min(start, len(current))
+        else:
+            nkeep = len(current)
+
+        owned = buffer is not None and (current.base is buffer or current is buffer)
+
+        # Rows that are kept (and reserved buffers) set the type along with the new ones
+        dtypes = [values.dtype]
+        if nkeep > 0:
+            dtypes.append(current.dtype)
+        if owned:
+            dtypes.append(buffer.dtype)
+        dtype = np.result_type(*dtypes)
+
+        if (
+            not owned
+            or nrows > len(buffer)
+            or dtype != buffer.dtype
+            or values.shape[1:] != buffer.shape[1:]
+        ):
+            if owned:
+                capacity = max(nrows, 2 * len(buffer))
+            else:
+                capacity = nrows
+
+            new_buffer = np.zeros((capacity,) + values.shape[1:], dtype=dtype)
+            if nkeep > 0 and current.shape[1:] == values.shape[1:]:
+                new_buffer[:nkeep] = current[:nkeep]
+            buffer = new_buffer
+            self.buffers[name] = buffer
+
+        buffer[start:end] = values
+        setattr(self, name, buffer[:nrows])
+
+    def reserve(self, n, nb=0):
+        """
+        NAME:
+
+           reserve
+
+        PURPOSE:
+
+           Make room for n stars and nb binaries, so they can be added in chunks (with add_stars, add_se,
+           add_energies and add_bse) without the arrays being copied as they grow
+
+        INPUT:
+
+           n - total number of stars that will be in the cluster
+
+           nb - total number of binaries that will be in the cluster (default: 0)
+
+        OUTPUT:
+
+           None
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        for names, nrows in [
+            (self.star_names + self.se_names + self.energy_names, n),
+            (self.bse_names, nb),
+        ]:
+            for name in names:
+                current = np.asarray(getattr(self, name, np.asarray([])))
+                buffer = self.buffers.get(name, None)
+                owned = buffer is not None and (current.base is buffer or current is buffer)
+
+                if owned and len(buffer) >= nrows:
+                    continue
+
+                if name == "phase":
+                    shape = (max(nrows, len(current)), 7)
+                else:
+                    shape = (max(nrows, len(current)),)
+
+                if len(current) > 0:
+                    dtype = current.dtype
+                elif name in ["id", "kw", "id1", "id2", "kw1", "kw2", "kcm"]:
+                    dtype = int
+                else:
+                    dtype = float
+
+                buffer = np.zeros(shape, dtype=dtype)
+                if current.shape[1:] == shape[1:]:
+                    buffer[: len(current)] = current
+                self.buffers[name] = buffer
+                setattr(self, name, buffer[: len(current)])
+
     def add_nbody6(
         self,
         nc=0,
@@ -472,65 +854,31 @@ class StarCluster(object):
 
         """
 
-        self.x = np.append(self.x, np.asarray(x))
-        self.y = np.append(self.y, np.asarray(y))
-        self.z = np.append(self.z, np.asarray(z))
-        self.vx = np.append(self.vx, np.asarray(vx))
-        self.vy = np.append(self.vy, np.asarray(vy))
-        self.vz = np.append(self.vz, np.asarray(vz))
-
         if m is None:
-            self.m = np.append(self.m, np.ones(len(x),float))
-        else:
-            self.m = np.append(self.m, np.asarray(m))
+            m = np.ones(len(x), float)
+
+        # Add all positions, masses, and velocities to the phase space buffer at once
+        # (single values are given to every new star)
+        columns = [
+            np.atleast_1d(np.asarray(value, float)) for value in [x, y, z, m, vx, vy, vz]
+        ]
+        nnew = np.amax([len(column) for column in columns])
+
+        new_phase = np.empty((nnew, 7))
+        for i, column in enumerate(columns):
+            new_phase[:, i] = column
+
+        nstar = len(self.phase)
+        self.append_rows("phase", new_phase, nstar)
 
         if id is None:
-            self.id = np.linspace(0, self.ntot - 1, self.ntot, dtype=int)
+            self.append_rows("id", np.arange(nstar, nstar + nnew), nstar)
         else:
-            self.id = np.append(self.id, np.asarray(id))
+            self.append_rows("id", np.asarray(id), nstar)
 
         # Check lengths:
-        nmax = np.amax(
-            [
-                len(self.id),
-                len(self.m),
-                len(self.x),
-                len(self.y),
-                len(self.z),
-                len(self.vx),
-                len(self.vy),
-                len(self.vz),
-            ]
-        )
-        nmin = np.amin(
-            [
-                len(self.id),
-                len(self.m),
-                len(self.x),
-                len(self.y),
-                len(self.z),
-                len(self.vx),
-                len(self.vy),
-                len(self.vz),
-            ]
-        )
-        if nmax != nmin:
-            if len(self.id) == 1:
-                self.id = np.linspace(0, self.ntot - 1, self.ntot, dtype=int)
-            if len(self.m) == 1:
-                self.m = np.ones(nmax) * self.m
-            if len(self.x) == 1:
-                self.x = np.ones(nmax) * self.x
-            if len(self.y) == 1:
-                self.y = np.ones(nmax) * self.y
-            if len(self.z) == 1:
-                self.z = np.ones(nmax) * self.z
-            if len(self.vx) == 1:
-                self.vx = np.ones(nmax) * self.vx
-            if len(self.vy) == 1:
-                self.vy = np.ones(nmax) * self.vy
-            if len(self.vz) == 1:
-                self.vz = np.ones(nmax) * self.vz
+        if len(self.id) == 1 and len(self.phase) > 1:
+            self.id = np.arange(len(self.phase))
 
         if self.units == "radec" and self.origin == "sky":
             self.ra = copy(self.x)
@@ -540,16 +888,16 @@ class StarCluster(object):
             self.pmdec = copy(self.vy)
             self.vlos = copy(self.vz)
 
-        self.kw = np.append(self.kw, np.zeros(len(self.id)))
-
-        self.rv3d()
+        self.append_rows("kw", np.zeros(nnew, dtype=int), nstar)
 
         if do_key_params:
             self.key_params(do_order=do_order)
 
+        # ntot follows stars added in chunks, so only a ntot that was set to something else is reported
         if len(self.id) != self.ntot:
-            print('Number Error:',len(self.id),self.ntot)
-            print("Added %i stars to instance" % (len(self.id) - self.ntot))
+            if self.ntot != nstar:
+                print('Number Error:',len(self.id),self.ntot)
+                print("Added %i stars to instance" % (len(self.id) - self.ntot))
             self.ntot = len(self.id)
 
     def add_se(self, kw, logl, logr, ep, ospin):
@@ -564,6 +912,9 @@ class StarCluster(object):
            Notes:
             - parameters are common output variables in NBODY6
             - values are never adjusted during unit or coordinate changes
+            - values are added after those of earlier calls, so stars can be added in chunks (stars must
+              be added with add_stars first). If there are more values than stars without stellar
+              evolution information, the values replace the old ones instead
 
         INPUT:
 
@@ -586,13 +937,22 @@ class StarCluster(object):
            2018 - Written - Webb (UofT)
 
         """
-        self.kw = np.asarray(kw)
-        self.logl = np.asarray(logl)
-        self.logr = np.asarray(logr)
-        self.lum = 10.0 ** self.logl
-        self.ltot = np.sum(self.lum)
-        self.ep = np.asarray(ep)
-        self.ospin = np.asarray(ospin)
+        logl = np.atleast_1d(np.asarray(logl))
+        lum = 10.0 ** logl
+
+        start = len(self.logl)
+        if start + len(logl) > len(self.phase):
+            start = 0
+
+        # kw was already given a row for every star by add_stars
+        self.append_rows("kw", kw, start, truncate=False)
+        for name, values in zip(self.se_names, [logl, logr, lum, ep, ospin]):
+            self.append_rows(name, values, start)
+
+        if start == 0:
+            self.ltot = np.sum(lum)
+        else:
+            self.ltot += np.sum(lum)
 
     def add_bse(
         self,
@@ -626,6 +986,9 @@ class StarCluster(object):
            Notes:
             - parameters are common output variables in NBODY6
             - values are never adjusted during unit or coordinate changes
+            - values are added after those of earlier calls, so binaries can be added in chunks (the
+              number of binaries self.nb must be set first, e.g. with add_nbody6). If there are more
+              values than binaries without information, the values replace the old ones instead
 
         INPUT:
 
@@ -659,27 +1022,35 @@ class StarCluster(object):
 
            2018 - Written - Webb (UofT)
         """
-        self.id1 = np.asarray(id1)
-        self.id2 = np.asarray(id2)
-        self.kw1 = np.asarray(kw1)
-        self.kw2 = np.asarray(kw2)
-        self.kcm = np.asarray(kcm)
-        self.ecc = np.asarray(ecc)
-        self.pb = np.asarray(pb)
-        self.semi = np.asarray(semi)
-        self.m1 = np.asarray(m1)
-        self.m2 = np.asarray(m2)
-        self.logl1 = np.asarray(logl1)
-        self.logl2 = np.asarray(logl2)
-        self.logr1 = np.asarray(logr1)
-        self.logr2 = np.asarray(logr2)
-        if ep1 is not None:
-            self.ep1 = np.asarray(ep1)
-            self.ep2 = np.asarray(ep2)
-            self.ospin1 = np.asarray(ospin1)
-            self.ospin2 = np.asarray(ospin2)
-
-        self.eb=0.5*self.m1*self.m2/self.semi
+        values = [
+            id1,
+            id2,
+            kw1,
+            kw2,
+            kcm,
+            ecc,
+            pb,
+            semi,
+            m1,
+            m2,
+            logl1,
+            logl2,
+            logr1,
+            logr2,
+            ep1,
+            ep2,
+            ospin1,
+            ospin2,
+            0.5 * np.asarray(m1) * np.asarray(m2) / np.asarray(semi),
+        ]
+
+        start = len(self.id1)
+        if start + len(np.atleast_1d(id1)) > self.nb:
+            start = 0
+
+        for name, value in zip(self.bse_names, values):
+            if value is not None:
+                self.append_rows(name, value, start)
 
     def add_energies(self, kin, pot, etot):
         """
@@ -692,6 +1063,9 @@ class StarCluster(object):
            Add energy information to stars and calculate total energy and Q for the cluster
            Notes:
             - values are never adjusted during unit or coordinate changes
+            - values are added after those of earlier calls, so stars can be added in chunks (stars must
+              be added with add_stars first). If there are more values than stars without energies,
+              the values replace the old ones instead
 
         INPUT:
 
@@ -711,11 +1085,22 @@ class StarCluster(object):
 
         """
 
-        self.kin = np.array(kin)
-        self.pot = np.array(pot)
-        self.etot = np.array(etot)
-        self.ektot = np.sum(self.kin)
-        self.ptot = np.sum(self.pot) / 2.0
+        kin = np.atleast_1d(np.asarray(kin))
+        pot = np.atleast_1d(np.asarray(pot))
+
+        start = len(self.kin)
+        if start + len(kin) > len(self.phase):
+            start = 0
+
+        for name, values in zip(self.energy_names, [kin, pot, etot]):
+            self.append_rows(name, values, start)
+
+        if start == 0:
+            self.ektot = np.sum(kin)
+            self.ptot = np.sum(pot) / 2.0
+        else:
+            self.ektot += np.sum(kin)
+            self.ptot += np.sum(pot) / 2.0
 
         if self.ptot == 0.0:
             self.qvir = 0.0
@@ -869,6 +1254,7 @@ class StarCluster(object):
         nmax=100,
         r0=8.0,
         v0=220.0,
+        sort=False,
     ):
         """
         NAME:
@@ -886,6 +1272,8 @@ class StarCluster(object):
            vxstart,vystart,vzstart - starting velocity for centre
            rmin - minimum radius of sphere around which to estimate density centre (default: 0.1 pc)
            nmax - maximum number of iterations (default:100)
+           sort - use the numba implementation that sorts stars by radius once per recentering
+                  instead of masking every star each iteration (default: False)
 
         OUTPUT:
 
@@ -917,6 +1305,16 @@ class StarCluster(object):
         vy = self.vy[indx] - vystart
         vz = self.vz[indx] - vzstart
 
+        if sort:
+            xdc, ydc, zdc, vxdc, vydc, vzdc = shrinking_sphere_centre(
+                m, x, y, z, vx, vy, vz, rmin, nmax
+            )
+
+            self.xc, self.yc, self.zc = xstart + xdc, ystart + ydc, zstart + zdc
+            self.vxc, self.vyc, self.vzc = vxstart + vxdc, vystart + vydc, vzstart + vzdc
+
+            return
+
         r = np.sqrt(x ** 2.0 + y ** 2.0 + z ** 2.0)
         rlim = np.amax(r)
 
@@ -967,6 +1365,101 @@ class StarCluster(object):
         self.xc, self.yc, self.zc = xdc, ydc, zdc
         self.vxc, self.vyc, self.vzc = vxdc, vydc, vzdc
 
+    def local_density(self, nneighbour=6, indx=None):
+        """
+        NAME:
+
+           local_density
+
+        PURPOSE:
+
+           Find the local density around each star from the distance to its nneighbour'th nearest neighbour
+           --> rho = 3 M / (4 pi r^3), where M is the mass of the nneighbour-1 nearest neighbours (Casertano & Hut 1985)
+           --> Densities of the full cluster are stored until positions or masses change
+
+        INPUT:
+
+           nneighbour - which nearest neighbour to use (default: 6)
+
+           indx - subset of stars to use, in which case only neighbours within the subset are considered
+
+        OUTPUT:
+
+           rho_local - local density of each star (of each star in the subset if indx is given)
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        if indx is None:
+            if nneighbour in self.derived.get("rho_local", {}):
+                return self.derived["rho_local"][nneighbour]
+
+            tree = self.spatial_index()
+            m = self.m
+        else:
+            tree = cKDTree(np.array([self.x[indx], self.y[indx], self.z[indx]]).T)
+            m = self.m[indx]
+
+        # Each star is its own closest neighbour, so query nneighbour+1 stars
+        dist, nindx = tree.query(tree.data, k=nneighbour + 1)
+        mnn = np.sum(m[nindx[:, 1:nneighbour]], axis=1)
+        rnn = dist[:, nneighbour]
+
+        rho_local = np.zeros(len(m))
+        rindx = rnn > 0.0
+        rho_local[rindx] = 3.0 * mnn[rindx] / (4.0 * np.pi * rnn[rindx] ** 3.0)
+
+        if indx is None:
+            self.derived.setdefault("rho_local", {})[nneighbour] = rho_local
+
+        return rho_local
+
+    def find_centre_of_local_density(self, indx=None, nneighbour=6):
+        """
+        NAME:
+
+           find_centre_of_local_density
+
+        PURPOSE:
+
+           Find the density weighted centre of the cluster, where the local density of each star is
+           found from its nneighbour'th nearest neighbour (Casertano & Hut 1985)
+           --> Only stars denser than the density weighted mean density are used, so that
+               long tidal tails do not pull the centre away from the core
+
+        INPUT:
+           indx - subset of stars to use when finding center
+           nneighbour - which nearest neighbour to use when finding local densities (default: 6)
+
+        OUTPUT:
+
+           xc,yc,zc,vxc,vyc,vzc - coordinates of centre of density
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        if indx is None or np.sum(indx) == self.ntot:
+            indx = np.ones(self.ntot, bool)
+            rho = self.local_density(nneighbour)
+        else:
+            rho = self.local_density(nneighbour, indx)
+
+        rhomean = np.sum(rho * rho) / np.sum(rho)
+        rho = rho * (rho >= rhomean)
+        rhotot = np.sum(rho)
+
+        self.xc = np.sum(rho * self.x[indx]) / rhotot
+        self.yc = np.sum(rho * self.y[indx]) / rhotot
+        self.zc = np.sum(rho * self.z[indx]) / rhotot
+
+        self.vxc = np.sum(rho * self.vx[indx]) / rhotot
+        self.vyc = np.sum(rho * self.vy[indx]) / rhotot
+        self.vzc = np.sum(rho * self.vz[indx]) / rhotot
+
     def find_centre(
         self,
         xstart=0.0,
@@ -983,6 +1476,9 @@ class StarCluster(object):
         nmax=100,
         r0=8.0,
         v0=220.0,
+        method=None,
+        nneighbour=6,
+        track=True,
     ):
         """
         NAME:
@@ -1008,6 +1504,13 @@ class StarCluster(object):
                - rmin - minimum radius to start looking for stars
                - nmax - maximum number of iterations to find centre
            r0,v0 - For converting to and from galpy units (Default: 8., 220.)
+           method - 'density' (shrinking sphere), 'density_sorted' (same shrinking sphere with a single radial sort per
+                    recentering, faster for large N), 'mass' (centre of mass of inner sphere) or 'knn' (weighted by
+                    local densities from nearest neighbours). Overrides density if given (Default: None)
+           if method=='knn':
+               - nneighbour - which nearest neighbour to use when finding local densities (default: 6)
+           track - if a CentreTracker has been given as cluster.centre_tracker, let it start the search
+                   from the centre expected from the previous snapshot (default: True)
 
         OUTPUT:
 
@@ -1025,7 +1528,37 @@ class StarCluster(object):
             print("NO SUBSET OF STARS GIVEN")
             return 0.0, 0.0, 0.0, 0.0, 0.0, 0.0
 
-        if density:
+        if track and self.centre_tracker is not None:
+            self.centre_tracker.find_centre(
+                self,
+                xstart=xstart,
+                ystart=ystart,
+                zstart=zstart,
+                vxstart=vxstart,
+                vystart=vystart,
+                vzstart=vzstart,
+                indx=indx,
+                nsigma=nsigma,
+                nsphere=nsphere,
+                density=density,
+                rmin=rmin,
+                nmax=nmax,
+                r0=r0,
+                v0=v0,
+                method=method,
+                nneighbour=nneighbour,
+            )
+            return
+
+        if method is None:
+            if density:
+                method = "density"
+            else:
+                method = "mass"
+
+        if method == "knn":
+            self.find_centre_of_local_density(indx=indx, nneighbour=nneighbour)
+        elif method == "density" or method == "density_sorted":
             self.find_centre_of_density(
                 xstart=xstart,
                 ystart=ystart,
@@ -1038,6 +1571,7 @@ class StarCluster(object):
                 nmax=nmax,
                 r0=r0,
                 v0=v0,
+                sort=(method == "density_sorted"),
             )
         else:
 
@@ -1125,35 +1659,302 @@ class StarCluster(object):
         PURPOSE:
 
            Add action angle values to the cluster instance
+           --> values are added after those of earlier calls, so stars can be added in chunks (stars must
+               be added with add_stars first). If there are more values than stars without actions,
+               the values replace the old ones instead
+
+        INPUT:
+
+           JR,Jphi,Jz,OR,Ophi,Oz,TR,Tphi,Tz
+
+        OUTPUT:
+
+            None
+
+        HISTORY:
+
+           2019 - Written - Webb (UofT)
+
+        """
+        names = ["JR", "Jphi", "Jz", "OR", "Ophi", "Oz", "TR", "Tphi", "Tz"]
+
+        start = len(np.atleast_1d(getattr(self, "JR", [])))
+        if start + len(np.atleast_1d(JR)) > len(self.phase):
+            start = 0
+
+        for name, values in zip(names, [JR, Jphi, Jz, OR, Ophi, Oz, TR, Tphi, Tz]):
+            self.append_rows(name, values, start)
+
+    def rv3d(self):
+        """
+        NAME:
+
+           rv3d
+
+        PURPOSE:
+
+           Forget stored radii, speeds and radial orderings so they are recalculated when next needed
+           --> Only necessary if individual elements of x,y,z,vx,vy,vz have been changed in place,
+               since setting the arrays themselves already does this
+
+        INPUT:
+
+           None
+
+        OUTPUT:
+
+            None
+
+        HISTORY:
+
+           2018 - Written - Webb (UofT)
+
+        """
+        for name in ["x", "y", "z", "vx", "vy", "vz"]:
+            for dname in self.derived_dependencies[name]:
+                self.derived.pop(dname, None)
+
+    def calc_r(self):
+        if self.units == "radec":
+            self.derived["r"] = np.sqrt(self.x ** 2.0 + self.y ** 2.0)
+            self.derived["rpro"] = self.derived["r"]
+        else:
+            self.derived["rpro"] = np.sqrt(self.x ** 2.0 + self.y ** 2.0)
+            self.derived["r"] = np.sqrt(self.rpro ** 2.0 + self.z ** 2.0)
+
+    def calc_v(self):
+        if self.units == "radec":
+            self.derived["v"] = np.sqrt(self.vx ** 2.0 + self.vy ** 2.0)
+            self.derived["vpro"] = self.derived["v"]
+        else:
+            self.derived["vpro"] = np.sqrt(self.vx ** 2.0 + self.vy ** 2.0)
+            self.derived["v"] = np.sqrt(self.vpro ** 2.0 + self.vz ** 2.0)
+
+    def calc_rorder(self):
+        self.derived["rorder"] = np.argsort(self.r)
+
+    def calc_rproorder(self):
+        self.derived["rproorder"] = np.argsort(self.rpro)
+
+    def calc_mass_params(self):
+        self.derived["mtot"] = np.sum(self.m)
+        self.derived["mmean"] = np.mean(self.m)
+
+    def calc_radius_params(self):
+        self.derived["rmean"] = np.mean(self.r)
+        self.derived["rmax"] = np.max(self.r)
+
+    def calc_mass_radii(self):
+        msum = np.cumsum(self.m[self.rorder])
+        indx = msum >= 0.5 * self.mtot
+        self.derived["rm"] = self.r[self.rorder[indx][0]]
+        indx = msum >= 0.1 * self.mtot
+        self.derived["r10"] = self.r[self.rorder[indx][0]]
+
+    def calc_mass_radii_pro(self):
+        if self.projected:
+            msum = np.cumsum(self.m[self.rproorder])
+            indx = msum >= 0.5 * self.mtot
+            self.derived["rmpro"] = self.rpro[self.rproorder[indx][0]]
+            indx = msum >= 0.1 * self.mtot
+            self.derived["r10pro"] = self.rpro[self.rproorder[indx][0]]
+        else:
+            self.derived["rmpro"] = 0.0
+            self.derived["r10pro"] = 0.0
+
+    def calc_light_radii(self):
+        if len(self.logl) > 0:
+            lsum = np.cumsum(self.lum[self.rorder])
+            indx = lsum >= 0.5 * self.ltot
+            self.derived["rh"] = self.r[self.rorder[indx][0]]
+            indx = lsum >= 0.1 * self.ltot
+            self.derived["rh10"] = self.r[self.rorder[indx][0]]
+        else:
+            self.derived["rh"] = None
+            self.derived["rh10"] = None
+
+    def calc_light_radii_pro(self):
+        if len(self.logl) > 0 and self.projected:
+            lsum = np.cumsum(self.lum[self.rproorder])
+            indx = lsum >= 0.5 * self.ltot
+            self.derived["rhpro"] = self.rpro[self.rproorder[indx][0]]
+            indx = lsum >= 0.1 * self.ltot
+            self.derived["rh10pro"] = self.rpro[self.rproorder[indx][0]]
+        else:
+            self.derived["rhpro"] = 0.0
+            self.derived["rh10pro"] = 0.0
+
+    def key_params_cache(self):
+        """
+        NAME:
+
+           key_params_cache
+
+        PURPOSE:
+
+           Get the key parameters that have already been calculated, so they can be kept through a change of origin
+           (key parameters are only recalculated in a new origin when key_params is called)
+
+        INPUT:
+
+           None
+
+        OUTPUT:
+
+            dictionary of key parameters
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        return dict(
+            (name, self.derived[name]) for name in self.key_names if name in self.derived
+        )
+
+    def scale_derived(self, derived, rfac=1.0, vfac=1.0, mfac=1.0):
+        """
+        NAME:
+
+           scale_derived
+
+        PURPOSE:
+
+           Restore derived quantities calculated before a change of units, scaled to the new units,
+           so that radii and orderings do not have to be recalculated
+
+        INPUT:
+
+           derived - StarCluster.derived before the change of units
+
+           rfac,vfac,mfac - factors by which positions, velocities, and masses were multiplied
+
+        OUTPUT:
+
+            None
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        for name in derived:
+            value = derived[name]
+            if value is None:
+                self.derived[name] = value
+            elif name in ["r", "rpro"] or name in self.key_names:
+                self.derived[name] = value * rfac
+            elif name in ["v", "vpro"]:
+                self.derived[name] = value * vfac
+            elif name in ["mtot", "mmean"]:
+                self.derived[name] = value * mfac
+            elif name in ["rorder", "rproorder"]:
+                self.derived[name] = value
+            elif name == "rho_local":
+                self.derived[name] = dict(
+                    (k, rho * mfac / rfac ** 3.0) for k, rho in value.items()
+                )
+
+    def spatial_index(self, projected=False):
+        """
+        NAME:
+
+           spatial_index
+
+        PURPOSE:
+
+           Return a KD-tree of stellar positions, building it only if positions have changed
+           since it was last needed
+
+        INPUT:
+
+           projected - build tree of projected (x,y) positions (default: False)
+
+        OUTPUT:
+
+            scipy.spatial.cKDTree
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+        """
+        if projected:
+            if "kdtree_pro" not in self.derived:
+                self.derived["kdtree_pro"] = cKDTree(self.phase[:, :2])
+            return self.derived["kdtree_pro"]
+        else:
+            if "kdtree" not in self.derived:
+                self.derived["kdtree"] = cKDTree(self.phase[:, :3])
+            return self.derived["kdtree"]
+
+    def nearest_neighbours(self, k=1, projected=False):
+        """
+        NAME:
+
+           nearest_neighbours
+
+        PURPOSE:
+
+           Find the k nearest neighbours of every star
+
+        INPUT:
+
+           k - number of neighbours (default: 1)
+
+           projected - use projected positions (default: False)
+
+        OUTPUT:
+
+            dist - distances to the k nearest neighbours, shape (ntot,k)
+
+            nindx - indices of the k nearest neighbours, shape (ntot,k)
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+        """
+        tree = self.spatial_index(projected)
+        # Each star is found as its own neighbour, so query k+1 stars and drop the star itself
+        # (stars sharing a position are found in any order, so it is not always the first)
+        dist, nindx = tree.query(tree.data, k=k + 1)
+        n = len(nindx)
+
+        keep = nindx != np.arange(n)[:, None]
+        # Stars not found among their own k+1 neighbours (more than k+1 stars at the same position)
+        # drop their last neighbour instead
+        keep[np.all(keep, axis=1), -1] = False
+
+        return dist[keep].reshape(n, k), nindx[keep].reshape(n, k)
+
+    def neighbours_within(self, rad, projected=False, return_length=False):
+        """
+        NAME:
+
+           neighbours_within
+
+        PURPOSE:
+
+           Find the stars within a distance rad of every star
+
+        INPUT:
+
+           rad - search radius (a single value or one value per star)
 
-        INPUT:
+           projected - use projected positions (default: False)
 
-           JR,Jphi,Jz,OR,Ophi,Oz,TR,Tphi,Tz
+           return_length - only return the number of stars within rad (default: False)
 
         OUTPUT:
 
-            None
+            list of neighbour indices for each star (including the star itself) or number of neighbours
 
         HISTORY:
 
-           2019 - Written - Webb (UofT)
-
+           2020 - Written - Webb (UofT)
         """
-        self.JR, self.Jphi, self.Jz = JR, Jphi, Jz
-        self.OR, self.Ophi, self.Oz = OR, Ophi, Oz
-        self.TR, self.Tphi, self.Tz = TR, Tphi, Tz
+        tree = self.spatial_index(projected)
 
-    def rv3d(self):
-        if self.units == "radec":
-            self.r = np.sqrt(self.x ** 2.0 + self.y ** 2.0)
-            self.rpro = self.r
-            self.v = np.sqrt(self.vx ** 2.0 + self.vy ** 2.0)
-            self.vpro = self.v
-        else:
-            self.r = np.sqrt(self.x ** 2.0 + self.y ** 2.0 + self.z ** 2.0)
-            self.rpro = np.sqrt(self.x ** 2.0 + self.y ** 2.0)
-            self.v = np.sqrt(self.vx ** 2.0 + self.vy ** 2.0 + self.vz ** 2.0)
-            self.vpro = np.sqrt(self.vx ** 2.0 + self.vy ** 2.0)
+        return tree.query_ball_point(tree.data, rad, return_length=return_length)
 
     def key_params(self, do_order=False):
         """
@@ -1168,6 +1969,8 @@ class StarCluster(object):
         INPUT:
 
            do_order - Perform the time consuming task of ordering stars based on radius to find r10,r50, etc. (default:False)
+                      --> if False, radii that need an ordering are only found here if the ordering is already known,
+                          otherwise they are calculated when first needed
 
         OUTPUT:
 
@@ -1179,50 +1982,22 @@ class StarCluster(object):
 
         """
 
-        self.mtot = np.sum(self.m)
-        self.mmean = np.mean(self.m)
-        self.rmean = np.mean(self.r)
-        self.rmax = np.max(self.r)
+        for name in ("mtot", "mmean") + self.key_names:
+            self.derived.pop(name, None)
 
-        # Radially order the stars to find half-mass radius
-        if do_order:
-            self.rorder = np.argsort(self.r)
-            if self.projected:
-                self.rproorder = np.argsort(self.rpro)
+        self.calc_mass_params()
+        self.calc_radius_params()
 
-        if self.rorder is not None:
-            msum = np.cumsum(self.m[self.rorder])
-            indx = msum >= 0.5 * self.mtot
-            self.rm = self.r[self.rorder[indx][0]]  
-            indx = msum >= 0.1 * self.mtot
-            self.r10 = self.r[self.rorder[indx][0]]
-
-        if self.projected and self.rproorder is not None:
-            msum = np.cumsum(self.m[self.rproorder])
-            indx = msum >= 0.5 * self.mtot
-            self.rmpro = self.rpro[self.rproorder[indx][0]]
-            indx = msum >= 0.1 * self.mtot
-            self.r10pro = self.rpro[self.rproorder[indx][0]]
-        else:
-            self.rmpro = 0.0
-            self.r10pro = 0.0
+        # Radially order the stars to find half-mass radius (orderings are kept until positions change)
+        if do_order or "rorder" in self.derived:
+            self.calc_mass_radii()
+            if len(self.logl) > 0:
+                self.calc_light_radii()
 
-        if len(self.logl) > 0 and self.rorder is not None:
-            lsum = np.cumsum(self.lum[self.rorder])
-            indx = lsum >= 0.5 * self.ltot
-            self.rh = self.r[self.rorder[indx][0]]
-            indx = lsum >= 0.1 * self.ltot
-            self.rh10 = self.r[self.rorder[indx][0]]
-
-            if self.projected and self.rproorder is not None:
-                lsum = np.cumsum(self.lum[self.rproorder])
-                indx = lsum >= 0.5 * self.ltot
-                self.rhpro = self.rpro[self.rproorder[indx][0]]
-                indx = lsum >= 0.1 * self.ltot
-                self.rh10pro = self.rpro[self.rproorder[indx][0]]
-            else:
-                self.rhpro = 0.0
-                self.rh10pro = 0.0
+        if self.projected and (do_order or "rproorder" in self.derived):
+            self.calc_mass_radii_pro()
+            if len(self.logl) > 0:
+                self.calc_light_radii_pro()
 
     def to_realpc(self, do_key_params=False):
         """
@@ -1251,6 +2026,8 @@ class StarCluster(object):
             self.to_realkpc()
 
         if self.units == "nbody":
+            derived = self.derived.copy()
+
             self.m *= self.zmbar
             self.x *= self.rbar
             self.y *= self.rbar
@@ -1274,6 +2051,7 @@ class StarCluster(object):
             self.vzgc *= self.vstar
 
             self.units = "realpc"
+            self.scale_derived(derived, self.rbar, self.vstar, self.zmbar)
 
             #if self.nb > 0:
             #    yrs = (self.rbar * 1296000.0 / (2.0 * np.pi)) ** 1.5 / np.sqrt(
@@ -1286,6 +2064,8 @@ class StarCluster(object):
             #    self.semi *= self.rbar * pctoau
 
         elif self.units == "realkpc":
+            derived = self.derived.copy()
+
             self.x *= 1000.0
             self.y *= 1000.0
             self.z *= 1000.0
@@ -1299,8 +2079,7 @@ class StarCluster(object):
             self.zc *= 1000.0
 
             self.units = "realpc"
-
-        self.rv3d()
+            self.scale_derived(derived, 1000.0)
 
         if do_key_params:
             self.key_params()
@@ -1332,6 +2111,8 @@ class StarCluster(object):
             self.from_radec()
 
         if self.units == "galpy":
+            derived = self.derived.copy()
+
             self.m *= bovy_conversion.mass_in_msol(ro=r0, vo=v0)
             self.x *= r0
             self.y *= r0
@@ -1355,8 +2136,13 @@ class StarCluster(object):
             self.vzgc *= v0
 
             self.units = "realkpc"
+            self.scale_derived(
+                derived, r0, v0, bovy_conversion.mass_in_msol(ro=r0, vo=v0)
+            )
 
         elif self.units == "nbody":
+            derived = self.derived.copy()
+
             self.m *= self.zmbar
             self.x *= self.rbar / 1000.0
             self.y *= self.rbar / 1000.0
@@ -1380,8 +2166,11 @@ class StarCluster(object):
             self.vzgc *= self.vstar
 
             self.units = "realkpc"
+            self.scale_derived(derived, self.rbar / 1000.0, self.vstar, self.zmbar)
 
         elif self.units == "realpc":
+            derived = self.derived.copy()
+
             self.x /= 1000.0
             self.y /= 1000.0
             self.z /= 1000.0
@@ -1395,8 +2184,7 @@ class StarCluster(object):
             self.zc /= 1000.0
 
             self.units = "realkpc"
-
-        self.rv3d()
+            self.scale_derived(derived, 1.0 / 1000.0)
 
         if do_key_params:
             self.key_params()
@@ -1430,6 +2218,8 @@ class StarCluster(object):
             self.to_realpc(do_key_params=False)
 
         if self.units == "realpc":
+            derived = self.derived.copy()
+
             self.m /= self.zmbar
             self.x /= self.rbar
             self.y /= self.rbar
@@ -1453,8 +2243,9 @@ class StarCluster(object):
             self.vzgc /= self.vstar
 
             self.units = "nbody"
-
-        self.rv3d()
+            self.scale_derived(
+                derived, 1.0 / self.rbar, 1.0 / self.vstar, 1.0 / self.zmbar
+            )
 
         if do_key_params:
             self.key_params()
@@ -1484,6 +2275,8 @@ class StarCluster(object):
         """
 
         try:
+            key_cache = self.key_params_cache()
+
             self.x = copy(self.ra)
             self.y = copy(self.dec)
             self.z = copy(self.dist)
@@ -1501,6 +2294,8 @@ class StarCluster(object):
             self.to_galaxy()
             self.to_realkpc()
 
+            key_cache = self.key_params_cache()
+
             x0, y0, z0 = bovy_coords.galcenrect_to_XYZ(
                 self.x, self.y, self.z, Xsun=8.0, Zsun=0.025
             ).T
@@ -1573,7 +2368,8 @@ class StarCluster(object):
             self.units = "radec"
             self.origin = "sky"
 
-        self.rv3d()
+        # Key parameters are only recalculated by key_params
+        self.derived.update(key_cache)
 
         if do_key_params:
             self.key_params(do_order=do_order)
@@ -1602,6 +2398,8 @@ class StarCluster(object):
 
         """
 
+        key_cache = self.key_params_cache()
+
         if self.units == "radec" and self.origin == "sky":
 
             origin0 = self.origin
@@ -1655,7 +2453,7 @@ class StarCluster(object):
             self.origin = "galaxy"
             self.units = "realkpc"
 
-        self.rv3d()
+        self.derived.update(key_cache)
 
         if do_key_params:
             self.key_params(do_order=do_order)
@@ -1687,6 +2485,8 @@ class StarCluster(object):
             self.to_realkpc(do_key_params=False)
 
         if self.units == "realkpc":
+            derived = self.derived.copy()
+
             self.m = self.m / bovy_conversion.mass_in_msol(ro=r0, vo=v0)
             self.x /= r0
             self.y /= r0
@@ -1710,8 +2510,9 @@ class StarCluster(object):
             self.vzgc /= v0
 
             self.units = "galpy"
-
-        self.rv3d()
+            self.scale_derived(
+                derived, 1.0 / r0, 1.0 / v0, 1.0 / bovy_conversion.mass_in_msol(ro=r0, vo=v0)
+            )
 
         if do_key_params:
             self.key_params()
@@ -1858,6 +2659,8 @@ class StarCluster(object):
             if self.origin != "cluster":
                 self.to_cluster(do_key_params=False, centre_method=centre_method)
 
+            key_cache = self.key_params_cache()
+
             self.x -= self.xc
             self.y -= self.yc
             self.z -= self.zc
@@ -1867,7 +2670,8 @@ class StarCluster(object):
 
             self.origin = "centre"
 
-            self.rv3d()
+            # Key parameters are only recalculated by key_params
+            self.derived.update(key_cache)
 
         if do_key_params:
             self.key_params(do_order=do_order)
@@ -1903,6 +2707,8 @@ class StarCluster(object):
             self.centre_method = centre_method
 
         if self.origin != "cluster":
+            key_cache = self.key_params_cache()
+
             if self.units == "radec" and self.origin == "sky":
                 ra = np.radians(self.x)
                 dec = np.radians(self.y)
@@ -1967,7 +2773,8 @@ class StarCluster(object):
                 self.vy -= self.vygc
                 self.vz -= self.vzgc
 
-            self.rv3d()
+            # Key parameters are only recalculated by key_params
+            self.derived.update(key_cache)
 
             self.origin = "cluster"
             if do_key_params:
@@ -2002,6 +2809,8 @@ class StarCluster(object):
             if self.origin == "centre":
                 self.to_cluster(do_key_params=False)
 
+            key_cache = self.key_params_cache()
+
             self.x += self.xgc
             self.y += self.ygc
             self.z += self.zgc
@@ -2011,7 +2820,8 @@ class StarCluster(object):
 
             self.origin = "galaxy"
 
-        self.rv3d()
+            # Key parameters are only recalculated by key_params
+            self.derived.update(key_cache)
 
         if do_key_params:
             self.key_params(do_order=do_order)
@@ -2091,9 +2901,7 @@ class StarCluster(object):
 
            2019 - Written - Webb (UofT)
         """
-        units0, origin0 = self.units, self.origin
-
-        self.to_centre()
+        cluster = self.view(origin="centre")
 
         v_vec = np.array([self.vxgc, self.vygc, self.vzgc])
         new_v_vec = np.array([1.0, 0.0, 0.0])
@@ -2103,22 +2911,34 @@ class StarCluster(object):
         )
 
         self.x_tail = (
-            self.x * rot[:, 0, 0] + self.y * rot[:, 1, 0] + self.z * rot[:, 2, 0]
+            cluster.x * rot[:, 0, 0]
+            + cluster.y * rot[:, 1, 0]
+            + cluster.z * rot[:, 2, 0]
         )
         self.y_tail = (
-            self.x * rot[:, 0, 1] + self.y * rot[:, 1, 1] + self.z * rot[:, 2, 1]
+            cluster.x * rot[:, 0, 1]
+            + cluster.y * rot[:, 1, 1]
+            + cluster.z * rot[:, 2, 1]
         )
         self.z_tail = (
-            self.x * rot[:, 0, 2] + self.y * rot[:, 1, 2] + self.z * rot[:, 2, 2]
+            cluster.x * rot[:, 0, 2]
+            + cluster.y * rot[:, 1, 2]
+            + cluster.z * rot[:, 2, 2]
         )
         self.vx_tail = (
-            self.vx * rot[:, 0, 0] + self.vy * rot[:, 1, 0] + self.vz * rot[:, 2, 0]
+            cluster.vx * rot[:, 0, 0]
+            + cluster.vy * rot[:, 1, 0]
+            + cluster.vz * rot[:, 2, 0]
         )
         self.vy_tail = (
-            self.vx * rot[:, 0, 1] + self.vy * rot[:, 1, 1] + self.vz * rot[:, 2, 1]
+            cluster.vx * rot[:, 0, 1]
+            + cluster.vy * rot[:, 1, 1]
+            + cluster.vz * rot[:, 2, 1]
         )
         self.vz_tail = (
-            self.vx * rot[:, 0, 2] + self.vy * rot[:, 1, 2] + self.vz * rot[:, 2, 2]
+            cluster.vx * rot[:, 0, 2]
+            + cluster.vy * rot[:, 1, 2]
+            + cluster.vz * rot[:, 2, 2]
         )
 
         self.r_tail = np.sqrt(
@@ -2128,8 +2948,6 @@ class StarCluster(object):
             self.vx_tail ** 2.0 + self.vy_tail ** 2.0 + self.vz_tail ** 2.0
         )
 
-        self.to_origin(origin0)
-
         return (
             self.x_tail,
             self.y_tail,
@@ -2172,10 +2990,91 @@ class StarCluster(object):
         elif origin == "sky":
             self.to_sky(do_order=do_order, do_key_params=do_key_params)
 
+    def view(self, units=None, origin=None, r0=8.0, v0=220.0):
+        """
+        NAME:
+
+           view
+
+        PURPOSE:
+
+           Look at the cluster in different units and/or origin without converting it
+           --> Stellar positions, velocities, and masses of the view are only calculated when first needed
+               (see ClusterView)
+           --> The view is kept until the cluster changes, so later calls share its arrays, radii, and orderings
+           --> Views of or to radec units or the sky origin are not linear transformations,
+               so a converted copy of the cluster is returned instead
+
+        INPUT:
+
+           units - units of the view (default: None, same as the cluster)
+
+           origin - origin of the view (default: None, same as the cluster)
+
+           r0,v0 - distance and velocity scales used for galpy units (default: 8.0,220.0)
+
+        OUTPUT:
+
+           ClusterView (or StarCluster)
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        if units is None:
+            units = self.units
+        if origin is None:
+            origin = self.origin
+
+        if (
+            self.units == "radec"
+            or units == "radec"
+            or self.origin == "sky"
+            or origin == "sky"
+        ):
+            cluster = deepcopy(self)
+            if cluster.units != units:
+                cluster.to_units(units, r0=r0, v0=v0)
+            if cluster.origin != origin:
+                cluster.to_origin(origin)
+            return cluster
+
+        # Views are kept until the cluster changes, so quantities they have found can be used again
+        views = self.derived.setdefault("views", {})
+        key = (units, origin, r0, v0)
+        view = views.get(key, None)
+
+        if view is None or view.units != units or view.origin != origin:
+            view = ClusterView(self, units=units, origin=origin, r0=r0, v0=v0)
+            views[key] = view
+
+        return view
+
     # Directly call from functions.py and profiles.py (see respective files for documenation):
-    def energies(self, specific=True, i_d=None, full=True, parallel=False):
+    def energies(
+        self,
+        specific=True,
+        i_d=None,
+        full=True,
+        parallel=False,
+        method="direct",
+        theta=0.5,
+        leaf_size=8,
+        softening=0.0,
+        nthread=None,
+    ):
         ek, pot, etot = energies(
-            self, specific=specific, i_d=i_d, full=full, parallel=parallel
+            self,
+            specific=specific,
+            i_d=i_d,
+            full=full,
+            parallel=parallel,
+            method=method,
+            theta=theta,
+            leaf_size=leaf_size,
+            softening=softening,
+            nthread=nthread,
         )
         self.add_energies(ek, pot, etot)
 
@@ -2187,8 +3086,8 @@ class StarCluster(object):
             self, H=H, Om=Om, overdens=overdens, nrad=nrad, projected=projected
         )
 
-    def virial_radius(self, projected=False):
-        self.rv = virial_radius(self, projected=projected)
+    def virial_radius(self, projected=False, full=True):
+        self.rv = virial_radius(self, projected=projected, full=full)
 
     def rtidal(self, pot=MWPotential2014, rtiterate=0, rgc=None, r0=8.0, v0=220.0):
         self.rt = rtidal(self, pot=pot, rtiterate=rtiterate, rgc=rgc, r0=r0, v0=v0)
@@ -2403,6 +3302,397 @@ class StarCluster(object):
         self.vmax = vmax
 
 
+class ClusterView(StarCluster):
+    """
+    NAME:
+
+       ClusterView
+
+    PURPOSE:
+
+       A StarCluster seen in different units and/or origin, which shares its stars with the viewed cluster
+       --> The phase space buffer of the view is found from the buffer of the viewed cluster with a
+           single scaling and shift when it is first needed, so the viewed cluster is never converted
+       --> Attributes that do not depend on units or origin (id, kw, tphys, energies,...) are those of the
+           viewed cluster, and setting them sets them in the viewed cluster
+       --> If the view has the same units and origin as the viewed cluster, its arrays are those
+           of the viewed cluster, so changing their elements changes the viewed cluster
+       --> Unit and origin conversions of the view (to_realpc, to_centre,...) only change the view
+       --> A view is only valid until the units, origin, or stars of the viewed cluster are changed
+
+    INPUT:
+
+       cluster - StarCluster to view
+
+       units - units of the view ('nbody','realpc','realkpc','galpy')
+
+       origin - origin of the view ('cluster','centre','galaxy')
+
+       r0,v0 - distance and velocity scales used for galpy units (default: 8.0,220.0)
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+
+    # Attributes that belong to the view rather than the viewed cluster
+    frame_names = (
+        "cluster",
+        "derived",
+        "units",
+        "origin",
+        "r0",
+        "v0",
+        "rfac",
+        "vfac",
+        "mfac",
+        "shift",
+        "scale",
+        "xc",
+        "yc",
+        "zc",
+        "vxc",
+        "vyc",
+        "vzc",
+        "xgc",
+        "ygc",
+        "zgc",
+        "vxgc",
+        "vygc",
+        "vzgc",
+    )
+
+    phase = derived_property("phase", "transform")
+
+    def __init__(self, cluster, units=None, origin=None, r0=8.0, v0=220.0):
+
+        # A view of a view looks at the original cluster
+        if isinstance(cluster, ClusterView):
+            cluster = cluster.cluster
+
+        self.derived = {}
+        self.cluster = cluster
+        self.r0 = r0
+        self.v0 = v0
+
+        self.set_frame(units, origin)
+
+    def __getattr__(self, name):
+        # Only called for attributes the view does not have itself
+        cluster = self.__dict__.get("cluster", None)
+        if cluster is None:
+            raise AttributeError(name)
+
+        return getattr(cluster, name)
+
+    def __setattr__(self, name, value):
+        if name in self.frame_names or isinstance(
+            getattr(type(self), name, None), property
+        ):
+            StarCluster.__setattr__(self, name, value)
+        else:
+            setattr(self.cluster, name, value)
+
+            # Forget quantities of the view that depend on the attribute (lum, projected,...)
+            if name in self.derived_dependencies:
+                for dname in self.derived_dependencies[name]:
+                    self.derived.pop(dname, None)
+
+    def unit_factors(self, units):
+        """
+        NAME:
+
+           unit_factors
+
+        PURPOSE:
+
+           Get the factors that convert positions, velocities, and masses from units to pc, km/s, and Msun
+
+        INPUT:
+
+           units - 'nbody','realpc','realkpc','galpy'
+
+        OUTPUT:
+
+            rfac,vfac,mfac
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        if units == "nbody":
+            return self.cluster.rbar, self.cluster.vstar, self.cluster.zmbar
+        elif units == "realkpc":
+            return 1000.0, 1.0, 1.0
+        elif units == "galpy":
+            return (
+                1000.0 * self.r0,
+                self.v0,
+                bovy_conversion.mass_in_msol(ro=self.r0, vo=self.v0),
+            )
+        else:
+            return 1.0, 1.0, 1.0
+
+    def origin_shift(self, origin):
+        """
+        NAME:
+
+           origin_shift
+
+        PURPOSE:
+
+           Get the shift from an origin to the cluster origin, in the units of the viewed cluster
+
+        INPUT:
+
+           origin - 'cluster','centre','galaxy'
+
+        OUTPUT:
+
+            dx,dy,dz,dvx,dvy,dvz
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        cluster = self.cluster
+
+        if origin == "centre":
+            return (
+                cluster.xc,
+                cluster.yc,
+                cluster.zc,
+                cluster.vxc,
+                cluster.vyc,
+                cluster.vzc,
+            )
+        elif origin == "galaxy":
+            return (
+                -cluster.xgc,
+                -cluster.ygc,
+                -cluster.zgc,
+                -cluster.vxgc,
+                -cluster.vygc,
+                -cluster.vzgc,
+            )
+        else:
+            return 0.0, 0.0, 0.0, 0.0, 0.0, 0.0
+
+    def view(self, units=None, origin=None, r0=None, v0=None):
+        """
+        NAME:
+
+           view
+
+        PURPOSE:
+
+           Look at the viewed cluster in different units and/or origin
+           --> The view itself is returned if nothing changes, so quantities it has already found are kept
+
+        INPUT:
+
+           units - units of the view (default: None, same as this view)
+
+           origin - origin of the view (default: None, same as this view)
+
+           r0,v0 - distance and velocity scales used for galpy units (default: None, same as this view)
+
+        OUTPUT:
+
+           ClusterView (or StarCluster)
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        if units is None:
+            units = self.units
+        if origin is None:
+            origin = self.origin
+        if r0 is None:
+            r0 = self.r0
+        if v0 is None:
+            v0 = self.v0
+
+        if (
+            units == self.units
+            and origin == self.origin
+            and r0 == self.r0
+            and v0 == self.v0
+        ):
+            return self
+
+        return self.cluster.view(units=units, origin=origin, r0=r0, v0=v0)
+
+    def set_frame(self, units=None, origin=None):
+        """
+        NAME:
+
+           set_frame
+
+        PURPOSE:
+
+           Set the units and origin of the view
+           --> Radii and orderings already found are kept if only the units change
+
+        INPUT:
+
+           units - units of the view (default: None, keep current units)
+
+           origin - origin of the view (default: None, keep current origin)
+
+        OUTPUT:
+
+            None
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        cluster = self.cluster
+        retarget = "rfac" in self.__dict__
+        units0 = self.__dict__.get("units", cluster.units)
+        origin0 = self.__dict__.get("origin", cluster.origin)
+
+        if units is None:
+            units = units0
+        if origin is None:
+            origin = origin0
+
+        if retarget and units == units0 and origin == origin0:
+            return
+
+        rbase, vbase, mbase = self.unit_factors(cluster.units)
+        rview, vview, mview = self.unit_factors(units)
+
+        self.rfac = rbase / rview
+        self.vfac = vbase / vview
+        self.mfac = mbase / mview
+
+        # Shift from the origin of the viewed cluster to the origin of the view and scaling to the
+        # units of the view, for each column of the phase space buffer (x,y,z,m,vx,vy,vz)
+        dx, dy, dz, dvx, dvy, dvz = np.subtract(
+            self.origin_shift(cluster.origin), self.origin_shift(origin)
+        )
+        self.shift = np.array([dx, dy, dz, 0.0, dvx, dvy, dvz])
+        self.scale = np.array(
+            [self.rfac, self.rfac, self.rfac, self.mfac, self.vfac, self.vfac, self.vfac]
+        )
+
+        self.xc = cluster.xc * self.rfac
+        self.yc = cluster.yc * self.rfac
+        self.zc = cluster.zc * self.rfac
+        self.vxc = cluster.vxc * self.vfac
+        self.vyc = cluster.vyc * self.vfac
+        self.vzc = cluster.vzc * self.vfac
+
+        self.xgc = cluster.xgc * self.rfac
+        self.ygc = cluster.ygc * self.rfac
+        self.zgc = cluster.zgc * self.rfac
+        self.vxgc = cluster.vxgc * self.vfac
+        self.vygc = cluster.vygc * self.vfac
+        self.vzgc = cluster.vzgc * self.vfac
+
+        derived = self.derived
+        self.derived = {}
+        self.units = units
+        self.origin = origin
+
+        if retarget and origin == origin0:
+            rview0, vview0, mview0 = self.unit_factors(units0)
+            self.scale_derived(
+                derived, rview0 / rview, vview0 / vview, mview0 / mview
+            )
+
+    def transform(self):
+        """
+        NAME:
+
+           transform
+
+        PURPOSE:
+
+           Calculate the phase space buffer of the view from the buffer of the viewed cluster
+
+        INPUT:
+
+           None
+
+        OUTPUT:
+
+            None
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        phase = self.cluster.phase
+
+        if np.any(self.shift != 0.0):
+            phase = phase + self.shift
+            phase *= self.scale
+        elif np.any(self.scale != 1.0):
+            phase = phase * self.scale
+
+        self.derived["phase"] = phase
+
+    def to_realpc(self, do_key_params=False):
+        self.set_frame(units="realpc")
+        if do_key_params:
+            self.key_params()
+
+    def to_realkpc(self, do_key_params=False, r0=8.0, v0=220.0):
+        self.set_frame(units="realkpc")
+        if do_key_params:
+            self.key_params()
+
+    def to_nbody(self, do_key_params=False, r0=8.0, v0=220.0):
+        self.set_frame(units="nbody")
+        if do_key_params:
+            self.key_params()
+
+    def to_galpy(self, do_key_params=False, r0=8.0, v0=220.0):
+        self.set_frame(units="galpy")
+        if do_key_params:
+            self.key_params()
+
+    def to_units(self, units, do_order=False, do_key_params=False, r0=8.0, v0=220.0):
+        if units == "radec":
+            print("CANNOT VIEW IN RADEC UNITS, USE StarCluster.view INSTEAD")
+            return
+
+        self.set_frame(units=units)
+        if do_key_params:
+            self.key_params(do_order=do_order)
+
+    def to_radec(self, do_key_params=False, r0=8.0, v0=220.0):
+        print("CANNOT VIEW IN RADEC UNITS, USE StarCluster.view INSTEAD")
+
+    def from_radec(self, do_order=False, do_key_params=False):
+        print("CANNOT VIEW IN RADEC UNITS, USE StarCluster.view INSTEAD")
+
+    def to_centre(self, do_order=False, do_key_params=False, centre_method=None):
+        self.set_frame(origin="centre")
+        if do_key_params:
+            self.key_params(do_order=do_order)
+
+    def to_cluster(self, do_order=False, do_key_params=False, centre_method=None):
+        self.set_frame(origin="cluster")
+        if do_key_params:
+            self.key_params(do_order=do_order)
+
+    def to_galaxy(self, do_order=False, do_key_params=False):
+        self.set_frame(origin="galaxy")
+        if do_key_params:
+            self.key_params(do_order=do_order)
+
+
 def sub_cluster(
     cluster,
     rmin=None,
@@ -2464,7 +3754,7 @@ def sub_cluster(
     """
 
     units0, origin0 = cluster.units, cluster.origin
-    cluster.to_centre()
+    cluster = cluster.view(origin="centre")
 
     if projected:
         r = cluster.rpro
@@ -2643,9 +3933,6 @@ def sub_cluster(
     else:
         subcluster = StarCluster(0, cluster.tphys)
 
-    cluster.to_origin(origin0)
-    cluster.to_units(units0)
-
     if subcluster.ntot > 0:
         subcluster.to_origin(origin0)
         subcluster.to_units(units0)
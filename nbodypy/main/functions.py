@@ -13,6 +13,7 @@ from ..util.constants import *
 from ..util.recipes import *
 from .operations import *
 from ..util.plots import *
+from .chunked import iter_chunks, chunk_mask, chunked_nbinmaker, chunked_rlagrange
 
 def relaxation_time(cluster, rad=None, multimass=True, projected=False,method='spitzer'):
     """
@@ -165,7 +166,18 @@ def core_relaxation_time(cluster, multimass=True, projected=False):
     return trelax
 
 
-def energies(cluster, specific=True, i_d=None, full=True, parallel=False):
+def energies(
+    cluster,
+    specific=True,
+    i_d=None,
+    full=True,
+    parallel=False,
+    method="direct",
+    theta=0.5,
+    leaf_size=8,
+    softening=0.0,
+    nthread=None,
+):
     """
     NAME:
 
@@ -184,9 +196,21 @@ def energies(cluster, specific=True, i_d=None, full=True, parallel=False):
        i_d - find energies for a specific star
 
        full - calculate distance of full array of stars at once with numbra (default: True)
+              (if False, use blocks of vectorized numpy operations instead)
 
        parallel - calculate distances in parallel if True (default: False)
 
+       method - 'direct' for an exact O(N^2) summation or 'tree' for a Barnes-Hut octree (O(N log N)) (default: 'direct')
+
+       theta - opening angle of the tree walk, smaller values are more accurate and slower. For theta=0.5
+               potentials are typically accurate to ~0.1 percent (default: 0.5)
+
+       leaf_size - maximum number of stars in a leaf of the octree (default: 8)
+
+       softening - Plummer softening length in cluster units (default: 0.0)
+
+       nthread - number of threads to use when parallel=True (default: None, use numba's default)
+
     OUTPUT:
 
        ek,pot,etot
@@ -195,8 +219,7 @@ def energies(cluster, specific=True, i_d=None, full=True, parallel=False):
 
        2019 - Written - Webb (UofT)
     """
-    units0, origin0 = save_cluster(cluster)
-    cluster.to_centre()
+    cluster = cluster.view(origin="centre")
 
     if cluster.units == "nbody":
         grav = 1.0
@@ -209,71 +232,86 @@ def energies(cluster, specific=True, i_d=None, full=True, parallel=False):
     else:
         grav = 1.0
 
-    if specific:
-        ek = 0.5 * (cluster.v ** 2.0)
-    else:
-        ek = 0.5 * cluster.m * (cluster.v ** 2.0)
-
-    if i_d != None:
-        indx = cluster.id == i_d
-
-        dx = cluster.x[indx] - cluster.x
-        dy = cluster.y[indx] - cluster.y
-        dz = cluster.z[indx] - cluster.z
+    if parallel and nthread is not None:
+        nthread0 = numba.get_num_threads()
+        numba.set_num_threads(min(nthread, numba.config.NUMBA_NUM_THREADS))
 
+    # The number of threads is restored even if a kernel fails
+    try:
         if specific:
-            m = cluster.m
+            ek = 0.5 * (cluster.v ** 2.0)
         else:
-            m = cluter.m[indx] * cluster.m
-
-        dr = np.sqrt(dx ** 2.0 + dy ** 2.0 + dz ** 2.0)
-        rindx = dr != 0.0
-        gmr = -grav * m[rindx] / dr[rindx]
+            ek = 0.5 * cluster.m * (cluster.v ** 2.0)
 
-        pot = np.sum(gmr)
-        ek = ek[indx]
-        etot = ek + pot
+        if i_d != None:
+            indx = cluster.id == i_d
 
-    elif full:
-        x = np.array([cluster.x, cluster.y, cluster.z, cluster.m]).T
-        if parallel:
-            pot = grav * np.array(potential_energy_parallel(x))
-        else:
-            pot = grav * np.array(potential_energy(x))
+            dx = cluster.x[indx] - cluster.x
+            dy = cluster.y[indx] - cluster.y
+            dz = cluster.z[indx] - cluster.z
 
-        if specific:
-            pot /= cluster.m
-
-        etot = ek + pot
-        cluster.add_energies(ek, pot, etot)
-    else:
-        pot = []
-
-        for i in range(0, cluster.ntot):
-            dx = cluster.x[i] - cluster.x
-            dy = cluster.y[i] - cluster.y
-            dz = cluster.z[i] - cluster.z
             if specific:
                 m = cluster.m
             else:
-                m = cluter.m[i] * cluster.m
+                m = cluter.m[indx] * cluster.m
 
             dr = np.sqrt(dx ** 2.0 + dy ** 2.0 + dz ** 2.0)
-            indx = dr != 0.0
-            gmr = -grav * m[indx] / dr[indx]
+            # Without softening, stars at the same position are skipped
+            if softening > 0.0:
+                rindx = cluster.id != i_d
+            else:
+                rindx = dr != 0.0
+            gmr = -grav * m[rindx] / np.sqrt(dr[rindx] ** 2.0 + softening ** 2.0)
+
+            pot = np.sum(gmr)
+            ek = ek[indx]
+            etot = ek + pot
+
+        elif method == "tree":
+            # The kernels use the first four columns (x,y,z,m) of the phase space buffer directly
+            if parallel:
+                pot = grav * tree_potential_energy_parallel(
+                    cluster.phase, theta, leaf_size, softening
+                )
+            else:
+                pot = grav * tree_potential_energy(cluster.phase, theta, leaf_size, softening)
 
-            pot.append(np.sum(gmr))
+            if specific:
+                pot /= cluster.m
 
-        etot = ek + pot
-        cluster.add_energies(ek, pot, etot)
+            etot = ek + pot
+            cluster.add_energies(ek, pot, etot)
 
-    return_cluster(cluster, units0, origin0)
+        elif full:
+            if parallel:
+                pot = grav * potential_energy_parallel(
+                    cluster.phase, softening, numba.get_num_threads()
+                )
+            else:
+                pot = grav * potential_energy(cluster.phase, softening)
+
+            if specific:
+                pot /= cluster.m
+
+            etot = ek + pot
+            cluster.add_energies(ek, pot, etot)
+        else:
+            pot = grav * blocked_potential_energy(cluster.phase[:, :3], cluster.m, softening)
+
+            if specific:
+                pot /= cluster.m
+
+            etot = ek + pot
+            cluster.add_energies(ek, pot, etot)
+    finally:
+        if parallel and nthread is not None:
+            numba.set_num_threads(nthread0)
 
     return ek, pot, etot
 
 
 @numba.njit
-def potential_energy(cluster):
+def potential_energy(cluster, softening=0.0):
     """
     NAME:
 
@@ -285,7 +323,9 @@ def potential_energy(cluster):
 
     INPUT:
 
-       cluster=[x,y,z,m].T
+       cluster=[x,y,z,m,...].T (e.g. StarCluster.phase)
+
+       softening - Plummer softening length (default: 0.0)
 
     OUTPUT:
 
@@ -295,10 +335,14 @@ def potential_energy(cluster):
 
        2019 - Written - Webb (UofT)
     """
-    energy = [0.0] * len(cluster)
+    eps2 = softening * softening
+    energy = np.zeros(len(cluster))
     for i in range(len(cluster) - 1):
         for j in range(i + 1, len(cluster)):
-            r = distance(cluster[i], cluster[j])
+            dx = cluster[i, 0] - cluster[j, 0]
+            dy = cluster[i, 1] - cluster[j, 1]
+            dz = cluster[i, 2] - cluster[j, 2]
+            r = (dx * dx + dy * dy + dz * dz + eps2) ** 0.5
             m2 = cluster[i, 3] * cluster[j, 3]
             energy[i] += -m2 / r
             energy[j] += -m2 / r
@@ -307,19 +351,27 @@ def potential_energy(cluster):
 
 
 @numba.njit(parallel=True)
-def potential_energy_parallel(cluster):
+def potential_energy_parallel(cluster, softening=0.0, nchunk=8):
     """
     NAME:
 
-       potential_energy
+       potential_energy_parallel
 
     PURPOSE:
 
        Find potential energy for each star in a cluster (done in parallel)
+       --> Rows are dealt out cyclically to nchunk chunks, each of which accumulates into its own
+           buffer, so no two threads write to the same memory. The buffers are summed at the end, which
+           changes the order of the additions with respect to potential_energy. Results agree to
+           round-off (relative differences of order 1e-13) and are identical for nchunk=1.
 
     INPUT:
 
-       cluster=[x,y,z,m].T
+       cluster=[x,y,z,m,...].T (e.g. StarCluster.phase)
+
+       softening - Plummer softening length (default: 0.0)
+
+       nchunk - number of accumulation buffers, normally the number of threads (default: 8)
 
     OUTPUT:
 
@@ -329,26 +381,373 @@ def potential_energy_parallel(cluster):
 
        2019 - Written - Webb (UofT)
     """
+    n = len(cluster)
+    eps2 = softening * softening
+    buffer = np.zeros((nchunk, n))
+
+    for c in numba.prange(nchunk):
+        for i in range(c, n - 1, nchunk):
+            for j in range(i + 1, n):
+                dx = cluster[i, 0] - cluster[j, 0]
+                dy = cluster[i, 1] - cluster[j, 1]
+                dz = cluster[i, 2] - cluster[j, 2]
+                r = (dx * dx + dy * dy + dz * dz + eps2) ** 0.5
+                m2 = cluster[i, 3] * cluster[j, 3]
+                buffer[c, i] += -m2 / r
+                buffer[c, j] += -m2 / r
+
+    energy = np.zeros(n)
+    for i in numba.prange(n):
+        for c in range(nchunk):
+            energy[i] += buffer[c, i]
 
-    energy = [0.0] * len(cluster)
-    for i in numba.prange(len(cluster) - 1):
-        for j in range(i + 1, len(cluster)):
-            r = distance(cluster[i], cluster[j])
-            m2 = cluster[i, 3] * cluster[j, 3]
-            energy[i] += -m2 / r
-            energy[j] += -m2 / r
+    return energy
+
+
+@numba.njit
+def grow_nodes(nodes, size):
+    """
+    NAME:
+
+       grow_nodes
+
+    PURPOSE:
+
+       Return a copy of a 2D node array with room for size rows (used when building an octree)
+
+    INPUT:
+
+       nodes - array of node properties
+
+       size - new number of rows
+
+    OUTPUT:
+
+        nodes
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+    """
+    new_nodes = np.zeros((size, nodes.shape[1]), nodes.dtype)
+    new_nodes[: len(nodes)] = nodes
+    return new_nodes
+
+
+@numba.njit
+def build_octree(cluster, leaf_size=8, max_depth=64):
+    """
+    NAME:
+
+       build_octree
+
+    PURPOSE:
+
+       Build a Barnes-Hut octree of the stars in a cluster
+
+    INPUT:
+
+       cluster=[x,y,z,m,...].T (e.g. StarCluster.phase)
+
+       leaf_size - maximum number of stars in a leaf node (default: 8)
+
+       max_depth - maximum depth of the tree, nodes at this depth are always leaves (default: 64)
+
+    OUTPUT:
+
+        order - star indices sorted such that the stars in every node are contiguous
+
+        nodes - [xcentre,ycentre,zcentre,half width,mass,xcom,ycom,zcom] of each node
+
+        links - [first star in order, number of stars, first child, number of children, depth] of each node
+
+        nnode - number of nodes in the tree
+
+        depth - depth of the deepest node
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+    """
+    n = len(cluster)
+    order = np.arange(n)
+
+    size = 64 + 2 * n
+    nodes = np.zeros((size, 8))
+    links = np.zeros((size, 5), np.int64)
+
+    # Root node is a cube enclosing every star
+    xmin, xmax = np.min(cluster[:, 0]), np.max(cluster[:, 0])
+    ymin, ymax = np.min(cluster[:, 1]), np.max(cluster[:, 1])
+    zmin, zmax = np.min(cluster[:, 2]), np.max(cluster[:, 2])
+    half = 0.5 * max(xmax - xmin, ymax - ymin, zmax - zmin)
+    if half == 0.0:
+        half = 1.0
+    half *= 1.0 + 1.0e-6
+
+    nodes[0, 0] = 0.5 * (xmin + xmax)
+    nodes[0, 1] = 0.5 * (ymin + ymax)
+    nodes[0, 2] = 0.5 * (zmin + zmax)
+    nodes[0, 3] = half
+    links[0, 0] = 0
+    links[0, 1] = n
+
+    nnode = 1
+    maxdepth = 0
+    octant = np.zeros(n, np.int64)
+    buffer = np.zeros(n, np.int64)
+
+    node = 0
+    while node < nnode:
+        start, count, depth = links[node, 0], links[node, 1], links[node, 4]
+
+        if count > leaf_size and depth < max_depth:
+            if nnode + 8 > len(nodes):
+                nodes = grow_nodes(nodes, 2 * len(nodes))
+                links = grow_nodes(links, 2 * len(links))
+
+            # Sort the stars in this node by octant
+            counts = np.zeros(8, np.int64)
+            for k in range(start, start + count):
+                i = order[k]
+                o = 0
+                if cluster[i, 0] >= nodes[node, 0]:
+                    o += 1
+                if cluster[i, 1] >= nodes[node, 1]:
+                    o += 2
+                if cluster[i, 2] >= nodes[node, 2]:
+                    o += 4
+                octant[k] = o
+                counts[o] += 1
+
+            offsets = np.zeros(8, np.int64)
+            for o in range(1, 8):
+                offsets[o] = offsets[o - 1] + counts[o - 1]
+
+            fill = offsets.copy()
+            for k in range(start, start + count):
+                buffer[start + fill[octant[k]]] = order[k]
+                fill[octant[k]] += 1
+            order[start : start + count] = buffer[start : start + count]
+
+            # Add the non-empty octants as children
+            links[node, 2] = nnode
+            half = 0.5 * nodes[node, 3]
+            for o in range(8):
+                if counts[o] > 0:
+                    nodes[nnode, 0] = nodes[node, 0] + (half if o & 1 else -half)
+                    nodes[nnode, 1] = nodes[node, 1] + (half if o & 2 else -half)
+                    nodes[nnode, 2] = nodes[node, 2] + (half if o & 4 else -half)
+                    nodes[nnode, 3] = half
+                    links[nnode, 0] = start + offsets[o]
+                    links[nnode, 1] = counts[o]
+                    links[nnode, 4] = depth + 1
+                    links[node, 3] += 1
+                    nnode += 1
+                    maxdepth = max(maxdepth, depth + 1)
+
+        node += 1
+
+    # Children are always stored after their parents, so masses and centres of mass
+    # can be found by working backwards through the tree
+    for node in range(nnode - 1, -1, -1):
+        mass = 0.0
+        xcom, ycom, zcom = 0.0, 0.0, 0.0
+        if links[node, 3] == 0:
+            for k in range(links[node, 0], links[node, 0] + links[node, 1]):
+                i = order[k]
+                mass += cluster[i, 3]
+                xcom += cluster[i, 3] * cluster[i, 0]
+                ycom += cluster[i, 3] * cluster[i, 1]
+                zcom += cluster[i, 3] * cluster[i, 2]
+        else:
+            for child in range(links[node, 2], links[node, 2] + links[node, 3]):
+                mass += nodes[child, 4]
+                xcom += nodes[child, 4] * nodes[child, 5]
+                ycom += nodes[child, 4] * nodes[child, 6]
+                zcom += nodes[child, 4] * nodes[child, 7]
+
+        nodes[node, 4] = mass
+        if mass > 0.0:
+            nodes[node, 5] = xcom / mass
+            nodes[node, 6] = ycom / mass
+            nodes[node, 7] = zcom / mass
+        else:
+            nodes[node, 5] = nodes[node, 0]
+            nodes[node, 6] = nodes[node, 1]
+            nodes[node, 7] = nodes[node, 2]
+
+    return order, nodes[:nnode], links[:nnode], nnode, maxdepth
+
+
+@numba.njit
+def tree_walk(i, cluster, order, nodes, links, depth, theta, softening=0.0):
+    """
+    NAME:
+
+       tree_walk
+
+    PURPOSE:
+
+       Find the potential energy of a single star by walking an octree
+
+    INPUT:
+
+       i - index of the star
+
+       cluster=[x,y,z,m,...].T (e.g. StarCluster.phase)
+
+       order,nodes,links,depth - octree and its depth as returned by build_octree
+
+       theta - opening angle
+
+       softening - Plummer softening length (default: 0.0)
+
+    OUTPUT:
+
+        energy
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+    """
+    xi, yi, zi = cluster[i, 0], cluster[i, 1], cluster[i, 2]
+    eps2 = softening * softening
+
+    stack = np.zeros(8 * (depth + 2), np.int64)
+    stack[0] = 0
+    nstack = 1
+    phi = 0.0
+
+    while nstack > 0:
+        nstack -= 1
+        node = stack[nstack]
+
+        if links[node, 3] == 0:
+            for k in range(links[node, 0], links[node, 0] + links[node, 1]):
+                j = order[k]
+                if j != i:
+                    dx = cluster[j, 0] - xi
+                    dy = cluster[j, 1] - yi
+                    dz = cluster[j, 2] - zi
+                    r2 = dx * dx + dy * dy + dz * dz
+                    # Without softening, stars at the same position are skipped
+                    if r2 > 0.0 or eps2 > 0.0:
+                        phi += -cluster[j, 3] / (r2 + eps2) ** 0.5
+            continue
+
+        dx = nodes[node, 5] - xi
+        dy = nodes[node, 6] - yi
+        dz = nodes[node, 7] - zi
+        r = (dx * dx + dy * dy + dz * dz) ** 0.5
+
+        # Never approximate a node containing the star itself
+        inside = (
+            abs(xi - nodes[node, 0]) <= nodes[node, 3]
+            and abs(yi - nodes[node, 1]) <= nodes[node, 3]
+            and abs(zi - nodes[node, 2]) <= nodes[node, 3]
+        )
+
+        if not inside and 2.0 * nodes[node, 3] < theta * r:
+            phi += -nodes[node, 4] / (r * r + eps2) ** 0.5
+        else:
+            for child in range(links[node, 2], links[node, 2] + links[node, 3]):
+                stack[nstack] = child
+                nstack += 1
+
+    return cluster[i, 3] * phi
+
+
+@numba.njit
+def tree_potential_energy(cluster, theta=0.5, leaf_size=8, softening=0.0):
+    """
+    NAME:
+
+       tree_potential_energy
+
+    PURPOSE:
+
+       Find potential energy for each star in a cluster using a Barnes-Hut octree
+       --> Cost scales as O(N log N), with accuracy set by the opening angle theta
+
+    INPUT:
+
+       cluster=[x,y,z,m,...].T (e.g. StarCluster.phase)
+
+       theta - opening angle (default: 0.5)
+
+       leaf_size - maximum number of stars in a leaf node (default: 8)
+
+       softening - Plummer softening length (default: 0.0)
+
+    OUTPUT:
+
+        energy
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+    """
+    order, nodes, links, nnode, depth = build_octree(cluster, leaf_size)
+
+    energy = np.zeros(len(cluster))
+    for i in range(len(cluster)):
+        energy[i] = tree_walk(i, cluster, order, nodes, links, depth, theta, softening)
 
     return energy
 
 
-def closest_star(cluster, projected=False):
+@numba.njit(parallel=True)
+def tree_potential_energy_parallel(cluster, theta=0.5, leaf_size=8, softening=0.0):
+    """
+    NAME:
+
+       tree_potential_energy_parallel
+
+    PURPOSE:
+
+       Find potential energy for each star in a cluster using a Barnes-Hut octree (done in parallel)
+
+    INPUT:
+
+       cluster=[x,y,z,m,...].T (e.g. StarCluster.phase)
+
+       theta - opening angle (default: 0.5)
+
+       leaf_size - maximum number of stars in a leaf node (default: 8)
+
+       softening - Plummer softening length (default: 0.0)
+
+    OUTPUT:
+
+        energy
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+    """
+    order, nodes, links, nnode, depth = build_octree(cluster, leaf_size)
+
+    energy = np.zeros(len(cluster))
+    for i in numba.prange(len(cluster)):
+        energy[i] = tree_walk(i, cluster, order, nodes, links, depth, theta, softening)
+
+    return energy
+
+
+def closest_star(cluster, projected=False, full=True):
+
+    if full:
+        dist, nindx = cluster.nearest_neighbours(k=1, projected=projected)
+        return dist[:, 0]
 
     if projected:
         z = np.zeros(cluster.ntot)
         x = np.array([cluster.x, cluster.y, z]).T
     else:
-        x = np.array([cluster.x, cluster.y, cluster.z]).T
-    return minimum_distance(x)
+        x = cluster.phase[:, :3]
+
+    return blocked_minimum_distance(x)
 
 
 def virialize(cluster, specific=True, full=True):
@@ -399,7 +798,7 @@ def virialize(cluster, specific=True, full=True):
     return qv
 
 
-def rlagrange(cluster, nlagrange=10, projected=False):
+def rlagrange(cluster, nlagrange=10, projected=False, chunksize=None):
     """
     NAME:
 
@@ -415,6 +814,8 @@ def rlagrange(cluster, nlagrange=10, projected=False):
        cluster - StarCluster instance
        nlagrange - number of lagrange radii bins (default: 10)
        projected - calculate projected lagrange radii (default: False)
+       chunksize - read stars in blocks of chunksize stars, for clusters that do not fit in memory
+                   (see chunked_rlagrange) (default: None)
 
     OUTPUT:
 
@@ -425,8 +826,10 @@ def rlagrange(cluster, nlagrange=10, projected=False):
        2019 - Written - Webb (UofT)
     """
 
-    units0, origin0 = save_cluster(cluster)
-    cluster.to_centre()
+    if chunksize is not None:
+        return chunked_rlagrange(cluster, chunksize, nlagrange, projected)
+
+    cluster = cluster.view(origin="centre")
 
     # Radially order the stars
     msum = 0.0
@@ -444,17 +847,17 @@ def rlagrange(cluster, nlagrange=10, projected=False):
         else:
             rorder = cluster.rorder
 
+    r, m, mtot = cluster.r, cluster.m, cluster.mtot
+
     for i in range(0, cluster.ntot):
-        mfrac = cluster.mtot * float(nfrac) / float(nlagrange)
-        msum += cluster.m[rorder[i]]
+        mfrac = mtot * float(nfrac) / float(nlagrange)
+        msum += m[rorder[i]]
         if msum >= mfrac:
-            rn.append(cluster.r[rorder[i]])
+            rn.append(r[rorder[i]])
             nfrac += 1
 
     while len(rn) != nlagrange:
-        rn.append(np.max(cluster.r))
-
-    return_cluster(cluster, units0, origin0)
+        rn.append(np.max(r))
 
     return rn
 
@@ -476,7 +879,7 @@ def virial_radius(cluster, projected=False, full=True):
 
        cluster - StarCluster instance
        projected - calculate projected virial radius (default: False)
-       full - Use Numba (default:True)
+       full - Use Numba (default:True), otherwise use blocks of vectorized numpy operations
 
     OUTPUT:
 
@@ -493,33 +896,19 @@ def virial_radius(cluster, projected=False, full=True):
         if projected:
             x = np.array([cluster.x, cluster.y, np.zeros(cluster.ntot), cluster.m]).T
         else:
-            x = np.array([cluster.x, cluster.y, cluster.z, cluster.m]).T
+            x = cluster.phase
 
         ms = cluster.m
         partial_sum = weighted_inverse_distance_sum(x)
 
     else:
-        partial_sum = 0.0
-
-        ms = cluster.m
-        xs = cluster.x
-        ys = cluster.y
         if projected:
-            zs = np.zeros(cluster.ntot)
+            x = cluster.phase[:, :2]
         else:
-            zs = cluster.z
-
-        for i in range(cluster.ntot - 1):
-            x = xs[i]
-            y = ys[i]
-            z = zs[i]
-            dx = x - xs[i + 1 :]
-            dy = y - ys[i + 1 :]
-            dz = z - zs[i + 1 :]
-            dr2 = (dx * dx) + (dy * dy) + (dz * dz)
-            dr = np.sqrt(dr2)
-            m_m = ms[i] * ms[i + 1 :]
-            partial_sum += np.sum(m_m / dr)
+            x = cluster.phase[:, :3]
+
+        ms = cluster.m
+        partial_sum = blocked_weighted_inverse_distance_sum(x, ms)
 
     return (np.sum(ms) ** 2) / (2 * partial_sum)
 
@@ -537,7 +926,7 @@ def weighted_inverse_distance_sum(cluster):
 
     INPUT:
 
-       cluster=[x,y,z,m].T
+       cluster=[x,y,z,m,...].T (e.g. StarCluster.phase)
 
     OUTPUT:
 
@@ -596,9 +985,7 @@ def rvirial(
        2019 - Written - Webb (UofT)
     """
 
-    units0, origin0 = save_cluster(cluster)
-    cluster.to_realpc()
-    cluster.to_centre()
+    cluster = cluster.view(units="realpc", origin="centre")
 
     H /= 1000000.0  # (km/s) / pc
     Grav = 4.302e-3  # pc (km/s)^2 / Msun
@@ -670,8 +1057,6 @@ def rvirial(
         if filename != None:
             plt.savefig(filename)
 
-    return_cluster(cluster, units0, origin0)
-
     return r_v
 
 
@@ -859,6 +1244,10 @@ def mass_function(
     indx=None,
     projected=False,
     plot=False,
+    chunksize=None,
+    nboot=0,
+    n_jobs=1,
+    seed=None,
     **kwargs
 ):
     """
@@ -882,6 +1271,13 @@ def mass_function(
        indx - specific subset of stars
        projected - use projected values
        plot - plot the mass function
+       chunksize - read stars in blocks of chunksize stars, for clusters that do not fit in memory
+                   (see chunked_nbinmaker)
+       nboot - number of bootstrap resamples used to find ealpha and eyalpha, with mass bins found
+               again for each resample (default: 0, use the covariance of the fit instead)
+               (with chunksize, the masses of the stars selected are read into memory)
+       n_jobs - number of processes bootstrap resamples are spread across (default: 1)
+       seed - seed of bootstrap resamples (default: None)
        **kwargs - key words for plotting
 
     OUTPUT:
@@ -894,49 +1290,76 @@ def mass_function(
        2018 - Written - Webb (UofT)
     """
 
-    if projected:
-        r = cluster.rpro
-        v = cluster.vpro
+    if chunksize is not None:
+
+        def chunks():
+            for chunk in iter_chunks(cluster, chunksize, projected=projected):
+                mask = chunk_mask(
+                    chunk,
+                    mmin,
+                    mmax,
+                    rmin,
+                    rmax,
+                    vmin,
+                    vmax,
+                    emin,
+                    emax,
+                    kwmin,
+                    kwmax,
+                    indx,
+                )
+                yield chunk["m"][mask]
+
+        nindx = np.sum([len(m) for m in chunks()])
     else:
-        r = cluster.r
-        v = cluster.v
-
-    if rmin == None:
-        rmin = np.min(r)
-    if rmax == None:
-        rmax = np.max(r)
-    if vmin == None:
-        vmin = np.min(v)
-    if vmax == None:
-        vmax = np.max(v)
-    if mmin == None:
-        mmin = np.min(cluster.m)
-    if mmax == None:
-        mmax = np.max(cluster.m)
-
-    if indx is None:
-        indx = cluster.id > -1
+        if projected:
+            r = cluster.rpro
+            v = cluster.vpro
+        else:
+            r = cluster.r
+            v = cluster.v
+
+        if rmin == None:
+            rmin = np.min(r)
+        if rmax == None:
+            rmax = np.max(r)
+        if vmin == None:
+            vmin = np.min(v)
+        if vmax == None:
+            vmax = np.max(v)
+        if mmin == None:
+            mmin = np.min(cluster.m)
+        if mmax == None:
+            mmax = np.max(cluster.m)
+
+        if indx is None:
+            indx = cluster.id > -1
+
+        # Build subcluster containing only stars in the full radial and mass range:
+        indx *= (
+            (r >= rmin)
+            * (r <= rmax)
+            * (cluster.m >= mmin)
+            * (cluster.m <= mmax)
+            * (v >= vmin)
+            * (v <= vmax)
+            * (cluster.kw >= kwmin)
+            * (cluster.kw <= kwmax)
+        )
 
-    # Build subcluster containing only stars in the full radial and mass range:
-    indx *= (
-        (r >= rmin)
-        * (r <= rmax)
-        * (cluster.m >= mmin)
-        * (cluster.m <= mmax)
-        * (v >= vmin)
-        * (v <= vmax)
-        * (cluster.kw >= kwmin)
-        * (cluster.kw <= kwmax)
-    )
+        if emin != None:
+            indx *= cluster.etot >= emin
+        if emin != None:
+            indx *= cluster.etot <= emax
 
-    if emin != None:
-        indx *= cluster.etot >= emin
-    if emin != None:
-        indx *= cluster.etot <= emax
+        nindx = np.sum(indx)
 
-    if np.sum(indx) >= nmass:
+    if nindx >= nmass:
 
-        m_lower, m_mean, m_upper, m_hist = nbinmaker(cluster.m[indx], nmass)
+        if chunksize is not None:
+            m_lower, m_mean, m_upper, m_hist = chunked_nbinmaker(chunks, nmass)
+        else:
+            m_lower, m_mean, m_upper, m_hist = nbinmaker(cluster.m[indx], nmass)
 
         lm_mean = np.log10(m_mean)
         dm = m_hist / (m_upper - m_lower)
@@ -946,6 +1369,16 @@ def mass_function(
         ealpha = np.sqrt(V[0][0])
         eyalpha = np.sqrt(V[1][1])
 
+        if nboot > 0:
+            if chunksize is not None:
+                m = np.concatenate(list(chunks()))
+            else:
+                m = cluster.m[indx]
+
+            ealpha, eyalpha = bootstrap_errors(
+                resample_slopes, (np.sort(m), nmass), nboot, n_jobs, seed
+            )
+
         if plot:
             filename = kwargs.get("filename", None)
             nplot(m_mean, np.log10(dm), xlabel="M", ylabel="LOG(dN/dM)", **kwargs)
@@ -990,6 +1423,9 @@ def eta_function(
     indx=None,
     projected=False,
     plot=False,
+    nboot=0,
+    n_jobs=1,
+    seed=None,
     **kwargs
 ):
     """
@@ -1022,6 +1458,13 @@ def eta_function(
        projected - use projected values
 
        plot - plot the mass function
+
+       nboot - number of bootstrap resamples used to find eeta and eyeta, with mass bins found again
+               for each resample (default: 0, use the covariance of the fit instead)
+
+       n_jobs - number of processes bootstrap resamples are spread across (default: 1)
+
+       seed - seed of bootstrap resamples (default: None)
        
        **kwargs - key words for plotting
 
@@ -1090,6 +1533,16 @@ def eta_function(
         eeta = np.sqrt(V[0][0])
         eyeta = np.sqrt(V[1][1])
 
+        if nboot > 0:
+            morder = np.argsort(cluster.m[indx])
+            eeta, eyeta = bootstrap_errors(
+                resample_dispersion_slopes,
+                (cluster.m[indx][morder], v[indx][morder], nmass),
+                nboot,
+                n_jobs,
+                seed,
+            )
+
         if plot:
             filename = kwargs.get("filename", None)
             nplot(m_mean, np.log10(sigvm), xlabel="M", ylabel=r"$\sigma_v$", **kwargs)
@@ -1218,14 +1671,14 @@ def surface_area(
         indx *= cluster.etot <= emax
 
     if coords == "xy":
-        x = cluster.x
-        y = cluster.y
+        x = cluster.x[indx]
+        y = cluster.y[indx]
     elif coords == "xz":
-        x = cluster.x
-        y = cluster.z
+        x = cluster.x[indx]
+        y = cluster.z[indx]
     elif coords == "yz":
-        x = cluster.y
-        y = cluster.z
+        x = cluster.y[indx]
+        y = cluster.z[indx]
 
     return area_enclosed(
         x, y, thresh=thresh, nrand=nrand, method=method, full=full, plot=plot
@@ -3,6 +3,13 @@
 import numpy as np
 from galpy.util import bovy_conversion
 import os
+import json
+import warnings
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from copy import copy, deepcopy
 from .cluster import StarCluster
 from .operations import *
 from .orbit import initialize_orbit
@@ -35,7 +42,7 @@ def load_cluster(
 
     INPUT:
 
-       ctype - Type of file being loaded (Currently supports nbody6, nbody6se, gyrfalcon, snaptrim,snapauto, nbodypy, snapshot)
+       ctype - Type of file being loaded (Currently supports nbody6, nbody6se, gyrfalcon, snaptrim,snapauto, nbodypy, snapshot, npy)
 
        units - units of input data (default: realkpc)
 
@@ -54,6 +61,9 @@ def load_cluster(
         ounits - units of orbital information (else assumed equal to StarCluster.units)
 
         nsnap - if a specific snapshot is to be read in instead of starting from zero
+                (files holding many snapshots are moved straight to it, see get_snapshot_index)
+
+        tsnap - read in the first snapshot at or after this time (files holding many snapshots only)
     
         nzfill - value for zfill when reading and writing snapshots (Default: 5)
     
@@ -71,6 +81,20 @@ def load_cluster(
 
         do_rorder - sort stars in order from closes to the origin to the farthest
 
+        centre_tracker - a CentreTracker used to start find_centre from the centre of the previous snapshot
+
+        columns - only read these columns of stars (snapshot, nbodypy, nbody6, nbody6se and npy only) (default: None, all)
+                  --> masses and positions are always read, velocities not read are set to zero
+                      (except for npy snapshots, where they are stored with positions)
+                  --> columns can include names of stellar evolution (se_names), energy (energy_names)
+                      and binary (bse_names) arrays of StarCluster, which are otherwise not stored
+
+        where - only keep stars with values in these ranges (snapshot, nbodypy, nbody6, nbody6se and npy only) (default: None)
+                --> a dictionary of column names (m,x,y,z,vx,vy,vz,id,kw,logl,logr) and (min,max), with None for no limit,
+                    or a list of values to keep e.g. {"m":(0.1,0.8),"x":(-10.,10.),"id":ids}
+                --> values are in the units the snapshot is read in, before any change of units or origin
+                --> stars are selected as soon as they are read (see where_mask)
+
 
     OUTPUT:
 
@@ -88,10 +112,17 @@ def load_cluster(
     if "ofilename" in kwargs and ofile == None:
         ofile = open(wdir + kwargs.get("ofilename"), "r")
 
+    nsnap = int(kwargs.get("nsnap", 0))
+    tsnap = kwargs.pop("tsnap", None)
+    seek = nsnap != 0 or tsnap is not None
+
     if ctype == "nbody6se":
         # When stellar evolution is turned on, read in fort.82 and fort.83 and if possible gc_orbit.dat
         fort82 = open("%sfort.82" % wdir, "r")
         fort83 = open("%sfort.83" % wdir, "r")
+        if seek:
+            kwargs["nsnap"] = seek_snapshot(fort83, nsnap=nsnap, tsnap=tsnap)
+            seek_snapshot(fort82, nsnap=kwargs["nsnap"])
         cluster = get_nbody6_jarrod(
             fort82, fort83, ofile=ofile, advance=False, **kwargs
         )
@@ -102,6 +133,10 @@ def load_cluster(
         else:
             out9 = None
         out34 = open("%sOUT34" % wdir, "r")
+        if seek:
+            kwargs["nsnap"] = seek_snapshot(out34, nsnap=nsnap, tsnap=tsnap)
+            if out9 != None:
+                seek_snapshot(out9, nsnap=kwargs["nsnap"])
         cluster = get_nbody6_out(out9, out34, advance=False, **kwargs)
     elif ctype == "snapauto":
         # Read in snapshot produced from snapauto.f which reads binary files from either NBODY6 or NBODY6++
@@ -116,6 +151,10 @@ def load_cluster(
     elif ctype == "gyrfalcon":
         # Read in snapshot from gyrfalcon.
         filein = open(wdir + filename, "r")
+        if seek:
+            kwargs["nsnap"] = seek_snapshot(
+                filein, nsnap=nsnap, tsnap=tsnap, ftype="gyrfalcon"
+            )
         cluster = get_gyrfalcon(filein, "WDunits", "galaxy", advance=False, **kwargs)
     elif ctype == "snaptrim":
         # Read in snaptrim snapshot from gyrfalcon.
@@ -146,6 +185,11 @@ def load_cluster(
             advance=False,
             **kwargs
         )
+    elif ctype == "npy":
+        # Read in binary snapshot written by npyout
+        cluster = get_npy_snapshot(
+            filename=filename, ofile=ofile, advance=False, **kwargs
+        )
     elif ctype == "mycode":
         # Read in new cluster type
         cluster = get_mycode()
@@ -236,6 +280,12 @@ def advance_cluster(cluster, ofile=None, orbit=None, filename=None, **kwargs):
 
         same as load_cluster
 
+        prefetch - number of snapshots to read ahead in the background while the current one is analysed
+                   (see SnapshotPrefetcher). Once started, the prefetcher is passed on to each new snapshot
+                   and used by later calls (default: 0)
+
+        prefetch_processes - read ahead with a pool of processes instead of a thread (default: False)
+
     OUTPUT:
 
        StarCluster instance
@@ -245,6 +295,29 @@ def advance_cluster(cluster, ofile=None, orbit=None, filename=None, **kwargs):
        2018 - Written - Webb (UofT)
 
     """
+    prefetch = kwargs.pop("prefetch", 0)
+    prefetch_processes = kwargs.pop("prefetch_processes", False)
+
+    if cluster.prefetcher is None and prefetch > 0:
+        cluster.prefetcher = SnapshotPrefetcher(
+            cluster,
+            nprefetch=prefetch,
+            processes=prefetch_processes,
+            ofile=ofile,
+            orbit=orbit,
+            filename=filename,
+            **kwargs
+        )
+
+    if cluster.prefetcher is not None:
+        prefetcher = cluster.prefetcher
+        cluster = prefetcher.next_cluster()
+        if cluster.ntot == 0:
+            prefetcher.close()
+        else:
+            cluster.prefetcher = prefetcher
+        return cluster
+
     advance_kwargs = get_advanced_kwargs(cluster, **kwargs)
 
     if "kwfile" in kwargs:
@@ -310,6 +383,10 @@ def advance_cluster(cluster, ofile=None, orbit=None, filename=None, **kwargs):
             advance=True,
             **advance_kwargs
         )
+    elif cluster.ctype == "npy":
+        cluster = get_npy_snapshot(
+            filename=filename, ofile=ofile, advance=True, **advance_kwargs
+        )
     elif cluster.ctype == "mycode":
         cluster = get_mycode()
     else:
@@ -382,169 +459,1145 @@ def get_advanced_kwargs(cluster, **kwargs):
 
        cluster - StarCluster instance
 
-    KWARGS:
+    KWARGS:
+
+        same a load_cluster
+
+    OUTPUT:
+
+       None
+
+    HISTORY:
+
+       2019 - Written - Webb (UofT)
+
+    """
+
+    kwfile = kwargs.get("kwfile", None)
+
+    nsnap = np.maximum(int(kwargs.get("nsnap", 0)), cluster.nsnap) + 1
+    delimiter = kwargs.get("delimiter", cluster.delimiter)
+    wdir = kwargs.get("wdir", cluster.wdir)
+    nzfill = int(kwargs.get("nzfill", cluster.nzfill))
+    snapbase = kwargs.get("snapbase", cluster.snapbase)
+    snapend = kwargs.get("snapend", cluster.snapend)
+    snapdir = kwargs.get("snapdir", cluster.snapdir)
+    skiprows = kwargs.get("skiprows", cluster.skiprows)
+
+    projected = kwargs.get("projected", cluster.projected)
+
+    centre_tracker = kwargs.get("centre_tracker", cluster.centre_tracker)
+
+    columns = kwargs.get("columns", cluster.columns)
+    where = kwargs.get("where", cluster.where)
+
+    return {
+        "kwfile": kwfile,
+        "nsnap": nsnap,
+        "delimiter": delimiter,
+        "wdir": wdir,
+        "nzfill": nzfill,
+        "snapbase": snapbase,
+        "snapend": snapend,
+        "snapdir": snapdir,
+        "skiprows": skiprows,
+        "projected": projected,
+        "centre_tracker": centre_tracker,
+        "columns": columns,
+        "where": where,
+    }  # ,"sfile":sfile,"bfile":bfile}
+
+
+def iter_clusters(
+    ctype="snapshot",
+    units="realpc",
+    origin="cluster",
+    ofile=None,
+    orbit=None,
+    filename=None,
+    start=0,
+    stop=None,
+    step=1,
+    tmin=None,
+    tmax=None,
+    **kwargs
+):
+    """
+    NAME:
+
+       iter_clusters
+
+    PURPOSE:
+
+       Iterate over the snapshots of a simulation, loading each one only when it is needed
+       --> Snapshots start,start+step,... before stop are given, as with range(start,stop,step),
+           limited to times between tmin and tmax
+       --> Skipped snapshots are not read. Files holding many snapshots (nbody6, nbody6se, gyrfalcon) are moved
+           past them with their snapshot index (see get_snapshot_index), which also sets the snapshots
+           between tmin and tmax. Snapshots in separate files are loaded directly by number, but have to be read
+           to find their time. Skipped lines of an orbit file are read past without being parsed
+       --> Files opened here (including the orbit file if ofilename is given) are closed when the iteration
+           ends, or when it is stopped early
+
+    INPUT:
+
+       ctype,units,origin,ofile,orbit,filename - same as load_cluster
+
+       start - number of the first snapshot (default: 0)
+
+       stop - number of the snapshot to stop before (default: None, continue to the last snapshot)
+
+       step - number of snapshots between snapshots given (default: 1)
+
+       tmin - skip snapshots before this time (default: None)
+
+       tmax - stop after the last snapshot at or before this time (default: None)
+
+    KWARGS:
+
+        same as load_cluster and advance_cluster
+        --> prefetch is only used when step=1
+
+    OUTPUT:
+
+       StarCluster instances
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    wdir = kwargs.get("wdir", "./")
+
+    if "ofilename" in kwargs and ofile == None:
+        ofile = open(wdir + kwargs.pop("ofilename"), "r")
+        close_ofile = True
+    else:
+        close_ofile = False
+
+    if step != 1:
+        kwargs.pop("prefetch", None)
+
+    kwargs.pop("nsnap", None)
+    kwargs.pop("tsnap", None)
+
+    # Files holding many snapshots have an index of the time of each snapshot
+    indexed = ctype in ["nbody6", "nbody6se", "gyrfalcon"]
+    if ctype == "gyrfalcon":
+        ftype = "gyrfalcon"
+    else:
+        ftype = None
+
+    start, stop = get_snapshot_range(
+        ctype, filename, start, stop, step, tmin, tmax, wdir=wdir
+    )
+
+    cluster = None
+
+    try:
+        if stop is not None and start >= stop:
+            return
+
+        cluster = load_cluster(
+            ctype=ctype,
+            units=units,
+            origin=origin,
+            ofile=ofile,
+            orbit=orbit,
+            filename=filename,
+            nsnap=start,
+            **kwargs
+        )
+
+        while cluster.ntot != 0:
+            if tmax is not None and cluster.tphys > tmax:
+                break
+
+            if tmin is None or cluster.tphys >= tmin:
+                yield cluster
+
+            nsnap = cluster.nsnap + step
+            if stop is not None and nsnap >= stop:
+                break
+
+            if step != 1:
+                if indexed:
+                    seek_snapshot(cluster.sfile, nsnap=nsnap, ftype=ftype)
+                    if cluster.bfile != None:
+                        seek_snapshot(cluster.bfile, nsnap=nsnap)
+                if ofile != None:
+                    for i in range(0, step - 1):
+                        ofile.readline()
+
+            previous = cluster
+            cluster = advance_cluster(
+                cluster,
+                ofile=ofile,
+                orbit=orbit,
+                filename=filename,
+                nsnap=nsnap - 1,
+                **kwargs
+            )
+
+            # Close files left behind when advancing to a restart
+            for filein in [previous.sfile, previous.bfile]:
+                if hasattr(filein, "close") and filein not in [cluster.sfile, cluster.bfile]:
+                    filein.close()
+    finally:
+        if cluster != None:
+            if cluster.prefetcher is not None:
+                cluster.prefetcher.close()
+            for filein in [cluster.sfile, cluster.bfile]:
+                if hasattr(filein, "close"):
+                    filein.close()
+        if close_ofile:
+            ofile.close()
+
+
+def get_snapshot_range(
+    ctype, filename=None, start=0, stop=None, step=1, tmin=None, tmax=None, wdir="./"
+):
+    """
+    NAME:
+
+       get_snapshot_range
+
+    PURPOSE:
+
+       Find the first and last snapshots to read from a simulation
+       --> For files holding many snapshots (nbody6, nbody6se, gyrfalcon), the snapshot index
+           (see get_snapshot_index) gives the number of snapshots and the snapshots between tmin and tmax
+       --> For snapshots in separate files, start and stop are returned unchanged
+
+    INPUT:
+
+       ctype - type of file being loaded
+
+       filename - name of file (gyrfalcon only) (default: None)
+
+       start,stop,step - snapshots start,start+step,... before stop are read (default: 0,None,1)
+
+       tmin,tmax - range of times of snapshots to read (default: None)
+
+       wdir - working directory of snapshots (default: ./)
+
+    OUTPUT:
+
+       start,stop (stop is None if unknown)
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    if ctype == "nbody6":
+        offsets, times, nstars = get_snapshot_index("%sOUT34" % wdir)
+    elif ctype == "nbody6se":
+        offsets, times, nstars = get_snapshot_index("%sfort.83" % wdir)
+    elif ctype == "gyrfalcon":
+        offsets, times, nstars = get_snapshot_index(wdir + filename, "gyrfalcon")
+    else:
+        return start, stop
+
+    if tmin is not None:
+        nmin = int(np.searchsorted(times, tmin, side="left"))
+        if nmin > start:
+            start += int(np.ceil(float(nmin - start) / step)) * step
+    if tmax is not None:
+        nmax = int(np.searchsorted(times, tmax, side="right"))
+        if stop is None or nmax < stop:
+            stop = nmax
+    if stop is None or len(offsets) < stop:
+        stop = len(offsets)
+
+    return start, stop
+
+
+def load_snapshot(ctype, nsnap, units, origin, ofilename=None, orbit=None, filename=None, **kwargs):
+    """
+    NAME:
+
+       load_snapshot
+
+    PURPOSE:
+
+       Load snapshot nsnap of a simulation on its own, without an opened file from a previous snapshot
+       (used by SnapshotPrefetcher in other processes)
+       --> Files holding many snapshots are moved straight to snapshot nsnap (see get_snapshot_index)
+       --> Key parameters are found as in advance_cluster
+       --> Opened files are closed, so the cluster can be sent between processes
+
+    INPUT:
+
+       ctype - type of file being loaded
+
+       nsnap - number of the snapshot
+
+       units - units of input data
+
+       origin - origin of input data
+
+       ofilename - name of file containing orbital information (default: None)
+
+       orbit - a galpy orbit to be used for the StarCluster's orbital information (default: None)
+
+       filename - name of file to be opened (default: None)
+
+    KWARGS:
+
+        same as load_cluster
+
+    OUTPUT:
+
+       StarCluster instance
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    if ofilename != None:
+        ofile = open(ofilename, "r")
+    else:
+        ofile = None
+
+    cluster = load_cluster(
+        ctype=ctype,
+        units=units,
+        origin=origin,
+        ofile=ofile,
+        orbit=orbit,
+        filename=filename,
+        nsnap=nsnap,
+        **kwargs
+    )
+
+    if cluster.ntot != 0:
+        cluster.key_params()
+
+    for filein in [ofile, cluster.sfile, cluster.bfile]:
+        if hasattr(filein, "close"):
+            filein.close()
+    cluster.sfile = None
+    cluster.bfile = None
+
+    return cluster
+
+
+class SnapshotPrefetcher(object):
+    """
+    NAME:
+
+       SnapshotPrefetcher
+
+    PURPOSE:
+
+       Read and parse the snapshots that follow a StarCluster in the background, so the next snapshots are
+       ready when the current one has been analysed
+       --> With a thread (default), the snapshots are read one after another with advance_cluster,
+           as they would be without prefetching. This works for all ctypes
+       --> With processes, nprefetch snapshots are read at the same time, each on its own with load_cluster
+           and nsnap (see load_snapshot), which avoids the parsing being limited by Python's GIL. This works
+           for snapshots in separate files and for files with a snapshot index (nbody6, nbody6se, gyrfalcon),
+           but restarts in a cont/ directory are not followed
+       --> At most nprefetch snapshots are held in memory, and snapshots are always given in order
+       --> Snapshots are read with the units and origin of the cluster the prefetcher started from
+       --> With a thread, a CentreTracker given to the cluster is copied for the thread, so centres found
+           in the snapshots given out never update the tracker while the thread is using it. The centres the
+           thread found up to each snapshot are passed to the tracker when the snapshot is given out
+
+    INPUT:
+
+       cluster - StarCluster instance to start from
+
+       nprefetch - number of snapshots to read ahead (default: 2)
+
+       processes - read snapshots in a pool of processes instead of a thread (default: False)
+
+       ofile,orbit,filename - same as advance_cluster
+
+    KWARGS:
+
+       same as advance_cluster
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+
+    def __init__(
+        self,
+        cluster,
+        nprefetch=2,
+        processes=False,
+        ofile=None,
+        orbit=None,
+        filename=None,
+        **kwargs
+    ):
+
+        self.nprefetch = nprefetch
+        self.processes = processes
+        self.ctype = cluster.ctype
+        self.stopped = False
+
+        if processes:
+            load_kwargs = get_advanced_kwargs(cluster, **kwargs)
+            # Each snapshot is found independently, so there is no previous centre to start from
+            load_kwargs["centre_tracker"] = None
+            self.nsnap = load_kwargs.pop("nsnap")
+
+            # Stellar types read from kwfile are kept from the starting snapshot, as in advance_cluster
+            if load_kwargs.pop("kwfile", None) != None:
+                self.kw0 = cluster.kw
+            else:
+                self.kw0 = None
+
+            if ofile != None:
+                ofilename = os.path.abspath(ofile.name)
+            else:
+                ofilename = None
+
+            if filename == None and cluster.ctype == "gyrfalcon":
+                filename = os.path.relpath(cluster.sfile.name, load_kwargs["wdir"])
+
+            self.load_args = (cluster.units, cluster.origin, ofilename, orbit, filename)
+            self.load_kwargs = load_kwargs
+
+            self.executor = ProcessPoolExecutor(max_workers=nprefetch)
+            self.futures = deque()
+            for i in range(0, nprefetch):
+                self.submit()
+        else:
+            # Snapshots given out keep the tracker of the cluster, while the thread uses its own copy
+            self.centre_tracker = kwargs.get("centre_tracker", cluster.centre_tracker)
+            if self.centre_tracker is not None:
+                self.thread_tracker = deepcopy(self.centre_tracker)
+                self.nlocal = self.thread_tracker.nlocal
+                self.nglobal = self.thread_tracker.nglobal
+                kwargs = dict(kwargs, centre_tracker=self.thread_tracker)
+            else:
+                self.thread_tracker = None
+
+            self.clusters = deque()
+            self.condition = threading.Condition()
+            self.thread = threading.Thread(
+                target=self.run, args=(cluster, ofile, orbit, filename, kwargs)
+            )
+            self.thread.daemon = True
+            self.thread.start()
+
+    def submit(self):
+        """
+        NAME:
+
+           submit
+
+        PURPOSE:
+
+           Start reading the next snapshot in the pool of processes
+
+        INPUT:
+
+           None
+
+        OUTPUT:
+
+           None
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        self.futures.append(
+            self.executor.submit(
+                load_snapshot, self.ctype, self.nsnap, *self.load_args, **self.load_kwargs
+            )
+        )
+        self.nsnap += 1
+
+    def run(self, cluster, ofile, orbit, filename, kwargs):
+        """
+        NAME:
+
+           run
+
+        PURPOSE:
+
+           Read snapshots one after another in the background thread, waiting whenever nprefetch
+           snapshots are ready
+
+        INPUT:
+
+           cluster - StarCluster instance to start from
+
+           ofile,orbit,filename,kwargs - same as advance_cluster
+
+        OUTPUT:
+
+           None
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        # Advance from a copy, so changes made to the snapshots given out do not affect the next ones
+        cluster = copy(cluster)
+        cluster.prefetcher = None
+
+        while True:
+            try:
+                cluster = advance_cluster(
+                    cluster, ofile=ofile, orbit=orbit, filename=filename, **kwargs
+                )
+                item = cluster
+            except Exception as error:
+                item = error
+
+            if self.thread_tracker is not None:
+                centres = (
+                    dict(self.thread_tracker.centres),
+                    self.thread_tracker.nlocal,
+                    self.thread_tracker.nglobal,
+                )
+            else:
+                centres = None
+
+            with self.condition:
+                while len(self.clusters) >= self.nprefetch and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                self.clusters.append((item, centres))
+                self.condition.notify_all()
+
+            if isinstance(item, Exception) or cluster.ntot == 0:
+                return
+
+            cluster = copy(cluster)
+
+    def next_cluster(self):
+        """
+        NAME:
+
+           next_cluster
+
+        PURPOSE:
+
+           Get the next snapshot, waiting for it to be read if necessary
+
+        INPUT:
+
+           None
+
+        OUTPUT:
+
+           StarCluster instance (with ntot=0 after the last snapshot)
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        if self.processes:
+            if len(self.futures) == 0:
+                return StarCluster(0, 0.0, ctype=self.ctype)
+
+            cluster = self.futures.popleft().result()
+
+            if cluster.ntot == 0:
+                self.close()
+            else:
+                if self.kw0 is not None:
+                    cluster.kw[cluster.id - 1] = self.kw0
+                self.submit()
+        else:
+            with self.condition:
+                while len(self.clusters) == 0:
+                    if not self.thread.is_alive():
+                        return StarCluster(0, 0.0, ctype=self.ctype)
+                    self.condition.wait(0.1)
+                cluster, centres = self.clusters.popleft()
+                self.condition.notify_all()
+
+            if isinstance(cluster, Exception):
+                self.close()
+                raise cluster
+
+            if self.centre_tracker is not None:
+                # Searches made by the thread are counted once, when their snapshot is given out
+                centres, nlocal, nglobal = centres
+                self.centre_tracker.centres.update(centres)
+                self.centre_tracker.nlocal += nlocal - self.nlocal
+                self.centre_tracker.nglobal += nglobal - self.nglobal
+                self.nlocal, self.nglobal = nlocal, nglobal
+                cluster.centre_tracker = self.centre_tracker
+
+        return cluster
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        cluster = self.next_cluster()
+        if cluster.ntot == 0:
+            raise StopIteration
+        return cluster
+
+    def close(self):
+        """
+        NAME:
+
+           close
+
+        PURPOSE:
+
+           Stop reading snapshots and release the thread or processes
+
+        INPUT:
+
+           None
+
+        OUTPUT:
+
+           None
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        if self.processes:
+            for future in self.futures:
+                future.cancel()
+            self.futures.clear()
+            self.executor.shutdown(wait=False)
+        else:
+            with self.condition:
+                self.stopped = True
+                self.clusters.clear()
+                self.condition.notify_all()
+            if self.thread is not threading.current_thread():
+                self.thread.join()
+
+
+def get_cluster_orbit(cluster, ofile, advance=False, **kwargs):
+    """
+    NAME:
+
+       get_cluster_orbit
+
+    PURPOSE:
+
+       Read in cluster oribit from an ascii file and apply it to StarCluster instance
+        -->Columns assumed to be time,x,y,z,vx,vy,vz.
+        -->As I have hardcoded for gc_orbit.dat, if a certain filename is commonly used
+        with specific columns, an if statement can easily be added.
+            --> Note that gc_orbit.dat comes from running 'grep 'CLUSTER ORBIT' logfile > gc_orbit.dat' on 
+            the standard Nbody6 logfile
+
+    INPUT:
+
+       cluster - StarCluster instance
+
+       ofile - opened orbit file
+
+    KWARGS:
+
+        advance - Is this a continuation from a previous timestep, in which case read next line (default: False)
+        nsnap - if nsnap is provided, read line # nsnap from the orbit file
+        ounits - if you units are not the same as StarCluster units, provide them and they will be converted
+
+    OUTPUT:
+
+       None
+
+    HISTORY:
+
+       2018 - Written - Webb (UofT)
+
+    """
+
+    nsnap = int(kwargs.get("nsnap", cluster.nsnap))
+    ounits = kwargs.get("ounits", None)
+
+    # Read in orbital information from orbit
+    if nsnap != 0 and not advance:
+        seek_snapshot(ofile, nsnap=nsnap, ftype="orbit")
+        data = ofile.readline().split()
+    else:
+        data = ofile.readline().split()
+
+    if "gc_orbit.dat" in ofile.name:
+        # Saved orbit from doing a grep of NBODY6 or NBODY6++ logfile
+
+        if len(data) == 18:
+            xgc = float(data[9])
+            ygc = float(data[10])
+            zgc = float(data[11])
+            vxgc = float(data[12])
+            vygc = float(data[13])
+            vzgc = float(data[14])
+        else:
+            xgc = float(data[8])
+            ygc = float(data[9])
+            zgc = float(data[10])
+            vxgc = float(data[11])
+            vygc = float(data[12])
+            vzgc = float(data[13])
+    else:
+        tphys = float(data[0])
+        xgc = float(data[1])
+        ygc = float(data[2])
+        zgc = float(data[3])
+        vxgc = float(data[4])
+        vygc = float(data[5])
+        vzgc = float(data[6])
+
+        if cluster.tphys == 0.0:
+            cluster.tphys = tphys
+
+    if ounits == None and "gc_orbit.dat" in ofile.name:
+        ounits = "realkpc"
+
+    cluster.add_orbit(xgc, ygc, zgc, vxgc, vygc, vzgc, ounits)
+
+    return
+
+
+def where_mask(where, values):
+    """
+    NAME:
+
+       where_mask
+
+    PURPOSE:
+
+       Find which stars to keep when a snapshot is read with a selection (see load_cluster)
+
+    INPUT:
+
+       where - dictionary of column names and (min,max), with None for no limit, or a list of values to keep
+
+       values - dictionary of column names and values of stars
+
+    OUTPUT:
+
+       indx - boolean array of stars to keep
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    indx = None
+
+    for name in where:
+        if name not in values:
+            print("CANNOT SELECT STARS BY ", name)
+            continue
+
+        column = values[name]
+        if indx is None:
+            indx = np.ones(len(column), dtype=bool)
+
+        if isinstance(where[name], tuple):
+            vmin, vmax = where[name]
+            if vmin is not None:
+                indx *= column >= vmin
+            if vmax is not None:
+                indx *= column <= vmax
+        else:
+            indx *= np.isin(column, where[name])
+
+    if indx is None:
+        indx = np.ones(len(list(values.values())[0]), dtype=bool)
+
+    return indx
+
+
+def read_columns(columns, names):
+    """
+    NAME:
+
+       read_columns
+
+    PURPOSE:
+
+       Check if any of a set of columns is to be read when a snapshot is read (see load_cluster)
+
+    INPUT:
+
+       columns - columns to be read (None for all)
+
+       names - names of columns
+
+    OUTPUT:
+
+       True if any of names is in columns
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    if columns is None:
+        return True
+
+    for name in names:
+        if name in columns:
+            return True
+
+    return False
+
+
+def get_kwtype(cluster, kwfile):
+    """
+    NAME:
+
+       get_kwtype
+
+    PURPOSE:
+
+       Get stellar evolution type of the star (kw in Nbody6 syntax) if information is in a separate file
+       --> Columns assumed to be ID, KW
+       --> see def kwtypes() in cluster.py for what different kw types mean
+
+    INPUT:
+
+       cluster - StarCluster instance
+
+       kwfile - opened file containing kw type
+
+    KWARGS:
+
+        advance - Is this a continuation from a previous timestep, in which case read next line (default: False)
+        nsnap - if nsnap is provided, read line # nsnap from the orbit file
+        ounits - if you units are not the same as StarCluster units, provide them and they will be converted
+
+    OUTPUT:
+
+       None
+
+    HISTORY:
+
+       2018 - Written - Webb (UofT)
+
+    """
+
+    kw = np.loadtxt(kwfile)[:, 1]
+    indx = cluster.id - 1
+    kw0 = kw[indx]
+    return kw0
+
+
+def snapshot_file_type(filename):
+    """
+    NAME:
+
+       snapshot_file_type
+
+    PURPOSE:
+
+       Get the type of a file holding many snapshots from its name
+
+    INPUT:
+
+       filename - name of file
+
+    OUTPUT:
+
+       ftype ('out34','out9','fort82','fort83' or 'orbit', None if not known)
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    name = os.path.basename(filename)
+    if "OUT34" in name:
+        return "out34"
+    elif "OUT9" in name:
+        return "out9"
+    elif "fort.82" in name:
+        return "fort82"
+    elif "fort.83" in name:
+        return "fort83"
+    elif "orbit" in name:
+        return "orbit"
+    else:
+        return None
+
+
+def build_snapshot_index(filename, ftype, offset=0):
+    """
+    NAME:
+
+       build_snapshot_index
+
+    PURPOSE:
+
+       Scan a file holding many snapshots and find where each snapshot starts
+       --> ftype sets how snapshots are separated:
+           'out34' - 3 header lines (N, time) and rows up to a star id below -999 (NBODY6 OUT34)
+           'out9' - 3 header lines (N) and N rows (NBODY6 OUT9)
+           'fort83' - 3 header lines (N, time) and rows up to a star id below 1 (NBODY6 fort.83)
+           'fort82' - 1 header line (N) and rows up to a star id below 1 (NBODY6 fort.82)
+           'gyrfalcon' - header lines starting with # (Ntot, time) and Ntot rows
+           'orbit' - one line per snapshot, starting with the time
+
+    INPUT:
+
+       filename - name of file
+
+       ftype - type of file
 
-        same a load_cluster
+       offset - byte offset to start scanning from (default: 0)
 
     OUTPUT:
 
-       None
+       offsets,times,nstars - byte offset, time and number of stars of each snapshot (time is nan if not
+                              in the file)
 
     HISTORY:
 
-       2019 - Written - Webb (UofT)
+       2020 - Written - Webb (UofT)
 
     """
+    offsets = []
+    times = []
+    nstars = []
 
-    kwfile = kwargs.get("kwfile", None)
-
-    nsnap = np.maximum(int(kwargs.get("nsnap", 0)), cluster.nsnap) + 1
-    delimiter = kwargs.get("delimiter", cluster.delimiter)
-    wdir = kwargs.get("wdir", cluster.wdir)
-    nzfill = int(kwargs.get("nzfill", cluster.nzfill))
-    snapbase = kwargs.get("snapbase", cluster.snapbase)
-    snapend = kwargs.get("snapend", cluster.snapend)
-    snapdir = kwargs.get("snapdir", cluster.snapdir)
-    skiprows = kwargs.get("skiprows", cluster.skiprows)
-
-    projected = kwargs.get("projected", cluster.projected)
-
-    return {
-        "kwfile": kwfile,
-        "nsnap": nsnap,
-        "delimiter": delimiter,
-        "wdir": wdir,
-        "nzfill": nzfill,
-        "snapbase": snapbase,
-        "snapend": snapend,
-        "snapdir": snapdir,
-        "skiprows": skiprows,
-        "projected": projected,
-    }  # ,"sfile":sfile,"bfile":bfile}
+    if ftype == "out34":
+        idmin = -999
+    else:
+        idmin = 1
+
+    with open(filename, "rb") as filein:
+        filein.seek(offset)
+        start = filein.tell()
+        line = filein.readline()
+
+        while len(line) > 0:
+            data = line.split()
+
+            if ftype == "orbit":
+                offsets.append(start)
+                try:
+                    times.append(float(data[0]))
+                except (IndexError, ValueError):
+                    times.append(np.nan)
+                nstars.append(1)
+            elif len(data) == 0:
+                pass
+            elif ftype == "gyrfalcon":
+                ntot = 0
+                tphys = np.nan
+                while len(line) > 0 and line.lstrip().startswith(b"#"):
+                    data = line.split()
+                    if any(b"Ntot" in dat for dat in data):
+                        ntot = int(data[2][:-1])
+                    if any(b"time" in dat for dat in data):
+                        tphys = float(data[2]) * 1000.0
+                    line = filein.readline()
+
+                offsets.append(start)
+                times.append(tphys)
+                nstars.append(ntot)
+
+                for i in range(0, ntot - 1):
+                    filein.readline()
+            else:
+                offsets.append(start)
+                nstars.append(int(float(data[0])))
+                if ftype == "out34" or ftype == "fort83":
+                    times.append(float(data[1]))
+                else:
+                    times.append(np.nan)
+
+                if ftype != "fort82":
+                    filein.readline()
+                    filein.readline()
+
+                if ftype == "out9":
+                    for i in range(0, nstars[-1]):
+                        filein.readline()
+                else:
+                    line = filein.readline()
+                    first = line.split(None, 1)
+                    while len(first) > 0 and int(float(first[0])) >= idmin:
+                        line = filein.readline()
+                        first = line.split(None, 1)
+
+            start = filein.tell()
+            line = filein.readline()
+
+    return (
+        np.array(offsets, dtype=int),
+        np.array(times, dtype=float),
+        np.array(nstars, dtype=int),
+    )
 
 
-def get_cluster_orbit(cluster, ofile, advance=False, **kwargs):
+def get_snapshot_index(filename, ftype=None):
     """
     NAME:
 
-       get_cluster_orbit
+       get_snapshot_index
 
     PURPOSE:
 
-       Read in cluster oribit from an ascii file and apply it to StarCluster instance
-        -->Columns assumed to be time,x,y,z,vx,vy,vz.
-        -->As I have hardcoded for gc_orbit.dat, if a certain filename is commonly used
-        with specific columns, an if statement can easily be added.
-            --> Note that gc_orbit.dat comes from running 'grep 'CLUSTER ORBIT' logfile > gc_orbit.dat' on 
-            the standard Nbody6 logfile
+       Get where each snapshot of a file holding many snapshots starts, along with its time and number of stars
+       --> The index is stored next to the file (filename+'.idx') so the file is only scanned once
+       --> If the file has grown since the index was made (e.g. a simulation that is still running),
+           only the new part of the file is scanned
+       --> The index is only extended if the start of the file and the last snapshot indexed are unchanged,
+           otherwise (e.g. a file rewritten by a restarted run) the whole file is scanned again
 
     INPUT:
 
-       cluster - StarCluster instance
-
-       ofile - opened orbit file
-
-    KWARGS:
+       filename - name of file
 
-        advance - Is this a continuation from a previous timestep, in which case read next line (default: False)
-        nsnap - if nsnap is provided, read line # nsnap from the orbit file
-        ounits - if you units are not the same as StarCluster units, provide them and they will be converted
+       ftype - type of file (see build_snapshot_index) (default: None, found from filename)
 
     OUTPUT:
 
-       None
+       offsets,times,nstars
 
     HISTORY:
 
-       2018 - Written - Webb (UofT)
+       2020 - Written - Webb (UofT)
 
     """
-
-    nsnap = int(kwargs.get("nsnap", cluster.nsnap))
-    ounits = kwargs.get("ounits", None)
-
-    # Read in orbital information from orbit
-    if nsnap != 0 and not advance:
-        for i in range(0, int(nsnap) + 1):
-            data = ofile.readline().split()
-    else:
-        data = ofile.readline().split()
-
-    if "gc_orbit.dat" in ofile.name:
-        # Saved orbit from doing a grep of NBODY6 or NBODY6++ logfile
-
-        if len(data) == 18:
-            xgc = float(data[9])
-            ygc = float(data[10])
-            zgc = float(data[11])
-            vxgc = float(data[12])
-            vygc = float(data[13])
-            vzgc = float(data[14])
-        else:
-            xgc = float(data[8])
-            ygc = float(data[9])
-            zgc = float(data[10])
-            vxgc = float(data[11])
-            vygc = float(data[12])
-            vzgc = float(data[13])
+    if ftype is None:
+        ftype = snapshot_file_type(filename)
+
+    idxname = filename + ".idx"
+    size = os.path.getsize(filename)
+    mtime = os.path.getmtime(filename)
+
+    offsets = np.zeros(0, dtype=int)
+    times = np.zeros(0)
+    nstars = np.zeros(0, dtype=int)
+
+    if os.path.isfile(idxname):
+        with open(idxname, "r") as idxfile:
+            header = idxfile.readline().split()
+            table = np.loadtxt(idxfile, ndmin=2)
+
+        if (
+            len(header) > 5
+            and header[1] == ftype
+            and int(header[2]) <= size
+            and len(table) > 0
+        ):
+            if int(header[2]) == size and float(header[3]) == mtime:
+                return table[:, 0].astype(int), table[:, 1], table[:, 2].astype(int)
+
+            # Keep snapshots that are complete, and scan the rest of the file, starting with the
+            # last snapshot indexed
+            offset = int(table[-1, 0])
+            nbytes = int(header[4])
+
+            with open(filename, "rb") as filein:
+                checksum = zlib.crc32(filein.read(nbytes))
+                filein.seek(max(offset - 1, 0))
+                before = filein.read(1)
+
+            if checksum == int(header[5]) and (offset == 0 or before == b"\n"):
+                try:
+                    new_offsets, new_times, new_nstars = build_snapshot_index(
+                        filename, ftype, offset
+                    )
+                except (ValueError, IndexError):
+                    new_offsets = []
+
+                # The last snapshot indexed must still be found where it was
+                if (
+                    len(new_offsets) > 0
+                    and new_nstars[0] == table[-1, 2]
+                    and (
+                        new_times[0] == table[-1, 1]
+                        or (np.isnan(new_times[0]) and np.isnan(table[-1, 1]))
+                    )
+                ):
+                    offsets = np.append(table[:-1, 0].astype(int), new_offsets)
+                    times = np.append(table[:-1, 1], new_times)
+                    nstars = np.append(table[:-1, 2].astype(int), new_nstars)
+
+    if len(offsets) == 0:
+        offsets, times, nstars = build_snapshot_index(filename, ftype)
+
+    # Checksum of the start of the file, up to the last snapshot (which is scanned again if the file grows)
+    if len(offsets) > 0:
+        nbytes = int(min(4096, offsets[-1]))
     else:
-        tphys = float(data[0])
-        xgc = float(data[1])
-        ygc = float(data[2])
-        zgc = float(data[3])
-        vxgc = float(data[4])
-        vygc = float(data[5])
-        vzgc = float(data[6])
-
-        if cluster.tphys == 0.0:
-            cluster.tphys = tphys
-
-    if ounits == None and "gc_orbit.dat" in ofile.name:
-        ounits = "realkpc"
-
-    cluster.add_orbit(xgc, ygc, zgc, vxgc, vygc, vzgc, ounits)
+        nbytes = 0
+    with open(filename, "rb") as filein:
+        checksum = zlib.crc32(filein.read(nbytes))
+
+    try:
+        with open(idxname, "w") as idxfile:
+            idxfile.write("# %s %d %r %d %d\n" % (ftype, size, mtime, nbytes, checksum))
+            np.savetxt(
+                idxfile,
+                np.column_stack([offsets, times, nstars]),
+                fmt=["%d", "%.17g", "%d"],
+            )
+    except OSError:
+        print("COULD NOT WRITE SNAPSHOT INDEX: %s" % idxname)
 
-    return
+    return offsets, times, nstars
 
 
-def get_kwtype(cluster, kwfile):
+def seek_snapshot(filein, nsnap=None, tsnap=None, ftype=None):
     """
     NAME:
 
-       get_kwtype
+       seek_snapshot
 
     PURPOSE:
 
-       Get stellar evolution type of the star (kw in Nbody6 syntax) if information is in a separate file
-       --> Columns assumed to be ID, KW
-       --> see def kwtypes() in cluster.py for what different kw types mean
+       Move an opened file holding many snapshots to the start of a snapshot, without reading the
+       snapshots before it (see get_snapshot_index)
 
     INPUT:
 
-       cluster - StarCluster instance
+       filein - opened file
 
-       kwfile - opened file containing kw type
+       nsnap - number of the snapshot (first is 0) (default: None)
 
-    KWARGS:
+       tsnap - move to the first snapshot at or after this time instead (default: None)
 
-        advance - Is this a continuation from a previous timestep, in which case read next line (default: False)
-        nsnap - if nsnap is provided, read line # nsnap from the orbit file
-        ounits - if you units are not the same as StarCluster units, provide them and they will be converted
+       ftype - type of file (see build_snapshot_index) (default: None, found from filein.name)
 
     OUTPUT:
 
-       None
+       nsnap - number of the snapshot (number of snapshots in the file if past the last snapshot, where
+               the file is moved to its end)
 
     HISTORY:
 
-       2018 - Written - Webb (UofT)
+       2020 - Written - Webb (UofT)
 
     """
+    offsets, times, nstars = get_snapshot_index(filein.name, ftype)
 
-    kw = np.loadtxt(kwfile)[:, 1]
-    indx = cluster.id - 1
-    kw0 = kw[indx]
-    return kw0
+    if tsnap is not None:
+        nsnap = int(np.searchsorted(times, tsnap, side="left"))
+    elif nsnap is None:
+        nsnap = 0
+
+    if nsnap < len(offsets):
+        filein.seek(offsets[nsnap])
+    else:
+        filein.seek(0, os.SEEK_END)
+        nsnap = len(offsets)
+
+    return nsnap
 
 
 # Get StarCluster from Gyrfalcon output
@@ -864,123 +1917,106 @@ def get_nbody6_jarrod(fort82, fort83, ofile=None, advance=False, **kwargs):
     nb = int(line1b[0])
     ntot = ns + nb
 
-    nsbnd = 0
-    nbbnd = 0
-    nbnd = 0
+    # Read all binaries, then all single stars, of the snapshot at once
+    bdata, bncol = read_nbody6_block(fort82, idmin=1, ncol=24)
+    sdata, sncol = read_nbody6_block(fort83, idmin=1, ncol=15)
+
+    columns = kwargs.get("columns", None)
+    where = kwargs.get("where", None)
+
+    if where is not None:
+        bdata = bdata[
+            where_mask(
+                where,
+                {
+                    "id": bdata[:, 0],
+                    "kw": np.maximum(bdata[:, 2], bdata[:, 3]),
+                    "m": (bdata[:, 8] + bdata[:, 9]) / zmbar,
+                    "logl": np.maximum(bdata[:, 10], bdata[:, 11]),
+                    "logr": np.maximum(bdata[:, 12], bdata[:, 13]),
+                    "x": bdata[:, 14],
+                    "y": bdata[:, 15],
+                    "z": bdata[:, 16],
+                    "vx": bdata[:, 17],
+                    "vy": bdata[:, 18],
+                    "vz": bdata[:, 19],
+                },
+            )
+        ]
+        sdata = sdata[
+            where_mask(
+                where,
+                {
+                    "id": sdata[:, 0],
+                    "kw": sdata[:, 1],
+                    "m": sdata[:, 2] / zmbar,
+                    "logl": sdata[:, 3],
+                    "logr": sdata[:, 4],
+                    "x": sdata[:, 5],
+                    "y": sdata[:, 6],
+                    "z": sdata[:, 7],
+                    "vx": sdata[:, 8],
+                    "vy": sdata[:, 9],
+                    "vz": sdata[:, 10],
+                },
+            )
+        ]
+
+    nbbnd = len(bdata)
+    nsbnd = len(sdata)
+
+    id1 = bdata[:, 0].astype(int)
+    id2 = bdata[:, 1].astype(int)
+    kw1 = bdata[:, 2].astype(int)
+    kw2 = bdata[:, 3].astype(int)
+    kcm = bdata[:, 4]
+    ecc = bdata[:, 5]
+    pb = 10.0 ** bdata[:, 6]
+    semi = 10.0 ** bdata[:, 7]
+    m1 = bdata[:, 8] / zmbar
+    m2 = bdata[:, 9] / zmbar
+    logl1 = bdata[:, 10]
+    logl2 = bdata[:, 11]
+    logr1 = bdata[:, 12]
+    logr2 = bdata[:, 13]
+
+    # Binaries are stars with the combined mass and the largest kw, luminosity and radius of the pair
+    i_d = np.append(id1, sdata[:, 0].astype(int))
+    kw = np.append(np.maximum(kw1, kw2), sdata[:, 1].astype(int))
+    m = np.append(m1 + m2, sdata[:, 2] / zmbar)
+    logl = np.append(np.maximum(logl1, logl2), sdata[:, 3])
+    logr = np.append(np.maximum(logr1, logr2), sdata[:, 4])
+    x = np.append(bdata[:, 14], sdata[:, 5])
+    y = np.append(bdata[:, 15], sdata[:, 6])
+    z = np.append(bdata[:, 16], sdata[:, 7])
+    if read_columns(columns, ["vx", "vy", "vz"]):
+        vx = np.append(bdata[:, 17], sdata[:, 8])
+        vy = np.append(bdata[:, 18], sdata[:, 9])
+        vz = np.append(bdata[:, 19], sdata[:, 10])
+    else:
+        vx = vy = vz = np.zeros(len(x))
 
-    i_d = []
-    id1 = []
-    id2 = []
-    kw = []
-    kw1 = []
-    kw2 = []
-    kcm = []
-    ecc = []
-    pb = []
-    semi = []
-    m1 = []
-    m2 = []
-    m = []
-    logl1 = []
-    logl2 = []
-    logl = []
-    logr1 = []
-    logr2 = []
-    logr = []
-    x = []
-    y = []
-    z = []
-    rxy = []
-    r = []
-    vx = []
-    vy = []
-    vz = []
-    v = []
-    ep = []
-    ep1 = []
-    ep2 = []
-    ospin = []
-    ospin1 = []
-    ospin2 = []
-    kin = []
-    pot = []
-    etot = []
-
-    data = fort82.readline().split()
-
-    while int(data[0]) > 0 and len(data) > 0:
-        id1.append(int(data[0]))
-        id2.append(int(data[1]))
-        i_d.append(id1[-1])
-        kw1.append(int(data[2]))
-        kw2.append(int(data[3]))
-        kw.append(max(kw1[-1], kw2[-1]))
-        kcm.append(float(data[4]))
-        ecc.append(float(data[5]))
-        pb.append(10.0**float(data[6]))
-        semi.append(10.0**float(data[7]))
-        m1.append(float(data[8]) / zmbar)
-        m2.append(float(data[9]) / zmbar)
-        m.append(m1[-1] + m2[-1])
-        logl1.append(float(data[10]))
-        logl2.append(float(data[11]))
-        logl.append(max(logl1[-1], logl2[-1]))
-        logr1.append(float(data[12]))
-        logr2.append(float(data[13]))
-        logr.append(max(logr1, logr2))
-        x.append(float(data[14]))
-        y.append(float(data[15]))
-        z.append(float(data[16]))
-        vx.append(float(data[17]))
-        vy.append(float(data[18]))
-        vz.append(float(data[19]))
-
-        if "bnd" in fort82.name or "esc" in fort82.name:
-            kin.append(float(data[20]))
-            pot.append(float(data[21]))
-            etot.append(float(data[23]))
-        else:
-            kin.append(0.0)
-            pot.append(0.0)
-            etot.append(0.0)
-            ep1.append(float(data[20]))
-            ep2.append(float(data[21]))
-            ospin1.append(float(data[22]))
-            ospin2.append(float(data[23]))
-
-            ep.append(ep1[-1])
-            ospin.append(ospin1[-1])
-
-        nbbnd += 1
-        data = fort82.readline().split()
-
-    data = fort83.readline().split()
-    while int(data[0]) > 0 and len(data) > 0:
-        i_d.append(int(data[0]))
-        kw.append(int(data[1]))
-        m.append(float(data[2]) / zmbar)
-        logl.append(float(data[3]))
-        logr.append(float(data[4]))
-        x.append(float(data[5]))
-        y.append(float(data[6]))
-        z.append(float(data[7]))
-        vx.append(float(data[8]))
-        vy.append(float(data[9]))
-        vz.append(float(data[10]))
-
-        if "bnd" in fort83.name or "esc" in fort83.name:
-            kin.append(float(data[11]))
-            pot.append(float(data[12]))
-            etot.append(float(data[14]))
-        else:
-            kin.append(0.0)
-            pot.append(0.0)
-            etot.append(0.0)
-            ep.append(float(data[11]))
-            ospin.append(float(data[12]))
+    if "bnd" in fort82.name or "esc" in fort82.name:
+        bkin, bpot, betot = bdata[:, 20], bdata[:, 21], bdata[:, 23]
+        ep1, ep2, ospin1, ospin2 = [], [], [], []
+        bep, bospin = [], []
+    else:
+        bkin = bpot = betot = np.zeros(nbbnd)
+        ep1, ep2, ospin1, ospin2 = bdata[:, 20], bdata[:, 21], bdata[:, 22], bdata[:, 23]
+        bep, bospin = ep1, ospin1
+
+    if "bnd" in fort83.name or "esc" in fort83.name:
+        skin, spot, setot = sdata[:, 11], sdata[:, 12], sdata[:, 14]
+        sep, sospin = [], []
+    else:
+        skin = spot = setot = np.zeros(nsbnd)
+        sep, sospin = sdata[:, 11], sdata[:, 12]
 
-        nsbnd += 1
-        data = fort83.readline().split()
+    kin = np.append(bkin, skin)
+    pot = np.append(bpot, spot)
+    etot = np.append(betot, setot)
+    ep = np.append(bep, sep)
+    ospin = np.append(bospin, sospin)
 
     nbnd = nsbnd + nbbnd
 
@@ -999,28 +2035,33 @@ def get_nbody6_jarrod(fort82, fort83, ofile=None, advance=False, **kwargs):
             nc, rc, rbar, rtide, xc, yc, zc, zmbar, vstar, rscale, nsbnd, nbbnd
         )
         cluster.add_stars(x, y, z, vx, vy, vz, m, i_d)
-        cluster.add_se(kw, logl, logr, ep, ospin)
-        cluster.add_bse(
-            id1,
-            id2,
-            kw1,
-            kw2,
-            kcm,
-            ecc,
-            pb,
-            semi,
-            m1,
-            m2,
-            logl1,
-            logl2,
-            logr1,
-            logr2,
-            ep1,
-            ep2,
-            ospin1,
-            ospin2,
-        )
-        cluster.add_energies(kin, pot, etot)
+        if read_columns(columns, StarCluster.se_names):
+            cluster.add_se(kw, logl, logr, ep, ospin)
+        else:
+            cluster.kw = kw
+        if read_columns(columns, StarCluster.bse_names):
+            cluster.add_bse(
+                id1,
+                id2,
+                kw1,
+                kw2,
+                kcm,
+                ecc,
+                pb,
+                semi,
+                m1,
+                m2,
+                logl1,
+                logl2,
+                logr1,
+                logr2,
+                ep1,
+                ep2,
+                ospin1,
+                ospin2,
+            )
+        if read_columns(columns, StarCluster.energy_names):
+            cluster.add_energies(kin, pot, etot)
 
         if ofile != None:
             get_cluster_orbit(cluster, ofile, advance=advance, **kwargs)
@@ -1038,6 +2079,89 @@ def get_nbody6_jarrod(fort82, fort83, ofile=None, advance=False, **kwargs):
     return cluster
 
 
+def read_nbody6_block(filein, nrows=None, idmin=None, ncol=0):
+    """
+    NAME:
+
+       read_nbody6_block
+
+    PURPOSE:
+
+       Read the rows of one snapshot from an NBODY6 output file and parse them all at once
+       --> Either nrows rows are read, or rows are read until one whose first value (the star id)
+           is less than idmin. That row, which marks the end of the snapshot, is read but not returned
+       --> Rows shorter than the longest row are padded with zeros
+
+    INPUT:
+
+       filein - opened NBODY6 output file
+
+       nrows - number of rows to read (default: None)
+
+       idmin - smallest id of a star in the snapshot (default: None)
+
+       ncol - minimum number of columns in the output (default: 0)
+
+    OUTPUT:
+
+       data - array of values with one row per star
+
+       nvalues - number of values in each row
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    lines = []
+    ids = []
+    if nrows is not None:
+        for i in range(0, nrows):
+            line = filein.readline()
+            first = line.split(None, 1)
+            if len(first) == 0:
+                break
+            lines.append(line)
+            ids.append(first[0])
+    else:
+        line = filein.readline()
+        first = line.split(None, 1)
+        while len(first) > 0 and int(float(first[0])) >= idmin:
+            lines.append(line)
+            ids.append(first[0])
+            line = filein.readline()
+            first = line.split(None, 1)
+
+    nrow = len(lines)
+    if nrow == 0:
+        return np.zeros((0, ncol)), np.zeros(0, dtype=int)
+
+    text = "".join(lines)
+    nvalue = len(lines[0].split())
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        values = np.fromstring(text, sep=" ")
+
+    # If every row has the same number of values, the first column holds the first value of each line
+    if len(values) == nrow * nvalue and np.array_equal(
+        values[::nvalue], np.array(ids, dtype=float)
+    ):
+        nvalues = np.full(nrow, nvalue)
+        data = values.reshape(nrow, nvalue)
+        if nvalue < ncol:
+            data = np.column_stack([data, np.zeros((nrow, ncol - nvalue))])
+    else:
+        # Rows differ in length (or a value could not be read quickly), so read them one at a time
+        rows = [line.split() for line in lines]
+        nvalues = np.array([len(row) for row in rows])
+        data = np.zeros((nrow, max(np.amax(nvalues), ncol)))
+        for i, row in enumerate(rows):
+            data[i, : len(row)] = np.array(row, dtype=float)
+
+    return data, nvalues
+
+
 def get_nbody6_out(out9, out34, advance=False, **kwargs):
     """
     NAME:
@@ -1117,136 +2241,105 @@ def get_nbody6_out(out9, out34, advance=False, **kwargs):
     vygc = float(line1[9])
     vzgc = float(line1[10])
 
-    nsbnd = 0
-    nbbnd = 0
-    nbnd = 0
-
-    i_d = []
-    kw = []
-    m = []
-    logl = []
-    logr = []
-    x = []
-    y = []
-    z = []
-    vx = []
-    vy = []
-    vz = []
-    kin = []
-    pot = []
-    etot = []
+    columns = kwargs.get("columns", None)
+    where = kwargs.get("where", None)
 
     if out9 != None:
 
         yrs = (rbar * 1296000.0 / (2.0 * np.pi)) ** 1.5 / np.sqrt(zmbar)
         days = 365.25 * yrs
 
-        id1 = []
-        kw1 = []
-        m1 = []
-        logl1 = []
-        logr1 = []
-        id2 = []
-        kw2 = []
-        m2 = []
-        logl2 = []
-        logr2 = []
-        pb = []
-        kcm = []
-        ecc = []
-        semi = []
-
-        for i in range(0, nb):
-            data = out9.readline().split()
-
-            #Ignore massless ghost particles ouput by NBODY6
-            if (float(data[4])+float(data[5])) > 0:
-
-                nbbnd += 1
-
-                ecc.append(float(data[1]))
-                m1.append(float(data[4]) / zmbar)
-                m2.append(float(data[5]) / zmbar)
-                pb.append(float(data[6]) / days)
-                id1.append(int(float(data[7])))
-                id2.append(int(float(data[8])))
-                kw1.append(int(data[9]))
-                kw2.append(int(data[10]))
-                kcm.append(int(data[11]))
-
-                logl1.append(1.0)
-                logl2.append(1.0)
-                logr1.append(1.0)
-                logr2.append(1.0)
-
-                x1 = float(data[12])
-                y1 = float(data[13])
-                z1 = float(data[14])
-                vx1 = float(data[15])
-                vy1 = float(data[16])
-                vz1 = float(data[17])
-                x2 = float(data[18])
-                y2 = float(data[19])
-                z2 = float(data[20])
-                vx2 = float(data[21])
-                vy2 = float(data[22])
-                vz2 = float(data[23])
-
-                ''' It seems binary COM information is included in OUT34
-                x.append((x1 * m1[-1] + x2 * m2[-1]) / (m1[-1] + m2[-1]) + xc)
-                y.append((y1 * m1[-1] + y2 * m2[-1]) / (m1[-1] + m2[-1]) + yc)
-                z.append((z1 * m1[-1] + z2 * m2[-1]) / (m1[-1] + m2[-1]) + zc)
-                vx.append((vx1 * m1[-1] + vx2 * m2[-1]) / (m1[-1] + m2[-1]))
-                vy.append((vy1 * m1[-1] + vy2 * m2[-1]) / (m1[-1] + m2[-1]))
-                vz.append((vz1 * m1[-1] + vz2 * m2[-1]) / (m1[-1] + m2[-1]))
-                m.append(m1[-1] + m2[-1])
-                i_d.append(id1[-1])
-                kw.append(max(kw1[-1], kw2[-1]))
-                logl.append(1.0)
-                logr.append(1.0)
-                
-
-                r1 = np.sqrt((x1 - x[-1]) ** 2.0 + (y1 - y[-1]) ** 2.0 + (z1 - z[-1]) ** 2.0)
-                r2 = np.sqrt((x2 - x[-1]) ** 2.0 + (y2 - y[-1]) ** 2.0 + (z2 - z[-1]) ** 2.0)
-                '''
-                mb=(m1[-1] + m2[-1])
-
-                semi.append((pb[-1]**2.*mb)**(1./3.))
-
-    data = out34.readline().split()
-
-    while int(float(data[0])) >= -999:
-        # IGNORE GHOST PARTICLES
-        if float(data[2]) == 0.0:
-            ns -= 1
-            ntot -= 1
-        else:
-            i_d.append(int(float(data[0])))
-            kw.append(int(data[1]))
-            m.append(float(data[2]))
-            logl.append(float(data[3]))
-            logr.append(float(data[4]))
-            x.append(float(data[5]) + xc)
-            y.append(float(data[6]) + yc)
-            z.append(float(data[7]) + zc)
-            vx.append(float(data[8]))
-            vy.append(float(data[9]))
-            vz.append(float(data[10]))
-
-            if len(data) > 14:
-                kin.append(float(data[13]))
-                pot.append(float(data[14]))
-                etot.append(float(data[15]))
-            else:
-                kin.append(0.0)
-                pot.append(0.0)
-                etot.append(0.0)
+        bdata, bncol = read_nbody6_block(out9, nrows=nb, ncol=24)
 
-            nsbnd += 1
-        data = out34.readline().split()
+        #Ignore massless ghost particles ouput by NBODY6
+        bdata = bdata[(bdata[:, 4] + bdata[:, 5]) > 0]
 
-        if len(data)==0:
-            break
+        if where is not None:
+            # OUT9 has no positions or velocities, so binaries are only selected by
+            # the columns it does have
+            bwhere = dict(
+                (name, where[name]) for name in where if name in ["id", "kw", "m"]
+            )
+            bdata = bdata[
+                where_mask(
+                    bwhere,
+                    {
+                        "id": bdata[:, 7],
+                        "kw": np.maximum(bdata[:, 9], bdata[:, 10]),
+                        "m": (bdata[:, 4] + bdata[:, 5]) / zmbar,
+                    },
+                )
+            ]
+
+        nbbnd = len(bdata)
+
+        ecc = bdata[:, 1]
+        m1 = bdata[:, 4] / zmbar
+        m2 = bdata[:, 5] / zmbar
+        pb = bdata[:, 6] / days
+        id1 = bdata[:, 7].astype(int)
+        id2 = bdata[:, 8].astype(int)
+        kw1 = bdata[:, 9].astype(int)
+        kw2 = bdata[:, 10].astype(int)
+        kcm = bdata[:, 11].astype(int)
+
+        logl1 = np.ones(nbbnd)
+        logl2 = np.ones(nbbnd)
+        logr1 = np.ones(nbbnd)
+        logr2 = np.ones(nbbnd)
+
+        # Binary centre of mass information is included in OUT34
+        semi = (pb ** 2.0 * (m1 + m2)) ** (1.0 / 3.0)
+    else:
+        nbbnd = 0
+
+    sdata, sncol = read_nbody6_block(out34, idmin=-999, ncol=16)
+
+    # IGNORE GHOST PARTICLES
+    sindx = sdata[:, 2] != 0.0
+
+    if where is not None:
+        sindx *= where_mask(
+            where,
+            {
+                "id": sdata[:, 0],
+                "kw": sdata[:, 1],
+                "m": sdata[:, 2],
+                "logl": sdata[:, 3],
+                "logr": sdata[:, 4],
+                "x": sdata[:, 5] + xc,
+                "y": sdata[:, 6] + yc,
+                "z": sdata[:, 7] + zc,
+                "vx": sdata[:, 8],
+                "vy": sdata[:, 9],
+                "vz": sdata[:, 10],
+            },
+        )
+
+    sdata = sdata[sindx]
+    sncol = sncol[sindx]
+    nsbnd = len(sdata)
+
+    i_d = sdata[:, 0].astype(int)
+    kw = sdata[:, 1].astype(int)
+    m = sdata[:, 2]
+    logl = sdata[:, 3]
+    logr = sdata[:, 4]
+    x = sdata[:, 5] + xc
+    y = sdata[:, 6] + yc
+    z = sdata[:, 7] + zc
+    if read_columns(columns, ["vx", "vy", "vz"]):
+        vx = sdata[:, 8]
+        vy = sdata[:, 9]
+        vz = sdata[:, 10]
+    else:
+        vx = vy = vz = np.zeros(nsbnd)
+
+    # Energies are only given in longer rows
+    eindx = sncol > 14
+    kin = np.where(eindx, sdata[:, 13], 0.0)
+    pot = np.where(eindx, sdata[:, 14], 0.0)
+    etot = np.where(eindx, sdata[:, 15], 0.0)
 
     nbnd = nsbnd + nbbnd
 
@@ -1265,9 +2358,13 @@ def get_nbody6_out(out9, out34, advance=False, **kwargs):
     )
     # Add back on the centre of mass which has been substracted off by NBODY6
     cluster.add_stars(x, y, z, vx, vy, vz, m, i_d)
-    cluster.add_se(kw, logl, logr, np.zeros(nbnd), np.zeros(nbnd))
-    cluster.add_energies(kin, pot, etot)
-    if out9 != None:
+    if read_columns(columns, StarCluster.se_names):
+        cluster.add_se(kw, logl, logr, np.zeros(nbnd), np.zeros(nbnd))
+    else:
+        cluster.kw = kw
+    if read_columns(columns, StarCluster.energy_names):
+        cluster.add_energies(kin, pot, etot)
+    if out9 != None and read_columns(columns, StarCluster.bse_names):
         cluster.add_bse(
             id1, id2, kw1, kw2, kcm, ecc, pb, semi, m1, m2, logl1, logl2, logr1, logr2
         )
@@ -1348,55 +2445,58 @@ def get_nbody6_out34(out34, advance=False, **kwargs):
     vygc = float(line1[9])
     vzgc = float(line1[10])
 
-    nsbnd = 0
     nbbnd = 0
-    nbnd = 0
 
-    i_d = []
-    kw = []
-    m = []
-    logl = []
-    logr = []
-    x = []
-    y = []
-    z = []
-    vx = []
-    vy = []
-    vz = []
-    kin = []
-    pot = []
-    etot = []
-
-    data = out34.readline().split()
-    while int(float(data[0])) >= -999 and len(data) > 0:
-        # IGNORE GHOST PARTICLES
-        if float(data[2]) == 0.0:
-            ns -= 1
-            ntot -= 1
-        else:
-            i_d.append(int(float(data[0])))
-            kw.append(int(data[1]))
-            m.append(float(data[2]))
-            logl.append(float(data[3]))
-            logr.append(float(data[4]))
-            x.append(float(data[5]))
-            y.append(float(data[6]))
-            z.append(float(data[7]))
-            vx.append(float(data[8]))
-            vy.append(float(data[9]))
-            vz.append(float(data[10]))
-
-            if len(data) > 14:
-                kin.append(float(data[13]))
-                pot.append(float(data[14]))
-                etot.append(float(data[15]))
-            else:
-                kin.append(0.0)
-                pot.append(0.0)
-                etot.append(0.0)
+    columns = kwargs.get("columns", None)
+    where = kwargs.get("where", None)
+
+    sdata, sncol = read_nbody6_block(out34, idmin=-999, ncol=16)
+
+    # IGNORE GHOST PARTICLES
+    sindx = sdata[:, 2] != 0.0
+
+    if where is not None:
+        sindx *= where_mask(
+            where,
+            {
+                "id": sdata[:, 0],
+                "kw": sdata[:, 1],
+                "m": sdata[:, 2],
+                "logl": sdata[:, 3],
+                "logr": sdata[:, 4],
+                "x": sdata[:, 5] + xc,
+                "y": sdata[:, 6] + yc,
+                "z": sdata[:, 7] + zc,
+                "vx": sdata[:, 8],
+                "vy": sdata[:, 9],
+                "vz": sdata[:, 10],
+            },
+        )
+
+    sdata = sdata[sindx]
+    sncol = sncol[sindx]
+    nsbnd = len(sdata)
+
+    i_d = sdata[:, 0].astype(int)
+    kw = sdata[:, 1].astype(int)
+    m = sdata[:, 2]
+    logl = sdata[:, 3]
+    logr = sdata[:, 4]
+    x = sdata[:, 5]
+    y = sdata[:, 6]
+    z = sdata[:, 7]
+    if read_columns(columns, ["vx", "vy", "vz"]):
+        vx = sdata[:, 8]
+        vy = sdata[:, 9]
+        vz = sdata[:, 10]
+    else:
+        vx = vy = vz = np.zeros(nsbnd)
 
-            nsbnd += 1
-        data = out34.readline().split()
+    # Energies are only given in longer rows
+    eindx = sncol > 14
+    kin = np.where(eindx, sdata[:, 13], 0.0)
+    pot = np.where(eindx, sdata[:, 14], 0.0)
+    etot = np.where(eindx, sdata[:, 15], 0.0)
 
     nbnd = nsbnd + nbbnd
 
@@ -1415,8 +2515,12 @@ def get_nbody6_out34(out34, advance=False, **kwargs):
     )
     # Add back on the centre of mass which has been substracted off by NBODY6
     cluster.add_stars(x + xc, y + yc, z + zc, vx, vy, vz, m, i_d)
-    cluster.add_se(kw, logl, logr, np.zeros(nbnd), np.zeros(nbnd))
-    cluster.add_energies(kin, pot, etot)
+    if read_columns(columns, StarCluster.se_names):
+        cluster.add_se(kw, logl, logr, np.zeros(nbnd), np.zeros(nbnd))
+    else:
+        cluster.kw = kw
+    if read_columns(columns, StarCluster.energy_names):
+        cluster.add_energies(kin, pot, etot)
 
     if kwargs.get("do_key_params", True):
         do_order=kwargs.get("do_key_params", True)
@@ -1495,6 +2599,22 @@ def get_snapshot(
     snapbase = kwargs.get("snapbase", "")
     snapend = kwargs.get("snapend", ".dat")
     skiprows = kwargs.get("skiprows", 0)
+    columns = kwargs.get("columns", None)
+    where = kwargs.get("where", None)
+
+    # Only parse the columns that are kept or used to select stars
+    if columns is None:
+        usecols = None
+    else:
+        names = ["m", "x", "y", "z"] + list(columns)
+        if read_columns(columns, ["vx", "vy", "vz"]):
+            names += ["vx", "vy", "vz"]
+        if where is not None:
+            names += list(where)
+        indx = np.isin(col_names, names)
+        col_names = col_names[indx]
+        usecols = sorted(set(col_nums[indx]))
+        col_nums = np.searchsorted(usecols, col_nums[indx])
 
     if units == "WDunits":
         vcon = 220.0 / bovy_conversion.velocity_in_kpcGyr(220.0, 8.0)
@@ -1510,10 +2630,14 @@ def get_snapshot(
                 "%s%s%s" % (wdir, snapdir, filename),
                 delimiter=delimiter,
                 skiprows=skiprows,
+                usecols=usecols,
             )
         elif os.path.isfile("%s%s" % (wdir, filename)):
             data = np.loadtxt(
-                "%s%s" % (wdir, filename), delimiter=delimiter, skiprows=skiprows
+                "%s%s" % (wdir, filename),
+                delimiter=delimiter,
+                skiprows=skiprows,
+                usecols=usecols,
             )
         else:
             print("NO FILE FOUND: %s, %s, %s" % (wdir, snapdir, filename))
@@ -1537,6 +2661,7 @@ def get_snapshot(
             ),
             delimiter=delimiter,
             skiprows=skiprows,
+            usecols=usecols,
         )
     elif os.path.isfile(
         "%s%s%s%s" % (wdir, snapbase, str(nsnap).zfill(nzfill), snapend)
@@ -1546,6 +2671,7 @@ def get_snapshot(
             ("%s%s%s%s" % (wdir, snapbase, str(nsnap).zfill(nzfill), snapend)),
             delimiter=delimiter,
             skiprows=skiprows,
+            usecols=usecols,
         )
     else:
         print(
@@ -1572,12 +2698,15 @@ def get_snapshot(
     y = data[:, col_nums[yindx]]
     zindx = np.argwhere(col_names == "z")[0][0]
     z = data[:, col_nums[zindx]]
-    vxindx = np.argwhere(col_names == "vx")[0][0]
-    vx = data[:, col_nums[vxindx]] * vcon
-    vyindx = np.argwhere(col_names == "vy")[0][0]
-    vy = data[:, col_nums[vyindx]] * vcon
-    vzindx = np.argwhere(col_names == "vz")[0][0]
-    vz = data[:, col_nums[vzindx]] * vcon
+    if "vx" in col_names and "vy" in col_names and "vz" in col_names:
+        vxindx = np.argwhere(col_names == "vx")[0][0]
+        vx = data[:, col_nums[vxindx]] * vcon
+        vyindx = np.argwhere(col_names == "vy")[0][0]
+        vy = data[:, col_nums[vyindx]] * vcon
+        vzindx = np.argwhere(col_names == "vz")[0][0]
+        vz = data[:, col_nums[vzindx]] * vcon
+    else:
+        vx = vy = vz = np.zeros(len(x))
 
     if "id" in col_names:
         idindx = np.argwhere(col_names == "id")[0][0]
@@ -1591,6 +2720,23 @@ def get_snapshot(
     else:
         kw = np.zeros(len(x))
 
+    if where is not None:
+        indx = where_mask(
+            where,
+            {"m": m, "x": x, "y": y, "z": z, "vx": vx, "vy": vy, "vz": vz, "id": i_d, "kw": kw},
+        )
+        m, x, y, z, vx, vy, vz, i_d, kw = (
+            m[indx],
+            x[indx],
+            y[indx],
+            z[indx],
+            vx[indx],
+            vy[indx],
+            vz[indx],
+            i_d[indx],
+            kw[indx],
+        )
+
     nbnd = len(m)
 
     cluster = StarCluster(
@@ -1732,6 +2878,143 @@ def get_nbodypy_snapshot(
     return cluster
 
 
+def get_npy_snapshot(filename=None, ofile=None, advance=False, **kwargs):
+    """
+    NAME:
+
+       get_npy_snapshot
+
+    PURPOSE:
+
+       Load a single binary snapshot as produced by nbodypy's npyout routine
+       --> The snapshot is a directory with a header (header.json) and one .npy file per array
+       --> Arrays are memory mapped, so they are only read from disk when used. They are mapped
+           copy-on-write, so changing units or origin never changes the files
+
+    INPUT:
+
+       filename = name of snapshot directory
+
+       ofile - opened file containing orbital information (default: None, use the orbit in the header)
+
+       advance - is this a snapshot that has been advanced to from initial load_cluster?
+
+    KWARGS:
+
+        same as load_cluster (snapdir defaults to 'npy/' and snapend to '')
+
+    OUTPUT:
+
+       StarCluster instance
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+    """
+
+    nsnap = int(kwargs.get("nsnap", "0"))
+    nzfill = int(kwargs.get("nzfill", 5))
+    wdir = kwargs.get("wdir", "./")
+    snapdir = kwargs.get("snapdir", "npy/")
+    snapbase = kwargs.get("snapbase", "")
+    snapend = kwargs.get("snapend", "")
+
+    if filename != None:
+        dirnames = ["%s%s%s" % (wdir, snapdir, filename), "%s%s" % (wdir, filename)]
+    else:
+        dirnames = [
+            "%s%s%s%s%s" % (wdir, snapdir, snapbase, str(nsnap).zfill(nzfill), snapend),
+            "%s%s%s%s" % (wdir, snapbase, str(nsnap).zfill(nzfill), snapend),
+        ]
+
+    dirname = None
+    for name in dirnames:
+        if os.path.isfile(os.path.join(name, "header.json")):
+            dirname = name
+            break
+
+    if dirname is None:
+        print("NO FILE FOUND - %s" % dirnames[0])
+        cluster = StarCluster(0, 0.0, ctype="npy", **kwargs)
+        print(cluster.ntot)
+        return cluster
+
+    with open(os.path.join(dirname, "header.json"), "r") as headerfile:
+        header = json.load(headerfile)
+
+    cluster = StarCluster(
+        header["ntot"],
+        header["tphys"],
+        units=header["units"],
+        origin=header["origin"],
+        ctype="npy",
+        **kwargs
+    )
+    cluster.snapdir = snapdir
+    cluster.snapend = snapend
+
+    for name in header["params"]:
+        setattr(cluster, name, header["params"][name])
+
+    columns = kwargs.get("columns", None)
+    where = kwargs.get("where", None)
+
+    arrays = {}
+    for name in header["arrays"]:
+        if (
+            name in StarCluster.star_names
+            or read_columns(columns, [name])
+            or (where is not None and name in where)
+        ):
+            arrays[name] = np.load(os.path.join(dirname, name + ".npy"), mmap_mode="c")
+
+    # Only the stars selected are copied from the memory-mapped files
+    if where is not None:
+        values = {}
+        for i, name in enumerate(["x", "y", "z", "m", "vx", "vy", "vz"]):
+            values[name] = arrays["phase"][:, i]
+        for name in arrays:
+            if name != "phase" and len(arrays[name]) == len(arrays["phase"]):
+                values[name] = arrays[name]
+
+        indx = where_mask(where, values)
+        for name in values:
+            if name in arrays:
+                arrays[name] = arrays[name][indx]
+        arrays["phase"] = arrays["phase"][indx]
+        cluster.ntot = int(np.sum(indx))
+
+    for name in arrays:
+        if name in StarCluster.star_names or read_columns(columns, [name]):
+            setattr(cluster, name, arrays[name])
+
+    if len(cluster.logl) > 0:
+        cluster.lum = 10.0 ** cluster.logl
+        cluster.ltot = np.sum(cluster.lum)
+    if len(cluster.kin) > 0:
+        cluster.ektot = np.sum(cluster.kin)
+        cluster.ptot = np.sum(cluster.pot) / 2.0
+        if cluster.ptot == 0.0:
+            cluster.qvir = 0.0
+        else:
+            cluster.qvir = cluster.ektot / cluster.ptot
+    if len(cluster.id1) > 0:
+        cluster.eb = 0.5 * cluster.m1 * cluster.m2 / cluster.semi
+
+    if ofile != None:
+        get_cluster_orbit(cluster, ofile, advance=advance, **kwargs)
+
+    # The centre is stored in the header, so key parameters are found without searching for it.
+    # They are found in a view centred on the cluster, so the memory-mapped arrays are never written
+    if kwargs.get("do_key_params", True) and cluster.units != "radec":
+        do_order = kwargs.get("do_key_params", True)
+        view = cluster.view(origin="centre")
+        view.key_params(do_order=do_order)
+        cluster.derived.update(view.key_params_cache())
+
+    return cluster
+
+
 def get_amuse_particles(
     particles, units="realkpc", origin="galaxy", ofile=None, **kwargs
 ):
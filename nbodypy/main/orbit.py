@@ -66,8 +66,7 @@ def initialize_orbit(cluster, from_centre=False, r0=8.0, v0=220.0):
             solarmotion=[-11.1, 24.0, 7.25],
         )
     else:
-        units0, origin0 = save_cluster(cluster)
-        cluster.to_galpy()
+        cluster = cluster.view(units="galpy", r0=r0, v0=v0)
 
         if from_centre:
             x, y, z = (
@@ -89,8 +88,6 @@ def initialize_orbit(cluster, from_centre=False, r0=8.0, v0=220.0):
         o = Orbit(
             [R, vR, vT, z, vz, phi], ro=r0, vo=v0, solarmotion=[-11.1, 24.0, 7.25]
         )
-        
-        return_cluster(cluster, units0, origin0)
 
 
     cluster.orbit = o
@@ -127,9 +124,7 @@ def initialize_orbits(cluster, r0=8.0, v0=220.0):
        2018 - Written - Webb (UofT)
     """
 
-    units0, origin0 = save_cluster(cluster)
-    cluster.to_galaxy()
-    cluster.to_galpy()
+    cluster = cluster.view(units="galpy", origin="galaxy", r0=r0, v0=v0)
 
     x, y, z = cluster.x, cluster.y, cluster.z
     vx, vy, vz = cluster.vx, cluster.vy, cluster.vz
@@ -140,8 +135,6 @@ def initialize_orbits(cluster, r0=8.0, v0=220.0):
     vxvv = np.column_stack([R, vR, vT, z, vz, phi])
     os = Orbit(vxvv, ro=r0, vo=v0, solarmotion=[-11.1, 24.0, 7.25])
 
-    return_cluster(cluster, units0, origin0)
-
     return os
 
 
@@ -303,6 +296,7 @@ def orbit_interpolate(
     cluster.vx[indx] += dvx
     cluster.vy[indx] += dvy
     cluster.vz[indx] += dvz
+    cluster.rv3d()
 
     if from_centre:
         cluster.xc, cluster.yc, cluster.zc = 0.0, 0.0, 0.0
@@ -352,6 +346,7 @@ def orbit_interpolate(
         cluster.vx[tindx] = np.array(otail.vx(ts[-1]))
         cluster.vy[tindx] = np.array(otail.vy(ts[-1]))
         cluster.vz[tindx] = np.array(otail.vz(ts[-1]))
+        cluster.rv3d()
 
     return_cluster(cluster, units0, origin0)
 
@@ -540,9 +535,7 @@ def orbital_path_match(
 
        2018 - Written - Webb (UofT)
     """
-    units0, origin0 = save_cluster(cluster)
-    cluster.to_galaxy()
-    cluster.to_realkpc()
+    cluster = cluster.view(units="realkpc", origin="galaxy")
 
     t, x, y, z, vx, vy, vz, o = orbital_path(
         cluster,
@@ -646,8 +639,6 @@ def orbital_path_match(
 
     dpath[ldot < 0] *= -1.0
 
-    return_cluster(cluster, units0, origin0)
-
     return np.array(tstar), np.array(dprog), np.array(dpath)
 
 
@@ -688,9 +679,7 @@ def stream_path(
        2019 - Implemented numpy array preallocation to minimize runtime - Nathaniel Starkman (UofT)
     """
 
-    units0, origin0 = save_cluster(cluster)
-    cluster.to_galaxy()
-    cluster.to_realkpc()
+    cluster = cluster.view(units="realkpc", origin="galaxy")
 
     to, xo, yo, zo, vxo, vyo, vzo, o = orbital_path(
         cluster,
@@ -726,8 +715,6 @@ def stream_path(
             vystream = np.append(vystream, np.mean(cluster.vy[indx]))
             vzstream = np.append(vzstream, np.mean(cluster.vz[indx]))
 
-    return_cluster(cluster, units0, origin0)
-
     return tstream, xstream, ystream, zstream, vxstream, vystream, vzstream
 
 
@@ -781,9 +768,7 @@ def stream_path_match(
 
        2018 - Written - Webb (UofT)
     """
-    units0, origin0 = save_cluster(cluster)
-    cluster.to_galaxy()
-    cluster.to_realkpc()
+    cluster = cluster.view(units="realkpc", origin="galaxy")
 
     ts, x, y, z, vx, vy, vz = stream_path(
         cluster, dt=dt, nt=nt, pot=pot, from_centre=from_centre, r0=r0, v0=v0
@@ -865,8 +850,6 @@ def stream_path_match(
     ldot = np.sum(rstar * lz, axis=1)
     dpath[ldot < 0] *= -1
 
-    return_cluster(cluster, units0, origin0)
-
     return np.array(tstar), np.array(dprog), np.array(dpath)
 
 
@@ -916,10 +899,8 @@ def rtidal(
        2019 - Written - Webb (UofT)
 
     """
-    units0, origin0 = save_cluster(cluster)
-
-    cluster.to_centre()
-    cluster.to_galpy()
+    units0 = cluster.units
+    cluster = cluster.view(units="galpy", origin="centre", r0=r0, v0=v0)
 
     if rgc != None:
         R = rgc / r0
@@ -967,8 +948,6 @@ def rtidal(
 
     cluster.rt = rt
 
-    return_cluster(cluster, units0, origin0)
-
     return rt
 
 
@@ -1023,11 +1002,8 @@ def rlimiting(
        2019 - Written - Webb (UofT)
 
     """
-    units0, origin0 = save_cluster(cluster)
-
-    cluster.to_centre()
-    cluster.to_galpy()
-
+    units0 = cluster.units
+    cluster = cluster.view(units="galpy", origin="centre", r0=r0, v0=v0)
 
     if rgc != None:
         R = rgc / r0
@@ -1066,8 +1042,6 @@ def rlimiting(
 
     cluster.rl = rl
 
-    return_cluster(cluster, units0, origin0, do_order=True, do_key_params=True)
-
     if plot:
         if verbose:
             print("LOCAL DENSITY = ", rho_local)
@@ -1075,7 +1049,7 @@ def rlimiting(
         filename = kwargs.pop("filename", None)
         overplot = kwargs.pop("overplot", False)
 
-        if cluster.units == "nbody":
+        if units0 == "nbody":
             rprof *= r0 * 1000.0 / cluster.rbar
             pprof *= (
                 bovy_conversion.dens_in_msolpc3(ro=r0, vo=v0)
@@ -1089,7 +1063,7 @@ def rlimiting(
             )
             xunits = " (NBODY)"
             yunits = " (NBODY)"
-        elif cluster.units == "realpc":
+        elif units0 == "realpc":
             rprof *= r0 * 1000.0
             pprof *= bovy_conversion.dens_in_msolpc3(ro=r0, vo=v0)
             rho_local *= bovy_conversion.dens_in_msolpc3(ro=r0, vo=v0)
@@ -1098,7 +1072,7 @@ def rlimiting(
                 yunits = " Msun/pc^2"
             else:
                 yunits = " Msun/pc^3"
-        elif cluster.units == "realkpc":
+        elif units0 == "realkpc":
             rprof *= r0
             pprof *= bovy_conversion.dens_in_msolpc3(ro=r0, vo=v0) * (1000.0 ** 3.0)
             rho_local *= bovy_conversion.dens_in_msolpc3(ro=r0, vo=v0) * (1000.0 ** 3.0)
@@ -1108,7 +1082,7 @@ def rlimiting(
                 yunits = " Msun/kpc^2"
             else:
                 yunits = " Msun/kpc^3"
-        elif cluster.units == "galpy":
+        elif units0 == "galpy":
             xunits = " (GALPY)"
             yunits = " (GALPY)"
 
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+
+"""Pipeline.
+
+Run a set of analyses on every snapshot of a simulation in a pool of processes
+
+"""
+
+__author__ = "Jeremy Webb"
+
+#############################################################################
+# IMPORTS
+
+import numpy as np
+import os
+import pickle
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from .load import load_snapshot, get_snapshot_range
+
+
+#############################################################################
+# CODE
+
+
+def run_pipeline(
+    ctype,
+    analyses,
+    units="realpc",
+    origin="cluster",
+    n_jobs=None,
+    checkpoint=None,
+    start=0,
+    stop=None,
+    step=1,
+    tmin=None,
+    tmax=None,
+    analysis_units=None,
+    analysis_origin=None,
+    **kwargs
+):
+    """
+    NAME:
+
+       run_pipeline
+
+    PURPOSE:
+
+       Run a set of analyses on the snapshots of a simulation, with snapshots spread across a pool of processes
+       --> Each snapshot is loaded on its own (see load_snapshot), so files holding many snapshots are
+           moved straight to it with their snapshot index
+       --> The analyses are called one after another on the same StarCluster, in the order given
+       --> Results are collected in snapshot order
+       --> With a checkpoint file, the results of each snapshot are saved as soon as they are collected,
+           and an interrupted run started again with the same checkpoint file continues where it stopped
+
+    INPUT:
+
+       ctype - type of file being loaded (see load_cluster)
+
+       analyses - analyses to run, as a dictionary of names and functions that take a StarCluster as their
+                  first argument. Values can also be (function,kwargs) to give keyword arguments,
+                  or a list of functions can be given (named by function). Functions must be defined at the
+                  top of a module (not lambdas), so they can be sent to other processes
+                  e.g. {"rt": (rtidal, {"pot": MWPotential2014}), "rlagrange": rlagrange}
+
+       units,origin - units and origin of input data (default: realpc, cluster)
+
+       n_jobs - number of processes (default: None, use all cores; with 1, snapshots are analysed here)
+
+       checkpoint - name of file used to save and resume progress (default: None)
+
+       start,stop,step - snapshots start,start+step,... before stop are analysed (default: 0,None,1)
+
+       tmin,tmax - only analyse snapshots with times between tmin and tmax (default: None)
+
+       analysis_units - units to convert each snapshot to before the analyses (default: None)
+
+       analysis_origin - origin to move each snapshot to before the analyses, finding its key parameters
+                         (default: None)
+
+    KWARGS:
+
+       same as load_cluster (ofilename is used for the orbit file)
+
+    OUTPUT:
+
+       table - dictionary of results, with arrays of nsnap and tphys, and the results of each analysis
+               (an array if all results have the same shape, otherwise a list)
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    if callable(analyses):
+        analyses = [analyses]
+    if isinstance(analyses, (list, tuple)):
+        analyses = dict([(analysis.__name__, analysis) for analysis in analyses])
+
+    wdir = kwargs.get("wdir", "./")
+    if "ofilename" in kwargs:
+        ofilename = os.path.abspath(wdir + kwargs.pop("ofilename"))
+    else:
+        ofilename = None
+
+    kwargs.pop("nsnap", None)
+    kwargs.pop("tsnap", None)
+
+    start, stop = get_snapshot_range(
+        ctype, kwargs.get("filename", None), start, stop, step, tmin, tmax, wdir=wdir
+    )
+
+    # Results of snapshots that have already been analysed
+    if checkpoint != None:
+        records = read_checkpoint(checkpoint)
+        cfile = open(checkpoint, "ab")
+    else:
+        records = []
+        cfile = None
+
+    done = dict([(record[0], record) for record in records])
+
+    analyse_args = (
+        ctype,
+        analyses,
+        units,
+        origin,
+        ofilename,
+        tmin,
+        tmax,
+        analysis_units,
+        analysis_origin,
+    )
+
+    if n_jobs == None:
+        n_jobs = os.cpu_count()
+
+    if n_jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=n_jobs)
+    else:
+        executor = None
+
+    # Snapshots being analysed, in order, at most two per process
+    pending = deque()
+    nsnap = start
+    finished = False
+
+    try:
+        while not finished:
+            while len(pending) < 2 * n_jobs and (stop is None or nsnap < stop):
+                if nsnap in done:
+                    pending.append(done[nsnap])
+                elif executor is None:
+                    pending.append(analyse_snapshot(nsnap, *analyse_args, **kwargs))
+                else:
+                    pending.append(
+                        executor.submit(analyse_snapshot, nsnap, *analyse_args, **kwargs)
+                    )
+                nsnap += step
+
+            if len(pending) == 0:
+                break
+
+            record = pending.popleft()
+            if not isinstance(record, tuple):
+                record = record.result()
+
+            if record[2] is None:
+                # End of simulation
+                finished = True
+            elif record[0] not in done:
+                done[record[0]] = record
+                records.append(record)
+                if cfile != None:
+                    pickle.dump(record, cfile)
+                    cfile.flush()
+
+            if tmax is not None and record[1] > tmax:
+                finished = True
+    finally:
+        for future in pending:
+            if not isinstance(future, tuple):
+                future.cancel()
+        if executor != None:
+            executor.shutdown(wait=True)
+        if cfile != None:
+            cfile.close()
+
+    records = sorted(records, key=lambda record: record[0])
+    records = [
+        record
+        for record in records
+        if (stop is None or record[0] < stop)
+        and record[0] >= start
+        and (record[0] - start) % step == 0
+        and record[2] is not False
+    ]
+
+    table = {
+        "nsnap": np.array([record[0] for record in records], dtype=int),
+        "tphys": np.array([record[1] for record in records]),
+    }
+
+    for name in analyses:
+        results = [record[2][name] for record in records]
+        try:
+            table[name] = np.array(results, dtype=float)
+        except (ValueError, TypeError):
+            table[name] = results
+
+    return table
+
+
+def analyse_snapshot(
+    nsnap,
+    ctype,
+    analyses,
+    units,
+    origin,
+    ofilename=None,
+    tmin=None,
+    tmax=None,
+    analysis_units=None,
+    analysis_origin=None,
+    **kwargs
+):
+    """
+    NAME:
+
+       analyse_snapshot
+
+    PURPOSE:
+
+       Load one snapshot of a simulation and run a set of analyses on it (see run_pipeline)
+
+    INPUT:
+
+       nsnap - number of the snapshot
+
+       ctype,analyses,units,origin,tmin,tmax,analysis_units,analysis_origin - same as run_pipeline
+
+       ofilename - full name of file containing orbital information (default: None)
+
+    KWARGS:
+
+       same as load_cluster
+
+    OUTPUT:
+
+       nsnap,tphys,results - results is a dictionary of the results of each analysis, None past the
+                             last snapshot, and False if the snapshot is outside of tmin and tmax
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    cluster = load_snapshot(ctype, nsnap, units, origin, ofilename=ofilename, **kwargs)
+
+    if cluster.ntot == 0:
+        return nsnap, 0.0, None
+
+    if (tmin is not None and cluster.tphys < tmin) or (
+        tmax is not None and cluster.tphys > tmax
+    ):
+        return nsnap, cluster.tphys, False
+
+    if analysis_units != None:
+        cluster.to_units(analysis_units)
+    if analysis_origin != None:
+        cluster.to_origin(analysis_origin, do_order=True, do_key_params=True)
+
+    results = {}
+    for name in analyses:
+        if isinstance(analyses[name], tuple):
+            analysis, analysis_kwargs = analyses[name]
+        else:
+            analysis, analysis_kwargs = analyses[name], {}
+
+        results[name] = analysis(cluster, **analysis_kwargs)
+
+    return nsnap, cluster.tphys, results
+
+
+def read_checkpoint(checkpoint):
+    """
+    NAME:
+
+       read_checkpoint
+
+    PURPOSE:
+
+       Read the results of snapshots saved in a checkpoint file by run_pipeline
+       --> A record left incomplete by an interrupted run is removed from the file
+
+    INPUT:
+
+       checkpoint - name of checkpoint file
+
+    OUTPUT:
+
+       records - list of nsnap,tphys,results of each snapshot saved
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    records = []
+
+    if not os.path.isfile(checkpoint):
+        return records
+
+    with open(checkpoint, "rb") as cfile:
+        while True:
+            position = cfile.tell()
+            try:
+                records.append(pickle.load(cfile))
+            except EOFError:
+                break
+            except (pickle.UnpicklingError, ValueError, IndexError, AttributeError):
+                print("INCOMPLETE CHECKPOINT RECORD REMOVED - ", checkpoint)
+                break
+
+    if position != os.path.getsize(checkpoint):
+        with open(checkpoint, "r+b") as cfile:
+            cfile.truncate(position)
+
+    return records
@@ -7,8 +7,9 @@ from ..util.constants import *
 from ..util.recipes import *
 from .operations import *
 from ..util.plots import *
-from ..util.coordinates import sphere_coords
+from ..util.coordinates import sphere_coords, cart_to_sphere
 from .functions import new_mass_function
+from .chunked import chunked_radial_bins, chunk_mask
 
 
 def rho_prof(
@@ -27,6 +28,7 @@ def rho_prof(
     indx=None,
     projected=False,
     plot=False,
+    chunksize=None,
     **kwargs
 ):
     """
@@ -60,6 +62,9 @@ def rho_prof(
 
        plot - plot the density profile (Default: False)
 
+       chunksize - read stars in blocks of chunksize stars, for clusters that do not fit in memory
+                   (see chunked_radial_bins) (Default: None)
+
     KWARGS:
 
         Same as for ..util.plot.nplot
@@ -74,65 +79,88 @@ def rho_prof(
 
     """
 
-    units0, origin0 = save_cluster(cluster)
-    cluster.to_centre(do_order=True, do_key_params=True)
-
-    rprof = np.array([])
-    pprof = np.array([])
-    nprof = np.array([])
+    cluster = cluster.view(origin="centre")
 
-    if projected:
-        r = cluster.rpro
-        v = cluster.vpro
+    if chunksize is not None:
+        r_lower, rprof, r_upper, nprof, mprof = chunked_radial_bins(
+            cluster,
+            chunksize,
+            nrad,
+            mmin,
+            mmax,
+            rmin,
+            rmax,
+            vmin,
+            vmax,
+            emin,
+            emax,
+            kwmin,
+            kwmax,
+            indx,
+            projected,
+        )
+        if projected:
+            vol = np.pi * (r_upper ** 2 - r_lower ** 2.0)
+        else:
+            vol = (4.0 / 3.0) * np.pi * (r_upper ** 3 - r_lower ** 3.0)
+        pprof = mprof / vol
     else:
-        r = cluster.r
-        v = cluster.v
-
-    if rmin == None:
-        rmin = np.min(r)
-    if rmax == None:
-        rmax = np.max(r)
-    if vmin == None:
-        vmin = np.min(v)
-    if vmax == None:
-        vmax = np.max(v)
-    if mmin == None:
-        mmin = np.min(cluster.m)
-    if mmax == None:
-        mmax = np.max(cluster.m)
+        rprof = np.array([])
+        pprof = np.array([])
+        nprof = np.array([])
 
-    if indx is None:
-        indx = cluster.id > -1
-
-    # Build subcluster containing only stars in the full radial and mass range:
-    indx *= (
-        (r >= rmin)
-        * (r <= rmax)
-        * (cluster.m >= mmin)
-        * (cluster.m <= mmax)
-        * (v >= vmin)
-        * (v <= vmax)
-        * (cluster.kw >= kwmin)
-        * (cluster.kw <= kwmax)
-    )
+        if projected:
+            r = cluster.rpro
+            v = cluster.vpro
+        else:
+            r = cluster.r
+            v = cluster.v
+
+        if rmin == None:
+            rmin = np.min(r)
+        if rmax == None:
+            rmax = np.max(r)
+        if vmin == None:
+            vmin = np.min(v)
+        if vmax == None:
+            vmax = np.max(v)
+        if mmin == None:
+            mmin = np.min(cluster.m)
+        if mmax == None:
+            mmax = np.max(cluster.m)
+
+        if indx is None:
+            indx = cluster.id > -1
+
+        # Build subcluster containing only stars in the full radial and mass range:
+        indx *= (
+            (r >= rmin)
+            * (r <= rmax)
+            * (cluster.m >= mmin)
+            * (cluster.m <= mmax)
+            * (v >= vmin)
+            * (v <= vmax)
+            * (cluster.kw >= kwmin)
+            * (cluster.kw <= kwmax)
+        )
 
-    if emin != None:
-        indx *= cluster.etot >= emin
-    if emin != None:
-        indx *= cluster.etot <= emax
+        if emin != None:
+            indx *= cluster.etot >= emin
+        if emin != None:
+            indx *= cluster.etot <= emax
 
-    r_lower, r_mean, r_upper, r_hist = nbinmaker(r[indx], nrad)
+        r_lower, r_mean, r_upper, r_hist = nbinmaker(r[indx], nrad)
 
-    for i in range(0, len(r_mean)):
-        rindx = indx * (r >= r_lower[i]) * (r < r_upper[i])
-        rprof = np.append(rprof, r_mean[i])
-        if projected:
-            vol = np.pi * (r_upper[i] ** 2 - r_lower[i] ** 2.0)
-        else:
-            vol = (4.0 / 3.0) * np.pi * (r_upper[i] ** 3 - r_lower[i] ** 3.0)
+        for i in range(0, len(r_mean)):
+            rindx = indx * (r >= r_lower[i]) * (r < r_upper[i])
+            rprof = np.append(rprof, r_mean[i])
+            if projected:
+                vol = np.pi * (r_upper[i] ** 2 - r_lower[i] ** 2.0)
+            else:
+                vol = (4.0 / 3.0) * np.pi * (r_upper[i] ** 3 - r_lower[i] ** 3.0)
 
-        pprof = np.append(pprof, np.sum(cluster.m[rindx] / vol))
-        nprof = np.append(nprof, np.sum(rindx))
+            pprof = np.append(pprof, np.sum(cluster.m[rindx] / vol))
+            nprof = np.append(nprof, np.sum(rindx))
 
     if plot:
         filename = kwargs.pop("filename", None)
@@ -176,8 +204,6 @@ def rho_prof(
         if filename != None:
             plt.savefig(filename)
 
-    return_cluster(cluster, units0, origin0, do_order=True, do_key_params=True)
-
     return rprof, pprof, nprof
 
 
@@ -198,6 +224,7 @@ def m_prof(
     projected=False,
     cumulative=False,
     plot=False,
+    chunksize=None,
     **kwargs
 ):
     """
@@ -233,6 +260,9 @@ def m_prof(
 
        plot - plot the density profile (Default: False)
 
+       chunksize - read stars in blocks of chunksize stars, for clusters that do not fit in memory
+                   (see chunked_radial_bins) (Default: None)
+
     KWARGS:
 
        Same as for ..util.plot.nplot
@@ -246,64 +276,84 @@ def m_prof(
        2018 - Written - Webb (UofT)
 
     """
-    units0, origin0 = save_cluster(cluster)
-    cluster.to_centre(do_order=True, do_key_params=True)
+    cluster = cluster.view(origin="centre")
 
-    rprof = []
-    mprof = []
-    nprof = []
-
-    if projected:
-        r = cluster.rpro
-        v = cluster.vpro
+    if chunksize is not None:
+        r_lower, rprof, r_upper, nprof, mprof = chunked_radial_bins(
+            cluster,
+            chunksize,
+            nrad,
+            mmin,
+            mmax,
+            rmin,
+            rmax,
+            vmin,
+            vmax,
+            emin,
+            emax,
+            kwmin,
+            kwmax,
+            indx,
+            projected,
+            cumulative,
+        )
+        rprof, mprof, nprof = list(rprof), list(mprof), list(nprof)
     else:
-        r = cluster.r
-        v = cluster.v
-
-    if rmin == None:
-        rmin = np.min(r)
-    if rmax == None:
-        rmax = np.max(r)
-    if vmin == None:
-        vmin = np.min(v)
-    if vmax == None:
-        vmax = np.max(v)
-    if mmin == None:
-        mmin = np.min(cluster.m)
-    if mmax == None:
-        mmax = np.max(cluster.m)
-
-    if indx is None:
-        indx = cluster.id > -1
+        rprof = []
+        mprof = []
+        nprof = []
 
-    # Build subcluster containing only stars in the full radial and mass range:
-    indx *= (
-        (r >= rmin)
-        * (r <= rmax)
-        * (cluster.m >= mmin)
-        * (cluster.m <= mmax)
-        * (v >= vmin)
-        * (v <= vmax)
-        * (cluster.kw >= kwmin)
-        * (cluster.kw <= kwmax)
-    )
+        if projected:
+            r = cluster.rpro
+            v = cluster.vpro
+        else:
+            r = cluster.r
+            v = cluster.v
+
+        if rmin == None:
+            rmin = np.min(r)
+        if rmax == None:
+            rmax = np.max(r)
+        if vmin == None:
+            vmin = np.min(v)
+        if vmax == None:
+            vmax = np.max(v)
+        if mmin == None:
+            mmin = np.min(cluster.m)
+        if mmax == None:
+            mmax = np.max(cluster.m)
+
+        if indx is None:
+            indx = cluster.id > -1
+
+        # Build subcluster containing only stars in the full radial and mass range:
+        indx *= (
+            (r >= rmin)
+            * (r <= rmax)
+            * (cluster.m >= mmin)
+            * (cluster.m <= mmax)
+            * (v >= vmin)
+            * (v <= vmax)
+            * (cluster.kw >= kwmin)
+            * (cluster.kw <= kwmax)
+        )
 
-    if emin != None:
-        indx *= cluster.etot >= emin
-    if emin != None:
-        indx *= cluster.etot <= emax
+        if emin != None:
+            indx *= cluster.etot >= emin
+        if emin != None:
+            indx *= cluster.etot <= emax
 
-    r_lower, r_mean, r_upper, r_hist = nbinmaker(r[indx], nrad)
+        r_lower, r_mean, r_upper, r_hist = nbinmaker(r[indx], nrad)
 
-    for i in range(0, len(r_mean)):
-        if cumulative:
-            rindx = indx * (r < r_upper[i])
-        else:
-            rindx = indx * (r >= r_lower[i]) * (r < r_upper[i])
-        rprof.append(r_mean[i])
+        for i in range(0, len(r_mean)):
+            if cumulative:
+                rindx = indx * (r < r_upper[i])
+            else:
+                rindx = indx * (r >= r_lower[i]) * (r < r_upper[i])
+            rprof.append(r_mean[i])
 
-        mprof.append(np.sum(cluster.m[rindx]))
-        nprof.append(np.sum(rindx))
+            mprof.append(np.sum(cluster.m[rindx]))
+            nprof.append(np.sum(rindx))
 
     if plot:
         filename = kwargs.pop("filename", None)
@@ -340,8 +390,6 @@ def m_prof(
         if filename != None:
             plt.savefig(filename)
 
-    return_cluster(cluster, units0, origin0, do_order=True, do_key_params=True)
-
     return rprof, mprof, nprof
 
 def new_alpha_prof(
@@ -426,8 +474,7 @@ def new_alpha_prof(
 
     """
 
-    units0, origin0 = save_cluster(cluster)
-    cluster.to_centre(do_order=True, do_key_params=True)
+    cluster = cluster.view(origin="centre")
 
     if mcorr is None:
         if omask is not None:
@@ -546,8 +593,6 @@ def new_alpha_prof(
 
     cluster.dalpha = dalpha
 
-    return_cluster(cluster, units0, origin0, do_order=True, do_key_params=True)
-
     if return_error:
         return lrprofn, aprof, dalpha, edalpha, ydalpha, eydalpha, rbinerror
     else:
@@ -570,6 +615,9 @@ def alpha_prof(
     indx=None,
     projected=False,
     plot=False,
+    nboot=0,
+    n_jobs=1,
+    seed=None,
     **kwargs
 ):
     """
@@ -605,6 +653,14 @@ def alpha_prof(
 
        plot - plot the density profile (Default: False)
 
+       nboot - number of bootstrap resamples used to find edalpha and eydalpha, resampling all stars
+               with the radial bins of the cluster and mass bins found again for each resample
+               (Default: 0, use the covariance of the fit instead)
+
+       n_jobs - number of processes bootstrap resamples are spread across (Default: 1)
+
+       seed - seed of bootstrap resamples (Default: None)
+
     KWARGS:
 
        Same as for ..util.plot.nplot
@@ -627,11 +683,7 @@ def alpha_prof(
 
     """
 
-    units0, origin0 = save_cluster(cluster)
-    cluster.to_centre(do_order=True, do_key_params=True)
-
-    lrprofn = []
-    aprof = []
+    cluster = cluster.view(origin="centre")
 
     if projected:
         r = cluster.rpro
@@ -675,25 +727,41 @@ def alpha_prof(
 
     r_lower, r_mean, r_upper, r_hist = nbinmaker(r[indx], nrad)
 
-    for i in range(0, len(r_mean)):
-        rindx = indx * (r >= r_lower[i]) * (r < r_upper[i])
+    # Mass functions of all radial bins, found together
+    rsel = r[indx]
+    msel = cluster.m[indx]
+    rbin = bin_index(rsel, r_lower, r_upper)
+    alpha = shell_dx_function(msel, rbin, len(r_mean), nmass)["alpha"]
 
-        m_mean, m_hist, dm, alpha, ealpha, yalpha, eyalpha = dx_function(
-            cluster.m[rindx], nmass
-        )
+    used = alpha > -100
 
-        if alpha > -100:
-            if projected:
-                lrprofn.append(np.log(r_mean[i] / cluster.rmpro))
-            else:
-                lrprofn.append(np.log(r_mean[i] / cluster.rm))
-
-            aprof.append(alpha)
+    if projected:
+        lrprofn = np.log(r_mean[used] / cluster.rmpro).tolist()
+    else:
+        lrprofn = np.log(r_mean[used] / cluster.rm).tolist()
+    aprof = alpha[used].tolist()
 
     if len(lrprofn) > 3:
         (dalpha, ydalpha), V = np.polyfit(lrprofn, aprof, 1, cov=True)
         edalpha = np.sqrt(V[0][0])
         eydalpha = np.sqrt(V[1][1])
+
+        if nboot > 0:
+            # Stars in radial bins used, ordered by radial bin and mass
+            inused = rbin >= 0
+            inused[inused] = used[rbin[inused]]
+            rbin = np.where(inused, np.cumsum(used)[np.maximum(rbin, 0)] - 1, -1)
+            sel = np.flatnonzero(inused)
+            sel = sel[np.lexsort((msel[sel], rbin[sel]))]
+            bounds = np.append(0, np.cumsum(np.bincount(rbin[sel], minlength=np.sum(used))))
+
+            edalpha, eydalpha = bootstrap_errors(
+                resample_profile_slopes,
+                (len(rsel), sel, msel[sel], bounds, np.array(lrprofn), nmass),
+                nboot,
+                n_jobs,
+                seed,
+            )
     else:
         dalpha = -100.0
         ydalpha = 0.0
@@ -722,8 +790,6 @@ def alpha_prof(
 
     cluster.dalpha = dalpha
 
-    return_cluster(cluster, units0, origin0, do_order=True, do_key_params=True)
-
     return lrprofn, aprof, dalpha, edalpha, ydalpha, eydalpha
 
 
@@ -799,8 +865,7 @@ def sigv_prof(
 
     """
 
-    units0, origin0 = save_cluster(cluster)
-    cluster.to_centre(do_order=True, do_key_params=True)
+    cluster = cluster.view(origin="centre")
 
     lrprofn = []
     sigvprof = []
@@ -895,8 +960,6 @@ def sigv_prof(
             sigvprof.append(sigv)
             betaprof.append(beta)
 
-    return_cluster(cluster, units0, origin0, do_order=True, do_key_params=True)
-
     return lrprofn, sigvprof, betaprof
 
 
@@ -963,8 +1026,7 @@ def v_prof(
 
     """
 
-    units0, origin0 = save_cluster(cluster)
-    cluster.to_centre(do_order=True, do_key_params=True)
+    cluster = cluster.view(origin="centre")
 
     lrprofn = []
     sigvprof = []
@@ -1042,8 +1104,6 @@ def v_prof(
 
             vprof.append(vmean)
 
-    return_cluster(cluster, units0, origin0, do_order=True, do_key_params=True)
-
     return lrprofn, vprof
 
 
@@ -1119,8 +1179,7 @@ def eta_prof(
 
     """
 
-    units0, origin0 = save_cluster(cluster)
-    cluster.to_centre(do_order=True, do_key_params=True)
+    cluster = cluster.view(origin="centre")
 
     lrprofn = []
     eprof = []
@@ -1200,8 +1259,6 @@ def eta_prof(
         edeta = 0.0
         eydeta = 0.0
 
-    return_cluster(cluster, units0, origin0, do_order=True, do_key_params=True)
-
     return lrprofn, eprof, deta, edeta, ydeta, eydeta
 
 
@@ -1268,8 +1325,7 @@ def vcirc_prof(
 
     """
 
-    units0, origin0 = save_cluster(cluster)
-    cluster.to_centre(do_order=True, do_key_params=True)
+    cluster = cluster.view(origin="centre")
 
     if cluster.units == "nbody":
         grav = 1.0
@@ -1382,6 +1438,278 @@ def vcirc_prof(
         if filename != None:
             plt.savefig(filename)
 
-    return_cluster(cluster, units0, origin0, do_order=True, do_key_params=True)
-
     return rprof, vcprof, rvmax, vmax
+
+
+def multi_prof(
+    cluster,
+    quantities=["rho", "m", "sigv", "v", "alpha", "eta"],
+    bins=20,
+    mmin=None,
+    mmax=None,
+    rmin=None,
+    rmax=None,
+    vmin=None,
+    vmax=None,
+    emin=None,
+    emax=None,
+    kwmin=0,
+    kwmax=15,
+    indx=None,
+    projected=False,
+    nmass=10,
+    normalize=True,
+):
+    """
+    NAME:
+
+       multi_prof
+
+    PURPOSE:
+
+       Measure several radial profiles of the cluster at once
+       --> Stars are selected once, ordered by radius once (using the cluster's rorder or rproorder),
+           and assigned to radial bins once, so each profile is a sum over the stars in each bin
+       --> Profiles are the same as those of rho_prof, m_prof, sigv_prof, v_prof, alpha_prof and eta_prof
+           for the same stars and bins
+
+    INPUT:
+
+       cluster - StarCluster instance
+
+       quantities - profiles to measure (default: ["rho","m","sigv","v","alpha","eta"])
+                    rho - density
+                    m - mass in each bin
+                    mcum - mass within the upper edge of each bin
+                    sigv - velocity dispersion (with sigr,sigp,sigt and the anisotropy parameter beta)
+                    v - mean velocity
+                    alpha - slope of the mass function in each bin (with dalpha,edalpha,ydalpha,eydalpha
+                            from a fit to alpha vs lrprofn)
+                    eta - slope of the velocity dispersion - mass relation in each bin (with deta,edeta,ydeta,
+                          eydeta from a fit to eta vs lrprofn)
+
+       bins - number of radial bins with an equal number of stars, or an array of bin edges (default: 20)
+
+       mmin/mmax - minimum and maximum stellar mass
+
+       rmin/rmax - minimum and maximum stellar radii
+
+       vmin/vmax - minimum and maximum stellar velocity
+
+       emin/emax - minimum and maximum stellar energy
+
+       kwmin/kwmax - minimum and maximum stellar type (kw) (default: 0,15)
+
+       indx - user defined boolean array from which to extract the subset
+
+       projected - use projected values and constraints (Default:False)
+
+       nmass - number of mass bins used for alpha and eta (default: 10)
+
+       normalize - normalize radial bins by cluster's half-mass radius in lrprofn (default: True)
+
+    OUTPUT:
+
+       profiles - dictionary with r_lower,r_mean,r_upper,nprof (number of stars) and lrprofn
+                  (natural log of r_mean) of each bin, and each quantity measured
+                  (NaN in bins with too few stars)
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    cluster = cluster.view(origin="centre")
+
+    if projected:
+        r, v, rorder = cluster.rpro, cluster.vpro, cluster.rproorder
+    else:
+        r, v, rorder = cluster.r, cluster.v, cluster.rorder
+
+    stars = {
+        "indx": slice(None),
+        "id": cluster.id,
+        "kw": cluster.kw,
+        "m": cluster.m,
+        "r": r,
+        "v": v,
+    }
+    if emin is not None or emax is not None:
+        stars["etot"] = cluster.etot
+
+    sel = chunk_mask(
+        stars, mmin, mmax, rmin, rmax, vmin, vmax, emin, emax, kwmin, kwmax, indx
+    )
+
+    # Selected stars in order of radius
+    sindx = rorder[sel[rorder]]
+    rs = r[sindx]
+    ms = cluster.m[sindx]
+    n = len(rs)
+
+    if np.ndim(bins) == 0:
+        lower = [rs[int(float(i) * float(n) / float(bins))] for i in range(0, bins)]
+        upper = [
+            rs[int(float(i + 1) * float(n) / float(bins)) - 1] for i in range(0, bins)
+        ]
+        r_lower, r_upper = np.array(lower), np.array(upper)
+        rindx = r_lower != r_upper
+        r_lower, r_upper = r_lower[rindx], r_upper[rindx]
+    else:
+        r_lower, r_upper = np.asarray(bins[:-1]), np.asarray(bins[1:])
+
+    nbin = len(r_lower)
+
+    # Bins hold stars with r_lower <= r < r_upper, which are consecutive stars in order of radius
+    rbin = bin_index(rs, r_lower, r_upper)
+    inbin = rbin >= 0
+    rbin = rbin[inbin]
+    starts = np.searchsorted(rs, r_lower, side="left")
+    ends = np.searchsorted(rs, r_upper, side="left")
+
+    def bin_sum(x):
+        return np.bincount(rbin, weights=x[inbin], minlength=nbin)
+
+    nprof = np.bincount(rbin, minlength=nbin).astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r_mean = bin_sum(rs) / nprof
+
+    result = {"r_lower": r_lower, "r_mean": r_mean, "r_upper": r_upper, "nprof": nprof}
+
+    if normalize:
+        if projected:
+            result["lrprofn"] = np.log(r_mean / cluster.rmpro)
+        else:
+            result["lrprofn"] = np.log(r_mean / cluster.rm)
+    else:
+        result["lrprofn"] = np.log(r_mean)
+
+    if "rho" in quantities:
+        if projected:
+            vol = np.pi * (r_upper ** 2 - r_lower ** 2.0)
+        else:
+            vol = (4.0 / 3.0) * np.pi * (r_upper ** 3 - r_lower ** 3.0)
+        result["rho"] = bin_sum(ms) / vol
+
+    if "m" in quantities:
+        result["m"] = bin_sum(ms)
+
+    if "mcum" in quantities:
+        result["mcum"] = np.append(0.0, np.cumsum(ms))[ends]
+
+    if "sigv" in quantities or "v" in quantities:
+        x, y, z = cluster.x[sindx], cluster.y[sindx], cluster.z[sindx]
+        vx, vy, vz = cluster.vx[sindx], cluster.vy[sindx], cluster.vz[sindx]
+
+        if projected:
+            vr, vt, vz = bovy_coords.rect_to_cyl_vec(vx, vy, vz, x, y, z)
+            vp = np.zeros(n)
+        else:
+            rr, phi, theta, vr, vp, vt = cart_to_sphere(x, y, z, vx, vy, vz)
+
+        # Bins need more than 3 stars
+        few = nprof <= 3
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = [bin_sum(vc) / nprof for vc in [vr, vp, vt]]
+
+            if "v" in quantities:
+                vrmean, vpmean, vtmean = means
+                if projected:
+                    vpmean = np.zeros(nbin)
+                vmean = np.sqrt(vrmean ** 2.0 + vtmean ** 2.0 + vpmean ** 2.0)
+                vmean[few] = np.nan
+                result["v"] = vmean
+
+            if "sigv" in quantities:
+                sigr, sigp, sigt = [
+                    np.sqrt(
+                        np.bincount(
+                            rbin, weights=(vc[inbin] - mean[rbin]) ** 2.0, minlength=nbin
+                        )
+                        / nprof
+                    )
+                    for vc, mean in zip([vr, vp, vt], means)
+                ]
+
+                if projected:
+                    sigp = np.zeros(nbin)
+                    beta = sigt / sigr - 1.0
+                else:
+                    beta = 1.0 - (sigt ** 2.0 + sigp ** 2.0) / (2.0 * (sigr ** 2.0))
+
+                sigv = np.sqrt(sigr ** 2.0 + sigt ** 2.0 + sigp ** 2.0)
+
+                for name, prof in zip(
+                    ["sigv", "sigr", "sigp", "sigt", "beta"], [sigv, sigr, sigp, sigt, beta]
+                ):
+                    prof[few] = np.nan
+                    result[name] = prof
+
+    if "alpha" in quantities:
+        aprof = shell_dx_function(ms[inbin], rbin, nbin, nmass)["alpha"]
+        aprof[nprof < nmass] = np.nan
+
+        result["alpha"] = aprof
+        (
+            result["dalpha"],
+            result["edalpha"],
+            result["ydalpha"],
+            result["eydalpha"],
+        ) = profile_slope(result["lrprofn"], aprof)
+
+    if "eta" in quantities:
+        vs = v[sindx]
+        eprof = np.full(nbin, np.nan)
+        for i in range(0, nbin):
+            mb = ms[starts[i] : ends[i]]
+            vb = vs[starts[i] : ends[i]]
+            if len(mb) >= 2 * nmass:
+                stats = bin_stats(mb, vb, nbin=nmass)
+                eprof[i] = np.polyfit(
+                    np.log10(stats["x_mid"]), np.log10(stats["y_sig"]), 1
+                )[0]
+
+        result["eta"] = eprof
+        (
+            result["deta"],
+            result["edeta"],
+            result["ydeta"],
+            result["eydeta"],
+        ) = profile_slope(result["lrprofn"], eprof)
+
+    return result
+
+
+def profile_slope(lrprofn, prof):
+    """
+    NAME:
+
+       profile_slope
+
+    PURPOSE:
+
+       Fit a line to a profile of a slope (e.g. alpha or eta) vs the log of radius, ignoring bins
+       without a value
+
+    INPUT:
+
+       lrprofn - natural log of radius
+
+       prof - profile
+
+    OUTPUT:
+
+       slope,eslope,yslope,eyslope (-100.0,0.0,0.0,0.0 if there are 3 bins or fewer)
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    indx = np.isfinite(prof) * (prof > -100)
+    if np.sum(indx) > 3:
+        (slope, yslope), V = np.polyfit(lrprofn[indx], prof[indx], 1, cov=True)
+        return slope, np.sqrt(V[0][0]), yslope, np.sqrt(V[1][1])
+    else:
+        return -100.0, 0.0, 0.0, 0.0
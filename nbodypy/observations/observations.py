@@ -1,6 +1,5 @@
 # Routines for analysing Nbody models as if they were Observations
 import numpy as np
-from ..main.operations import save_cluster, return_cluster
 from ..util.recipes import *
 from ..util.plots import *
 
@@ -250,8 +249,7 @@ def obs_alpha_prof(
 
     """
 
-    units0, origin0 = save_cluster(cluster)
-    cluster.to_centre(do_order=True, do_key_params=True)
+    cluster = cluster.view(origin="centre")
 
     if mcorr is None:
         if omask is not None:
@@ -262,9 +260,6 @@ def obs_alpha_prof(
         else:
             mcorr = np.ones(cluster.ntot)
 
-    lrprofn = np.array([])
-    aprof = np.array([])
-
     if projected:
         r = cluster.rpro
         v = cluster.vpro
@@ -317,47 +312,40 @@ def obs_alpha_prof(
         except:
             r_lower, r_mean, r_upper, r_hist = nbinmaker(r[indx], nrad)
 
-    print('DEBUG: ',r_lower,r_mean,r_upper,omask.r_lower)
-
-    mbincorr=np.zeros(len(r_mean))
-
+    # Mass functions of all radial bins, found together
+    rbin = bin_index(r[indx], r_lower, r_upper)
 
-    for i in range(0, len(r_mean)):
-        rindx = indx * (r >= r_lower[i]) * (r < r_upper[i])
+    m_lower = None
+    if omask is not None:
+        try:
+            m_lower, m_mean, m_upper = omask.m_lower, omask.m_mean, omask.m_upper
+        except:
+            m_lower = None
 
-        if omask is None:
-            m_mean, m_hist, dm, alpha, ealpha, yalpha, eyalpha, mbincorr[i] = dx_corr_function(
-                cluster.m[rindx], nmass, mcorr[rindx]
-            )
-        else:
+    if m_lower is None:
+        shells = shell_dx_function(
+            cluster.m[indx], rbin, len(r_mean), nmass, xcorr=mcorr[indx]
+        )
+    else:
+        shells = shell_dx_function(
+            cluster.m[indx],
+            rbin,
+            len(r_mean),
+            nmass,
+            x_lower=m_lower,
+            x_mean=m_mean,
+            x_upper=m_upper,
+            xcorr=mcorr[indx],
+        )
 
-            try:
-                m_lower, m_mean, m_upper = omask.m_lower, omask.m_mean, omask.m_upper
+    mbincorr = shells["xbincorr"]
 
-                m_mean, m_hist, dm, alpha, ealpha, yalpha, eyalpha, mbincorr[i]= dx_corr_function(
-                    cluster.m[rindx],
-                    nmass,
-                    mcorr[rindx],
-                    x_lower=m_lower,
-                    x_mean=m_mean,
-                    x_upper=m_upper
-                )
-            except:
-                m_mean, m_hist, dm, alpha, ealpha, yalpha, eyalpha, mbincorr[i]= dx_corr_function(
-                    cluster.m[rindx],
-                    nmass,
-                    mcorr[rindx]
-                )
-
-        if projected:
-            lrprofn=np.append(lrprofn,np.log(r_mean[i] / cluster.rmpro))
-        else:
-            lrprofn=np.append(lrprofn,np.log(r_mean[i] / cluster.rm))
-        if alpha > -100:
-            aprof=np.append(aprof,alpha)
-        else:
-            aprof=np.append(aprof,-100.)
+    if projected:
+        lrprofn = np.log(r_mean / cluster.rmpro)
+    else:
+        lrprofn = np.log(r_mean / cluster.rm)
 
+    aprof = np.where(shells["alpha"] > -100, shells["alpha"], -100.0)
 
     aindx=(aprof>-100.)
 
@@ -393,8 +381,6 @@ def obs_alpha_prof(
 
     cluster.dalpha = dalpha
 
-    return_cluster(cluster, units0, origin0, do_order=True, do_key_params=True)
-
     return lrprofn, aprof, dalpha, edalpha, ydalpha, eydalpha, mbincorr
 
 
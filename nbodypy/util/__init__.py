@@ -8,7 +8,7 @@ __author__ = "Jeremy Webb"
 # IMPORTS
 
 # import modules (w/out internal dependencies)
-from . import constants, coordinates, plots, recipes, output
+from . import constants, coordinates, plots, recipes, table, output
 
 # import functions
 from .constants import *
@@ -16,6 +16,7 @@ from .coordinates import *
 from .output import *
 from .plots import *
 from .recipes import *
+from .table import *
 
 #############################################################################
 # END
@@ -3,9 +3,12 @@
 
 import numpy as np
 from galpy.util import bovy_conversion
+import os
+import json
 
 
 from .coordinates import sky_coords
+from .table import TableWriter
 from ..main.cluster import sub_cluster
 from ..main.functions import *
 from ..main.profiles import *
@@ -27,7 +30,8 @@ def extrct_out(cluster, fileout, projected=False):
 
        cluster - a StarCluster-class object
 
-       fileout - opened file to write data to
+       fileout - opened file to write data to, or a TableWriter
+                 --> Values that have not been calculated are written to a TableWriter as NaN
 
     OUTPUT:
 
@@ -38,16 +42,14 @@ def extrct_out(cluster, fileout, projected=False):
        2018 - Written - Webb (UofT)
 
     """
-    units0, origin0 = save_cluster(cluster)
-
     if cluster.ntot == 0:
         nb = 0
         cluster.mtot = 0.0
         trh = 0.0
         rn = np.zeros(10)
     else:
-        cluster.to_realpc()
-        cluster.to_centre(do_order=True, do_key_params=True)
+        units0, origin0 = save_cluster(cluster)
+        cluster = cluster.view(units="realpc", origin="centre")
 
         if cluster.nb > 0:
             nb = len(cluster.m2)
@@ -64,6 +66,31 @@ def extrct_out(cluster, fileout, projected=False):
         else:
             rn = np.zeros(10)
 
+    if isinstance(fileout, TableWriter):
+        if len(cluster.logl) > 0:
+            rhpro = cluster.rhpro
+        else:
+            rhpro = None
+
+        fileout.write(
+            {
+                "ntot": cluster.ntot,
+                "nb": nb,
+                "tphys": cluster.tphys,
+                "trh": trh,
+                "mtot": cluster.mtot,
+                "rn": rn,
+                "rmpro": cluster.rmpro,
+                "rhpro": rhpro,
+                "rv": cluster.rv,
+                "rl": cluster.rl,
+                "rt": cluster.rt,
+                "rvmax": getattr(cluster, "rvmax", None),
+                "vmax": getattr(cluster, "vmax", None),
+            }
+        )
+        return
+
     fileout.write(
         "%i %i %f %f %f " % (cluster.ntot, nb, cluster.tphys, trh, cluster.mtot)
     )
@@ -93,8 +120,6 @@ def extrct_out(cluster, fileout, projected=False):
 
     fileout.write("\n")
 
-    return_cluster(cluster, units0, origin0)
-
 
 def snapout(cluster, filename, energies=False, observations=False):
     """
@@ -221,6 +246,168 @@ def snapout(cluster, filename, energies=False, observations=False):
     return 0
 
 
+def npyout(cluster, filename, energies=True):
+    """
+    NAME:
+
+       npyout
+
+    PURPOSE:
+
+       Output a snapshot in nbodypy's binary format, which can be read back with load_cluster(ctype='npy')
+       --> filename is a directory with a header (header.json) containing tphys, units, origin, the
+           centre, the orbit and the scaling parameters, and one .npy file per array
+       --> Positions, masses and velocities are written as the single array StarCluster.phase
+       --> Stellar evolution and binary arrays are included when present
+
+    INPUT:
+
+       cluster - a StarCluster-class object
+
+       filename - name of directory to be written to
+
+       energies - include energies in output if present (Default: True)
+
+    OUTPUT:
+
+       None
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    if not os.path.isdir(filename):
+        os.makedirs(filename)
+
+    arrays = ["phase", "id", "kw"]
+    if len(cluster.logl) == cluster.ntot and cluster.ntot > 0:
+        arrays += ["logl", "logr", "ep", "ospin"]
+    if energies and len(cluster.kin) == cluster.ntot and cluster.ntot > 0:
+        arrays += ["kin", "pot", "etot"]
+    if len(cluster.id1) > 0:
+        arrays += [
+            "id1",
+            "id2",
+            "kw1",
+            "kw2",
+            "kcm",
+            "ecc",
+            "pb",
+            "semi",
+            "m1",
+            "m2",
+            "logl1",
+            "logl2",
+            "logr1",
+            "logr2",
+        ]
+        if len(cluster.ep1) == len(cluster.id1):
+            arrays += ["ep1", "ep2", "ospin1", "ospin2"]
+
+    for name in arrays:
+        np.save(
+            os.path.join(filename, name + ".npy"),
+            np.ascontiguousarray(getattr(cluster, name)),
+        )
+
+    params = {"nb": int(cluster.nb)}
+    for name in [
+        "zmbar",
+        "rbar",
+        "vstar",
+        "tstar",
+        "xc",
+        "yc",
+        "zc",
+        "vxc",
+        "vyc",
+        "vzc",
+        "xgc",
+        "ygc",
+        "zgc",
+        "vxgc",
+        "vygc",
+        "vzgc",
+    ]:
+        params[name] = float(getattr(cluster, name))
+
+    header = {
+        "ntot": int(cluster.ntot),
+        "tphys": float(cluster.tphys),
+        "units": cluster.units,
+        "origin": cluster.origin,
+        "ctype": cluster.ctype,
+        "params": params,
+        "arrays": arrays,
+    }
+
+    with open(os.path.join(filename, "header.json"), "w") as headerfile:
+        json.dump(header, headerfile, indent=1)
+
+    return 0
+
+
+def convert_to_npy(ctype="nbodypy", outdir="./npy/", nsnap_max=None, energies=True, **kwargs):
+    """
+    NAME:
+
+       convert_to_npy
+
+    PURPOSE:
+
+       Convert a series of snapshots of any type supported by load_cluster to nbodypy's binary format
+       --> Snapshots are read with load_cluster and advance_cluster until no more are found (or nsnap_max
+           is reached) and written with npyout to outdir, named by snapshot number
+       --> The converted snapshots can be read with load_cluster(ctype='npy',wdir=outdir,snapdir='')
+
+    INPUT:
+
+       ctype - type of snapshots being converted (default: 'nbodypy')
+
+       outdir - directory that snapshots are written to (default: './npy/')
+
+       nsnap_max - last snapshot to convert (default: None)
+
+       energies - include energies in output if present (Default: True)
+
+    KWARGS:
+
+       same as load_cluster
+
+    OUTPUT:
+
+       number of snapshots converted
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    # Imported here, as importing main.load imports the util package, which imports this module
+    from ..main.load import load_cluster, advance_cluster
+
+    cluster = load_cluster(ctype=ctype, **kwargs)
+    nconvert = 0
+
+    while cluster.ntot > 0:
+        npyout(
+            cluster,
+            "%s%s" % (outdir, str(cluster.nsnap).zfill(cluster.nzfill)),
+            energies=energies,
+        )
+        nconvert += 1
+
+        if kwargs.get("filename", None) != None:
+            break
+        if nsnap_max != None and cluster.nsnap >= nsnap_max:
+            break
+
+        cluster = advance_cluster(cluster, **kwargs)
+
+    return nconvert
+
+
 def fortout(
     cluster,
     filename="fort.10",
@@ -258,13 +445,10 @@ def fortout(
        2019 - Written - Webb (UofT)
 
     """
-    units0, origin0 = save_cluster(cluster)
-    cluster.to_centre()
-
     if reset_nbody_scale:
         reset_nbody_scale(cluster, mass=reset_nbody_mass, radii=reset_nbody_radii)
 
-    cluster.to_nbody()
+    cluster = cluster.view(units="nbody", origin="centre")
 
     np.savetxt(
         filename,
@@ -281,8 +465,6 @@ def fortout(
         ),
     )
 
-    return_cluster(cluster, units0, origin0)
-
     return 0
 
 
@@ -314,9 +496,7 @@ def gyrout(cluster, filename="init.nemo.dat"):
     vcon = 220.0 / bovy_conversion.velocity_in_kpcGyr(220.0, 8.0)
     mcon = 222288.4543021174
 
-    units0, origin0 = save_cluster(cluster)
-    cluster.to_galaxy()
-    cluster.to_realkpc()
+    cluster = cluster.view(units="realkpc", origin="galaxy")
 
     np.savetxt(
         filename,
@@ -333,6 +513,4 @@ def gyrout(cluster, filename="init.nemo.dat"):
         ),
     )
 
-    return_cluster(cluster, units0, origin0)
-
     return 0
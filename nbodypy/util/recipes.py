@@ -3,6 +3,8 @@
 import numpy as np
 import numba
 import matplotlib.pyplot as plt
+from scipy.spatial import cKDTree
+from concurrent.futures import ProcessPoolExecutor
 from ..util.plots import *
 
 
@@ -35,204 +37,1078 @@ def nbinmaker(x, nbin=10, nsum=False):
      2018 - Written - Webb (UofT)
 
   """
-    x = np.asarray(x)
+    stats = bin_stats(x, nbin=nbin, bintype="num")
+
+    if nsum:
+        return stats["x_lower"], stats["x_mid"], stats["x_upper"], stats["x_hist"], stats["x_sum"]
+    else:
+        return stats["x_lower"], stats["x_mid"], stats["x_upper"], stats["x_hist"]
+
+
+def binmaker(x, nbin=10, nsum=False, steptype="linear"):
+    """
+  NAME:
 
-    xorder = np.argsort(x)
+     binmaker
 
-    x_lower = np.array([])
-    x_upper = np.array([])
-    x_hist = np.array([])
-    x_sum = np.array([])
-    x_mid = np.array([])
+  PURPOSE:
 
-    for i in range(0, nbin):
-        indx = int(float(i) * float(len(x)) / float(nbin))
-        x_lower = np.append(x_lower, x[xorder[indx]])
-        indx = int(float(i + 1) * float(len(x)) / float(nbin)) - 1
-        x_upper = np.append(x_upper, x[xorder[indx]])
+     Split an array into nbin bin's of equal size
 
-    indx = x_lower != x_upper
-    x_lower = x_lower[indx]
-    x_upper = x_upper[indx]
+  INPUT:
 
-    for i in range(0, np.sum(indx)):
-        indx = (x >= x_lower[i]) * (x < x_upper[i])
-        x_hist = np.append(x_hist, np.sum(indx))
-        x_sum = np.append(x_sum, np.sum(x[indx]))
-        x_mid = np.append(x_mid, x_sum[i] / x_hist[i])
+     x - input array
+
+     nbin - number of bins
+
+     nsum - return number of points in each bin
+
+     steptype - linear or logarithmic steps
+
+  OUTPUT:
+
+     x_lower,x_mid,x_upper,x_hist (if nsum==False)
+
+     x_lower,x_mid,x_upper,x_hist,x_sum (if nsum==True)
+
+  HISTORY:
+
+     2018 - Written - Webb (UofT)
+
+  """
+    stats = bin_stats(x, nbin=nbin, bintype="fix", steptype=steptype)
 
     if nsum:
-        return x_lower, x_mid, x_upper, x_hist, x_sum
+        return stats["x_lower"], stats["x_mid"], stats["x_upper"], stats["x_hist"], stats["x_sum"]
     else:
-        return x_lower, x_mid, x_upper, x_hist
+        return stats["x_lower"], stats["x_mid"], stats["x_upper"], stats["x_hist"]
 
 
-def binmaker(x, nbin=10, nsum=False, steptype="linear"):
+def bin_edges(x, nbin=10, bintype="num", steptype="linear"):
     """
   NAME:
 
-     binmaker
+     bin_edges
+
+  PURPOSE:
+
+     Find the edges of bins holding an equal number of elements of an array, or of equal size
+     --> Bins hold elements with x_lower <= x < x_upper
+     --> Equal number bins are found with a single sort. Bins whose edges are the same value are removed
+
+  INPUT:
+
+     x - input array
+
+     nbin - number of bins
+
+     bintype - bins with an equal number of elements ('num') or of fixed size ('fix') (default: num)
+
+     steptype - for fixed size bins, 'linear' or 'log' steps (default: linear)
+
+  OUTPUT:
+
+     x_lower,x_upper
+
+  HISTORY:
+
+     2020 - Written - Webb (UofT)
+
+  """
+    x = np.asarray(x)
+
+    if bintype == "num":
+        xsort = np.sort(x)
+        n = len(x)
+        lower = [int(float(i) * float(n) / float(nbin)) for i in range(0, nbin)]
+        upper = [int(float(i + 1) * float(n) / float(nbin)) - 1 for i in range(0, nbin)]
+        x_lower = xsort[lower]
+        x_upper = xsort[upper]
+
+        indx = x_lower != x_upper
+        return x_lower[indx], x_upper[indx]
+
+    if steptype == "linear":
+        steps = np.linspace(np.amin(x), np.amax(x), nbin + 1)
+    else:
+        steps = np.logspace(np.log10(np.amin(x)), np.log10(np.amax(x)), nbin + 1)
+
+    return steps[:-1], steps[1:]
+
+
+def bin_index(x, x_lower, x_upper):
+    """
+  NAME:
+
+     bin_index
+
+  PURPOSE:
+
+     Find the bin each element of an array falls in, for bins holding elements with x_lower <= x < x_upper
+     --> x_lower must be increasing and bins must not overlap
+
+  INPUT:
+
+     x - input array
+
+     x_lower,x_upper - bins
+
+  OUTPUT:
+
+     bin of each element (-1 for elements outside of every bin)
+
+  HISTORY:
+
+     2020 - Written - Webb (UofT)
+
+  """
+    x = np.asarray(x)
+    x_upper = np.asarray(x_upper)
+
+    b = np.searchsorted(x_lower, x, side="right") - 1
+    indx = b >= 0
+    indx[indx] = x[indx] < x_upper[b[indx]]
+    b[np.logical_not(indx)] = -1
+
+    return b
+
+
+def bin_stats(
+    x,
+    y=None,
+    nbin=10,
+    bintype="num",
+    steptype="linear",
+    x_lower=None,
+    x_upper=None,
+    weights=None,
+    median=False,
+):
+    """
+  NAME:
+
+     bin_stats
+
+  PURPOSE:
+
+     Bin an array and find the number of elements in each bin, and the mean, dispersion, range and
+     (optionally) median of a second array in each bin
+     --> Each element is assigned to a bin once, and all bins are summed at once
+     --> With weights, the mean, dispersion and median of y are weighted
+
+  INPUT:
+
+     x - input array
+
+     y - values to find the mean, dispersion, range and median of in each bin (default: None)
+
+     nbin - number of bins
+
+     bintype - bins with an equal number of elements ('num') or of fixed size ('fix') (default: num)
+
+     steptype - for fixed size bins, 'linear' or 'log' steps (default: linear)
+
+     x_lower,x_upper - preset bins (see bin_index) (default: None)
+
+     weights - weights of each element (default: None)
+
+     median - find the median of y in each bin (default: False)
+
+  OUTPUT:
+
+     dictionary of arrays with one value per bin:
+
+     x_lower,x_upper - bins
+
+     x_mid - mean of x in each bin (for equal number or preset bins), or middle of each bin (for fixed size bins)
+
+     x_hist,x_sum - number of elements and sum of x in each bin
+
+     w_sum - sum of weights in each bin (if weights are given)
+
+     y_mean,y_sig,y_min,y_max - mean, standard deviation, minimum and maximum of y in each bin (if y is given)
+
+     y_median - median of y in each bin (if y is given and median is True)
+
+     Bins without elements have a mean, dispersion, range and median of 0
+
+  HISTORY:
+
+     2020 - Written - Webb (UofT)
+
+  """
+    x = np.asarray(x)
+    fixed = x_lower is None and bintype == "fix"
+
+    if x_lower is None:
+        x_lower, x_upper = bin_edges(x, nbin, bintype, steptype)
+    else:
+        x_lower, x_upper = np.asarray(x_lower), np.asarray(x_upper)
+
+    nbin = len(x_lower)
+    b = bin_index(x, x_lower, x_upper)
+    indx = b >= 0
+    b = b[indx]
+
+    stats = {"x_lower": x_lower, "x_upper": x_upper}
+    stats["x_hist"] = np.bincount(b, minlength=nbin).astype(float)
+    stats["x_sum"] = np.bincount(b, weights=x[indx], minlength=nbin)
+
+    # Means are only found for bins with elements
+    full = stats["x_hist"] > 0
+
+    if fixed:
+        stats["x_mid"] = (x_upper + x_lower) / 2.0
+    else:
+        stats["x_mid"] = np.zeros(nbin)
+        stats["x_mid"][full] = stats["x_sum"][full] / stats["x_hist"][full]
+
+    if weights is not None:
+        w = np.asarray(weights, dtype=float)[indx]
+        stats["w_sum"] = np.bincount(b, weights=w, minlength=nbin)
+        full = stats["w_sum"] > 0
+    else:
+        w = np.ones(len(b))
+
+    if y is None:
+        return stats
+
+    y = np.asarray(y, dtype=float)[indx]
+    wsum = np.bincount(b, weights=w, minlength=nbin)
+
+    y_mean = np.zeros(nbin)
+    y_mean[full] = np.bincount(b, weights=w * y, minlength=nbin)[full] / wsum[full]
+    y_sig = np.zeros(nbin)
+    y_sig[full] = np.sqrt(
+        np.bincount(b, weights=w * (y - y_mean[b]) ** 2.0, minlength=nbin)[full]
+        / wsum[full]
+    )
+    stats["y_mean"] = y_mean
+    stats["y_sig"] = y_sig
+
+    # Elements grouped by bin (and sorted by y within each bin for medians), using a stable sort of
+    # the bin numbers, which is a radix sort for up to 32767 bins
+    if nbin < 32767:
+        b = b.astype(np.int16)
+    if median:
+        order = np.argsort(y, kind="stable")
+        order = order[np.argsort(b[order], kind="stable")]
+    else:
+        order = np.argsort(b, kind="stable")
+    ysort = y[order]
+    counts = np.bincount(b, minlength=nbin)
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    nfull = counts > 0
+
+    stats["y_min"] = np.zeros(nbin)
+    stats["y_max"] = np.zeros(nbin)
+    if np.any(nfull):
+        stats["y_min"][nfull] = np.minimum.reduceat(ysort, starts[nfull])
+        stats["y_max"][nfull] = np.maximum.reduceat(ysort, starts[nfull])
+
+    if median:
+        stats["y_median"] = np.zeros(nbin)
+        if weights is None:
+            lower = starts + (counts - 1) // 2
+            upper = starts + counts // 2
+            stats["y_median"][nfull] = (ysort[lower[nfull]] + ysort[upper[nfull]]) / 2.0
+        else:
+            # First element at which the cumulative weight in its bin reaches half the weight of the bin
+            wcum = np.cumsum(w[order])
+            wbefore = np.append(0.0, wcum)[starts]
+            half = np.searchsorted(wcum, wbefore + 0.5 * wsum, side="left")
+            half = np.minimum(half, ends - 1)
+            stats["y_median"][full] = ysort[half[full]]
+
+    return stats
+
+
+def power_law_distribution_function(n, alpha, xmin, xmax):
+    """
+  NAME:
+
+     power_law_distribution_function
+
+  PURPOSE:
+
+     Generate points from a power-law distribution function
+  INPUT:
+
+     n - number of points
+
+     alpha - power-law slope of distribution function
+
+     xmin,xmax - minimum and maximum values of distribution
+
+  OUTPUT:
+
+     c
+
+  HISTORY:
+
+     2019 - Written - Webb (UofT)
+  """
+
+    eta = alpha + 1.0
+
+    if xmin == xmax:
+        x = xmin
+    elif alpha == 0:
+        x = xmin + np.random.random(n) * (xmax - xmin)
+    elif alpha > 0:
+        x = xmin + np.random.power(eta, n) * (xmax - xmin)
+    elif alpha < 0 and alpha != -1.0:
+        x = (xmin ** eta + (xmax ** eta - xmin ** eta) * np.random.rand(n)) ** (
+            1.0 / eta
+        )
+    elif alpha == -1:
+        x = np.log10(xmin) + np.random.random(n) * (np.log10(xmax) - np.log10(xmin))
+        x = 10.0 ** x
+
+    return np.array(x)
+
+
+def dx_function(
+    x,
+    nx=10,
+    bintype="num",
+    x_lower=None,
+    x_mean=None,
+    x_upper=None,
+    plot=False,
+    nboot=0,
+    n_jobs=1,
+    seed=None,
+    **kwargs
+):
+    """
+  NAME:
+
+     dx_function
+
+  PURPOSE:
+
+     Find distribution function using nx bins containing an equal number of points
+  INPUT:
+
+     x - input array
+
+     nx - number of bins
+
+     bintype - bin with equal number of stars per bin (bin) or evenly in x (fix) (default: num)
+
+     x_lower,x_mean,x_upper - preset bins
+
+     nboot - number of bootstrap resamples used to find ealpha and eyalpha (default: 0, use the
+             covariance of the fit instead). Equal number bins are found again for each resample
+
+     n_jobs - number of processes bootstrap resamples are spread across (default: 1)
+
+     seed - seed of bootstrap resamples (default: None)
+
+  OUTPUT:
+
+     x_mean,x_hist,dx,alpha,ealpha,yalpha,eyalpha
+
+
+  HISTORY:
+
+     2018 - Written - Webb (UofT)
+
+  """
+
+    preset = x_lower is not None
+
+    if x_lower is None:
+        if bintype == "num":
+            x_lower, x_mean, x_upper, x_hist = nbinmaker(x, nx)
+        else:
+            x_lower, x_mean, x_upper, x_hist = binmaker(x, nx)
+    else:
+        x_hist = bin_stats(x, x_lower=x_lower, x_upper=x_upper)["x_hist"]
+
+    lx_mean = np.log10(x_mean)
+    dx = x_hist / (x_upper - x_lower)
+    ldx = np.log10(dx)
+
+    (alpha, yalpha), V = np.polyfit(lx_mean, ldx, 1, cov=True)
+    ealpha = np.sqrt(V[0][0])
+    eyalpha = np.sqrt(V[1][1])
+
+    if nboot > 0 and (preset or bintype != "num"):
+        ealpha, eyalpha = bootstrap_errors(
+            resample_binned_slopes,
+            (x_mean, x_upper - x_lower, x_hist, len(x)),
+            nboot,
+            n_jobs,
+            seed,
+        )
+    elif nboot > 0:
+        ealpha, eyalpha = bootstrap_errors(
+            resample_slopes, (np.sort(x), nx), nboot, n_jobs, seed
+        )
+
+    if plot:
+            filename = kwargs.get("filename", None)
+            nplot(x_mean, np.log10(dx), xlabel="x", ylabel="LOG(dN/dx)", **kwargs)
+            xfit = np.linspace(np.min(x_mean), np.max(x_mean), nx)
+            dxfit = 10.0 ** (alpha * np.log10(xfit) + yalpha)
+            nlplot(
+                xfit, np.log10(dxfit), overplot=True, label=(r"$\alpha$ = %f" % alpha)
+            )
+
+            plt.legend()
+
+            if filename != None:
+                plt.savefig(filename)
+
+    return x_mean, x_hist, dx, alpha, ealpha, yalpha, eyalpha
+
+def fit_lines(x, y):
+    """
+  NAME:
+
+     fit_lines
+
+  PURPOSE:
+
+     Fit a line to many sets of points at once, by least squares
+     --> Points with x or y that are not finite are not used
+
+  INPUT:
+
+     x - x values of the points (shape (...,npoint), or (npoint) if all sets share them)
+
+     y - y values of the points (shape (...,npoint))
+
+  OUTPUT:
+
+     slope,intercept of each set (NaN for sets with fewer than 2 points)
+
+  HISTORY:
+
+     2020 - Written - Webb (UofT)
+
+  """
+    x = np.broadcast_to(np.asarray(x, dtype=float), np.shape(y))
+    y = np.asarray(y, dtype=float)
+
+    indx = np.isfinite(x) * np.isfinite(y)
+    x = np.where(indx, x, 0.0)
+    y = np.where(indx, y, 0.0)
+
+    n = np.sum(indx, axis=-1)
+    sx = np.sum(x, axis=-1)
+    sy = np.sum(y, axis=-1)
+    sxx = np.sum(x * x, axis=-1)
+    sxy = np.sum(x * y, axis=-1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+        intercept = (sy - slope * sx) / n
+
+    slope = np.where(n > 1, slope, np.nan)
+    intercept = np.where(n > 1, intercept, np.nan)
+
+    return slope, intercept
+
+
+def shell_dx_function(
+    x,
+    shell,
+    nshell=None,
+    nx=10,
+    bintype="num",
+    steptype="linear",
+    x_lower=None,
+    x_mean=None,
+    x_upper=None,
+    xcorr=None,
+):
+    """
+  NAME:
+
+     shell_dx_function
+
+  PURPOSE:
+
+     Find the distribution function of x, and the slope of log(dN/dx) vs log(x), in each of many shells
+     (e.g. radial bins) at once, as dx_function does for the elements of each shell
+     --> Elements are sorted once by shell and x, and all shells are binned and fit together
+     --> Bins of equal number elements and of equal size are found separately for each shell,
+         while preset bins are shared by all shells
+
+  INPUT:
+
+     x - input array
+
+     shell - shell of each element (elements in shells < 0 are not used)
+
+     nshell - number of shells (default: None, largest shell + 1)
+
+     nx - number of bins in each shell
+
+     bintype - bin with equal number of stars per bin (num) or evenly in x (fix) (default: num)
+
+     steptype - for fix bins, linear or log steps (default: linear)
+
+     x_lower,x_mean,x_upper - preset bins (default: None). If x_mean is None, the mean of x in each bin is used
+
+     xcorr - correction function for x, with each element counted as 1/xcorr (default: None)
+
+  OUTPUT:
+
+     dictionary with arrays of shape (nshell,nx) of x_lower,x_mean,x_upper,x_hist,dx (NaN for bins removed
+     because their edges are the same value) and arrays of shape (nshell) of alpha,ealpha,yalpha,eyalpha
+     (NaN for shells with too few bins to fit). With xcorr, x_hist_corr and xbincorr are also given
+     (see dx_corr_function)
+
+  HISTORY:
+
+     2020 - Written - Webb (UofT)
+
+  """
+    x = np.asarray(x, dtype=float)
+    shell = np.asarray(shell)
+    if nshell is None:
+        nshell = np.max(shell) + 1
+
+    inshell = shell >= 0
+    x, shell = x[inshell], shell[inshell]
+    if xcorr is not None:
+        wcorr = 1.0 / np.asarray(xcorr, dtype=float)[inshell]
+
+    if x_lower is None and bintype == "num":
+        # Elements sorted by x, then grouped by shell with a stable radix sort (elements with equal x
+        # always share a bin, so the first sort need not be stable)
+        order = np.argsort(x)
+        if nshell < 32767:
+            order = order[np.argsort(shell[order].astype(np.int16), kind="stable")]
+        else:
+            order = order[np.argsort(shell[order], kind="stable")]
+        bounds = np.append(0, np.cumsum(np.bincount(shell, minlength=nshell)))
+
+        stats = resampled_nbinmaker(
+            x[order],
+            np.ones((1, len(x))),
+            nx,
+            bounds=bounds,
+            y=None if xcorr is None else wcorr[order],
+        )
+        x_lower, x_upper = stats["x_lower"][0], stats["x_upper"][0]
+        x_hist = stats["x_hist"][0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            x_mean = stats["x_sum"][0] / x_hist
+        if xcorr is not None:
+            x_hist_corr = stats["y_sum"][0]
+    else:
+        if x_lower is None:
+            # Bins of equal size between the smallest and largest x of each shell
+            xmin = np.full(nshell, np.inf)
+            xmax = np.full(nshell, -np.inf)
+            np.minimum.at(xmin, shell, x)
+            np.maximum.at(xmax, shell, x)
+            # Steps found as np.linspace and np.logspace find them
+            with np.errstate(invalid="ignore", divide="ignore"):
+                if steptype == "linear":
+                    start, stop = xmin, xmax
+                else:
+                    start, stop = np.log10(xmin), np.log10(xmax)
+                steps = np.arange(nx + 1) * ((stop - start) / float(nx))[:, None] + start[:, None]
+                steps[:, -1] = stop
+                if steptype != "linear":
+                    steps = 10.0 ** steps
+            x_lower, x_upper = steps[:, :-1], steps[:, 1:]
+            x_mean = (x_lower + x_upper) / 2.0
+
+            # Bin of each element from the number of lower edges of its shell at or below it
+            b = np.full(len(x), -1)
+            for i in range(0, nx):
+                b += x >= x_lower[shell, i]
+            last = b == nx - 1
+            b[last] = np.where(x[last] < x_upper[shell[last], -1], nx - 1, -1)
+        else:
+            nx = len(x_lower)
+            b = bin_index(x, x_lower, x_upper)
+            x_lower = np.broadcast_to(np.asarray(x_lower, dtype=float), (nshell, nx))
+            x_upper = np.broadcast_to(np.asarray(x_upper, dtype=float), (nshell, nx))
+            if x_mean is not None:
+                x_mean = np.broadcast_to(np.asarray(x_mean, dtype=float), (nshell, nx))
+
+        # Two dimensional histogram of shell and bin
+        inbin = b >= 0
+        key = shell[inbin] * nx + b[inbin]
+        x_hist = np.bincount(key, minlength=nshell * nx).reshape(nshell, nx).astype(float)
+        if x_mean is None:
+            x_sum = np.bincount(key, weights=x[inbin], minlength=nshell * nx)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                x_mean = x_sum.reshape(nshell, nx) / x_hist
+        if xcorr is not None:
+            x_hist_corr = np.bincount(
+                key, weights=wcorr[inbin], minlength=nshell * nx
+            ).reshape(nshell, nx)
+
+    if xcorr is None:
+        x_hist_corr = x_hist
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lx_mean = np.log10(x_mean)
+        dx = x_hist_corr / (x_upper - x_lower)
+        ldx = np.log10(dx)
+
+    alpha, yalpha = fit_lines(lx_mean, ldx)
+
+    # Uncertainties from the covariance of each fit, as found by np.polyfit
+    indx = np.isfinite(lx_mean) * np.isfinite(ldx)
+    lx = np.where(indx, lx_mean, 0.0)
+    n = np.sum(indx, axis=-1)
+    sx = np.sum(lx, axis=-1)
+    sxx = np.sum(lx * lx, axis=-1)
+    resid = np.where(indx, ldx - alpha[:, None] * lx - yalpha[:, None], 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fac = np.sum(resid ** 2.0, axis=-1) / (n - 2.0) / (n * sxx - sx * sx)
+        ealpha = np.where(n > 2, np.sqrt(n * fac), np.nan)
+        eyalpha = np.where(n > 2, np.sqrt(sxx * fac), np.nan)
+
+    stats = {
+        "x_lower": x_lower,
+        "x_mean": x_mean,
+        "x_upper": x_upper,
+        "x_hist": x_hist,
+        "dx": dx,
+        "alpha": alpha,
+        "ealpha": ealpha,
+        "yalpha": yalpha,
+        "eyalpha": eyalpha,
+    }
+
+    if xcorr is not None:
+        stats["x_hist_corr"] = x_hist_corr
+        with np.errstate(invalid="ignore", divide="ignore"):
+            stats["xbincorr"] = np.nanmin(x_hist / x_hist_corr, axis=1)
+
+    return stats
+
+
+def bootstrap(resample, data, nboot=100, n_jobs=1, seed=None, blocksize=100):
+    """
+  NAME:
+
+     bootstrap
+
+  PURPOSE:
+
+     Find the results of many bootstrap resamples, spread across a pool of processes
+     --> Resamples are made in blocks of blocksize, each with its own random number generator spawned
+         from seed, so results only depend on seed and not on the number of processes
+
+  INPUT:
+
+     resample - function called as resample(data,n,seed) that returns the results of n resamples as an
+                array with one row per resample (e.g. resample_slopes)
+
+     data - data passed to resample
+
+     nboot - number of resamples (default: 100)
+
+     n_jobs - number of processes (default: 1, resamples are made here)
+
+     seed - seed of the random number generators (default: None)
+
+     blocksize - number of resamples in each block (default: 100)
+
+  OUTPUT:
+
+     array of results of each resample
+
+  HISTORY:
+
+     2020 - Written - Webb (UofT)
+
+  """
+    nblock = int(np.ceil(float(nboot) / float(blocksize)))
+    sizes = [min(blocksize, nboot - i * blocksize) for i in range(0, nblock)]
+    seeds = np.random.SeedSequence(seed).spawn(nblock)
+
+    if n_jobs is None or n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            results = list(executor.map(resample, [data] * nblock, sizes, seeds))
+    else:
+        results = [resample(data, size, s) for size, s in zip(sizes, seeds)]
+
+    return np.concatenate(results)
+
+
+def bootstrap_errors(resample, data, nboot=100, n_jobs=1, seed=None):
+    """
+  NAME:
+
+     bootstrap_errors
+
+  PURPOSE:
+
+     Find the uncertainty in the slope and intercept of a fit from the standard deviation of
+     bootstrap resamples (see bootstrap)
+
+  INPUT:
+
+     resample - function returning the slope and intercept of each resample (e.g. resample_slopes)
+
+     data - data passed to resample
+
+     nboot - number of resamples (default: 100)
+
+     n_jobs - number of processes (default: 1)
+
+     seed - seed of the random number generators (default: None)
+
+  OUTPUT:
+
+     eslope,eintercept
+
+  HISTORY:
+
+     2020 - Written - Webb (UofT)
+
+  """
+    results = bootstrap(resample, data, nboot, n_jobs, seed)
+
+    return np.nanstd(results[:, 0], ddof=1), np.nanstd(results[:, 1], ddof=1)
+
+
+def resample_weights(n, nboot, rng):
+    """
+  NAME:
+
+     resample_weights
+
+  PURPOSE:
+
+     Draw the number of times each of n elements is chosen in bootstrap resamples of n elements
+
+  INPUT:
+
+     n - number of elements
+
+     nboot - number of resamples
+
+     rng - numpy random number generator
+
+  OUTPUT:
+
+     weights - array of shape (nboot,n)
+
+  HISTORY:
+
+     2020 - Written - Webb (UofT)
+
+  """
+    indx = rng.integers(0, n, size=(nboot, n)) + n * np.arange(nboot)[:, None]
+
+    return np.bincount(indx.ravel(), minlength=nboot * n).reshape(nboot, n)
+
+
+def resampled_nbinmaker(x, w, nbin=10, bounds=None, y=None):
+    """
+  NAME:
+
+     resampled_nbinmaker
+
+  PURPOSE:
+
+     Split resamples of sorted arrays into nbin bins of equal number elements, as nbinmaker does
+     for each resampled array
+     --> Each resample is given by the number of times each element is chosen, and bin edges are found
+         from the cumulative number of elements chosen, so elements are never sorted again
+
+  INPUT:
+
+     x - sorted array (or arrays sorted within each segment)
+
+     w - number of times each element is chosen in each resample (shape (nboot,len(x)))
+
+     nbin - number of bins
+
+     bounds - indices of the first element of each segment of x, followed by len(x)
+              (default: None, a single segment)
+
+     y - values of each element, whose sum and sum of squares are found in each bin (default: None)
+
+  OUTPUT:
+
+     dictionary of arrays of shape (nboot,nsegment,nbin) with x_lower,x_upper,x_hist and x_sum (and y_sum,y2_sum)
+     (NaN in bins removed by nbinmaker because their edges are the same value)
+
+  HISTORY:
+
+     2020 - Written - Webb (UofT)
+
+  """
+    x = np.asarray(x, dtype=float)
+    nboot, n = np.shape(w)
+    if bounds is None:
+        bounds = np.array([0, n])
+    bounds = np.asarray(bounds)
+
+    # Integer keys that increase with x within a segment and between segments, equal for equal values
+    new = np.ones(n, dtype=bool)
+    new[1:] = x[1:] != x[:-1]
+    new[bounds[:-1][bounds[:-1] < n]] = True
+    keys = np.cumsum(new)
+
+    def cumulative(values):
+        csum = np.zeros((nboot, n + 1))
+        np.cumsum(values, axis=1, out=csum[:, 1:])
+        return csum
+
+    cw = cumulative(w)
+    start = cw[:, bounds[:-1]]
+    nseg = cw[:, bounds[1:]] - start
+
+    # Cumulative numbers of each resample are offset by row so all resamples can be searched at once,
+    # and elements are offset by row to index the flattened sums
+    woffset = (np.max(cw[:, -1]) + 1.0) * np.arange(nboot)[:, None]
+    offset = (n + 1) * np.arange(nboot)[:, None]
+
+    # Positions of the lower and upper edge of each bin in each resampled segment, as in nbinmaker
+    i = np.arange(nbin)
+    lower_rank = np.floor(i * nseg[..., None] / float(nbin))
+    upper_rank = np.floor((i + 1) * nseg[..., None] / float(nbin)) - 1
+
+    flat = (cw + woffset).ravel()
+
+    def element(rank):
+        target = start[..., None] + rank + woffset[..., None]
+        j = np.searchsorted(flat, target.ravel(), side="right").reshape(target.shape) - 1
+        return np.clip(j - offset[..., None], 0, n - 1)
+
+    jlower = element(lower_rank)
+    jupper = element(upper_rank)
+
+    # Elements of each bin are those with lower <= x < upper in the segment
+    first = np.searchsorted(keys, keys[jlower], side="left")
+    last = np.searchsorted(keys, keys[jupper], side="left")
+
+    def between(csum):
+        c = csum.ravel()
+        return c[last + offset[..., None]] - c[first + offset[..., None]]
+
+    x_lower = x[jlower]
+    x_upper = x[jupper]
+    removed = (x_lower == x_upper) | (nseg[..., None] == 0)
+
+    stats = {"x_lower": x_lower, "x_upper": x_upper}
+    stats["x_hist"] = between(cw)
+    stats["x_sum"] = between(cumulative(w * x))
+    if y is not None:
+        y = np.asarray(y, dtype=float)
+        stats["y_sum"] = between(cumulative(w * y))
+        stats["y2_sum"] = between(cumulative(w * y ** 2.0))
+
+    for name in stats:
+        stats[name] = np.where(removed, np.nan, stats[name])
+
+    return stats
+
+
+def resample_slopes(data, n, seed, nmax=2000000):
+    """
+  NAME:
+
+     resample_slopes
+
+  PURPOSE:
+
+     Find the slope and intercept of log(dN/dx) vs log(x) of bootstrap resamples of an array, with nbin bins
+     of equal number elements found for each resample (see dx_function)
+
+  INPUT:
+
+     data - x,nbin (sorted array and number of bins)
+
+     n - number of resamples
+
+     seed - seed of random number generator
+
+     nmax - largest number of resampled elements handled at once (default: 2e6)
+
+  OUTPUT:
+
+     array of slope,intercept of each resample
+
+  HISTORY:
+
+     2020 - Written - Webb (UofT)
+
+  """
+    x, nbin = data
+    rng = np.random.default_rng(seed)
+    nbatch = max(1, int(nmax // max(len(x), 1)))
+    results = []
+
+    for i in range(0, n, nbatch):
+        w = resample_weights(len(x), min(nbatch, n - i), rng)
+        stats = resampled_nbinmaker(x, w, nbin)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lx_mean = np.log10(stats["x_sum"] / stats["x_hist"])
+            ldx = np.log10(stats["x_hist"] / (stats["x_upper"] - stats["x_lower"]))
+
+        slope, intercept = fit_lines(lx_mean[:, 0], ldx[:, 0])
+        results.append(np.column_stack([slope, intercept]))
+
+    return np.concatenate(results)
+
+
+def resample_binned_slopes(data, n, seed):
+    """
+  NAME:
+
+     resample_binned_slopes
 
   PURPOSE:
 
-     Split an array into nbin bin's of equal size
+     Find the slope and intercept of log(dN/dx) vs log(x) of bootstrap resamples of an array in fixed bins
+     (see dx_function), drawing the number of elements in each bin of each resample at once
 
   INPUT:
 
-     x - input array
-
-     nbin - number of bins
+     data - x_mean,x_width,x_hist,ntot (mean and width of each bin, number of elements in each bin,
+            and total number of elements)
 
-     nsum - return number of points in each bin
+     n - number of resamples
 
-     steptype - linear or logarithmic steps
+     seed - seed of random number generator
 
   OUTPUT:
 
-     x_lower,x_mid,x_upper,x_hist (if nsum==False)
-
-     x_lower,x_mid,x_upper,x_hist,x_sum (if nsum==True)
+     array of slope,intercept of each resample
 
   HISTORY:
 
-     2018 - Written - Webb (UofT)
+     2020 - Written - Webb (UofT)
 
   """
+    x_mean, x_width, x_hist, ntot = data
+    rng = np.random.default_rng(seed)
 
-    x_hist = np.zeros(nbin)
-    x_sum = np.zeros(nbin)
-    x = np.array(x)
-
-    if steptype == "linear":
-        steps = np.linspace(np.amin(x), np.amax(x), nbin + 1)
-    else:
-        steps = np.logspace(np.log10(np.amin(x)), np.log10(np.amax(x)), nbin + 1)
-
-    x_lower = steps[:-1]
-    x_upper = steps[1:]
+    # Elements outside of every bin are the last group drawn
+    p = np.append(np.asarray(x_hist, dtype=float), 0.0) / float(ntot)
+    p[-1] = max(0.0, 1.0 - np.sum(p[:-1]))
+    counts = rng.multinomial(int(ntot), p / np.sum(p), size=n)[:, :-1]
 
-    x_mid = (x_upper + x_lower) / 2.0
+    with np.errstate(divide="ignore"):
+        ldx = np.log10(counts / np.asarray(x_width))
 
-    for j in range(0, nbin):
-        indx = (x >= x_lower[j]) * (x < x_upper[j])
-        x_hist[j] = len(x[indx])
-        x_sum[j] = np.sum(x[indx])
+    slope, intercept = fit_lines(np.log10(x_mean), ldx)
 
-    if nsum:
-        return x_lower, x_mid, x_upper, x_hist, x_sum
-    else:
-        return x_lower, x_mid, x_upper, x_hist
+    return np.column_stack([slope, intercept])
 
 
-def power_law_distribution_function(n, alpha, xmin, xmax):
+def resample_dispersion_slopes(data, n, seed, nmax=2000000):
     """
   NAME:
 
-     power_law_distribution_function
+     resample_dispersion_slopes
 
   PURPOSE:
 
-     Generate points from a power-law distribution function
+     Find the slope and intercept of log(standard deviation of y) vs log(x) of bootstrap resamples,
+     with nbin bins of equal number elements in x found for each resample (see eta_function)
+
   INPUT:
 
-     n - number of points
+     data - x,y,nbin (sorted array, values of each element and number of bins)
 
-     alpha - power-law slope of distribution function
+     n - number of resamples
 
-     xmin,xmax - minimum and maximum values of distribution
+     seed - seed of random number generator
+
+     nmax - largest number of resampled elements handled at once (default: 2e6)
 
   OUTPUT:
 
-     c
+     array of slope,intercept of each resample
 
   HISTORY:
 
-     2019 - Written - Webb (UofT)
+     2020 - Written - Webb (UofT)
+
   """
+    x, y, nbin = data
+    rng = np.random.default_rng(seed)
+    nbatch = max(1, int(nmax // max(len(x), 1)))
+    results = []
 
-    eta = alpha + 1.0
+    for i in range(0, n, nbatch):
+        w = resample_weights(len(x), min(nbatch, n - i), rng)
+        stats = resampled_nbinmaker(x, w, nbin, y=y)
 
-    if xmin == xmax:
-        x = xmin
-    elif alpha == 0:
-        x = xmin + np.random.random(n) * (xmax - xmin)
-    elif alpha > 0:
-        x = xmin + np.random.power(eta, n) * (xmax - xmin)
-    elif alpha < 0 and alpha != -1.0:
-        x = (xmin ** eta + (xmax ** eta - xmin ** eta) * np.random.rand(n)) ** (
-            1.0 / eta
-        )
-    elif alpha == -1:
-        x = np.log10(xmin) + np.random.random(n) * (np.log10(xmax) - np.log10(xmin))
-        x = 10.0 ** x
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lx_mean = np.log10(stats["x_sum"] / stats["x_hist"])
+            y_mean = stats["y_sum"] / stats["x_hist"]
+            y_sig = np.sqrt(np.maximum(stats["y2_sum"] / stats["x_hist"] - y_mean ** 2.0, 0.0))
+            ly_sig = np.log10(y_sig)
 
-    return np.array(x)
+        slope, intercept = fit_lines(lx_mean[:, 0], ly_sig[:, 0])
+        results.append(np.column_stack([slope, intercept]))
+
+    return np.concatenate(results)
 
 
-def dx_function(x, nx=10, bintype="num", x_lower=None, x_mean=None,x_upper=None, plot=False, **kwargs):
+def resample_profile_slopes(data, n, seed, nmax=2000000):
     """
   NAME:
 
-     dx_function
+     resample_profile_slopes
 
   PURPOSE:
 
-     Find distribution function using nx bins containing an equal number of points
+     Find the slope and intercept of a profile of the slopes of log(dN/dx) vs log(x) in each radial bin,
+     for bootstrap resamples of all elements, with radial bins kept and nbin bins of equal number elements
+     in x found for each resample and radial bin (see alpha_prof)
+
   INPUT:
 
-     x - input array
+     data - ntot,indx,x,bounds,lrprofn,nbin (total number of elements, index of the elements in radial
+            bins sorted by radial bin and x, their values of x, index of the first element of each radial bin
+            followed by len(x), log radius of each radial bin, and number of bins in x)
 
-     nx - number of bins
+     n - number of resamples
 
-     bintype - bin with equal number of stars per bin (bin) or evenly in x (fix) (default: num)
+     seed - seed of random number generator
 
-     x_lower,x_mean,x_upper - preset bins
+     nmax - largest number of resampled elements handled at once (default: 2e6)
 
   OUTPUT:
 
-     x_mean,x_hist,dx,alpha,ealpha,yalpha,eyalpha
-
+     array of slope,intercept of each resample
 
   HISTORY:
 
-     2018 - Written - Webb (UofT)
+     2020 - Written - Webb (UofT)
 
   """
+    ntot, indx, x, bounds, lrprofn, nbin = data
+    rng = np.random.default_rng(seed)
+    nbatch = max(1, int(nmax // max(ntot, 1)))
+    results = []
 
-    if x_lower is None:
-        if bintype == "num":
-            x_lower, x_mean, x_upper, x_hist = nbinmaker(x, nx)
-        else:
-            x_lower, x_mean, x_upper, x_hist = binmaker(x, nx)
-    else:
-        x_hist=np.array([])
-        for i in range(0, len(x_lower)):
-            indx = (x >= x_lower[i]) * (x < x_upper[i])
-            x_hist = np.append(x_hist, np.sum(indx))
-
-    lx_mean = np.log10(x_mean)
-    dx = x_hist / (x_upper - x_lower)
-    ldx = np.log10(dx)
-
-    (alpha, yalpha), V = np.polyfit(lx_mean, ldx, 1, cov=True)
-    ealpha = np.sqrt(V[0][0])
-    eyalpha = np.sqrt(V[1][1])
+    for i in range(0, n, nbatch):
+        w = resample_weights(ntot, min(nbatch, n - i), rng)[:, indx]
+        stats = resampled_nbinmaker(x, w, nbin, bounds=bounds)
 
-    if plot:
-            filename = kwargs.get("filename", None)
-            nplot(x_mean, np.log10(dx), xlabel="x", ylabel="LOG(dN/dx)", **kwargs)
-            xfit = np.linspace(np.min(x_mean), np.max(x_mean), nx)
-            dxfit = 10.0 ** (alpha * np.log10(xfit) + yalpha)
-            nlplot(
-                xfit, np.log10(dxfit), overplot=True, label=(r"$\alpha$ = %f" % alpha)
-            )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lx_mean = np.log10(stats["x_sum"] / stats["x_hist"])
+            ldx = np.log10(stats["x_hist"] / (stats["x_upper"] - stats["x_lower"]))
 
-            plt.legend()
+        aprof, yprof = fit_lines(lx_mean, ldx)
+        slope, intercept = fit_lines(lrprofn, aprof)
+        results.append(np.column_stack([slope, intercept]))
 
-            if filename != None:
-                plt.savefig(filename)
+    return np.concatenate(results)
 
-    return x_mean, x_hist, dx, alpha, ealpha, yalpha, eyalpha
 
 def x_hist(x, nx=10, bintype="num", x_lower=None, x_mean=None,x_upper=None):
     """
@@ -270,10 +1146,7 @@ def x_hist(x, nx=10, bintype="num", x_lower=None, x_mean=None,x_upper=None):
         else:
             x_lower, x_mean, x_upper, x_hist = binmaker(x, nx)
     else:
-        x_hist=np.array([])
-        for i in range(0, len(x_lower)):
-            indx = (x >= x_lower[i]) * (x < x_upper[i])
-            x_hist = np.append(x_hist, np.sum(indx))
+        x_hist = bin_stats(x, x_lower=x_lower, x_upper=x_upper)["x_hist"]
 
     return x_mean,x_hist
 
@@ -307,33 +1180,19 @@ def mean_prof(x, y, nbin=10, bintype="fix", steptype="linear", median=False):
      2018 - Written - Webb (UofT)
 
   """
-    if bintype == "num":
-        x_lower, x_mid, x_upper, x_hist = nbinmaker(x, nbin)
-    else:
-        x_lower, x_mid, x_upper, x_hist = binmaker(x, nbin, steptype=steptype)
+    stats = bin_stats(
+        x, y, nbin=nbin, bintype=bintype, steptype=steptype, median=median
+    )
 
-    y_bin = []
-    y_sig = []
-    x_bin = []
+    # Only bins with elements are returned
+    indx = stats["x_hist"] > 0
 
-    for i in range(0, nbin):
-        indx = (x >= x_lower[i]) * (x < x_upper[i])
-
-        if True in indx:
-            x_bin = np.append(x_bin, x_mid[i])
-            if x_hist[i] > 1:
-                if median:
-                    y_bin = np.append(y_bin, np.median(y[indx]))
-                else:
-                    y_bin = np.append(y_bin, np.mean(y[indx]))
-
-                y_sig = np.append(y_sig, np.std(y[indx]))
-            elif x_hist[i] == 1:
-                y_bin = np.append(y_bin, y[indx])
-                y_sig = np.append(y_sig, 0.0)
-            else:
-                y_bin = np.append(y_bin, 0.0)
-                y_sig = np.append(y_sig, 0.0)
+    x_bin = stats["x_mid"][indx]
+    if median:
+        y_bin = stats["y_median"][indx]
+    else:
+        y_bin = stats["y_mean"][indx]
+    y_sig = stats["y_sig"][indx]
 
     return np.array(x_bin), np.array(y_bin), np.array(y_sig)
 
@@ -379,40 +1238,19 @@ def smooth(x, y, nbin=10, bintype="fix", median=False, **kwargs):
         dx = float(kwargs.get("dx"))
         nbin = int((np.max(x) - np.min(x)) / dx)
 
-    if bintype == "num":
-        x_lower, x_mid, x_upper, x_hist = nbinmaker(x, nbin)
+    stats = bin_stats(x, y, nbin=nbin, bintype=bintype, median=median)
+
+    # Only bins with elements are returned
+    indx = stats["x_hist"] > 0
+
+    x_bin = stats["x_mid"][indx]
+    if median:
+        y_bin = stats["y_median"][indx]
     else:
-        x_lower, x_mid, x_upper, x_hist = binmaker(x, nbin)
-
-    y_bin = []
-    y_sig = []
-    x_bin = []
-    y_max = []
-    y_min = []
-
-    for i in range(0, nbin):
-        indx = (x >= x_lower[i]) * (x < x_upper[i])
-
-        if True in indx:
-            x_bin = np.append(x_bin, x_mid[i])
-            if x_hist[i] > 1:
-                if median:
-                    y_bin = np.append(y_bin, np.median(y[indx]))
-                else:
-                    y_bin = np.append(y_bin, np.mean(y[indx]))
-                y_sig = np.append(y_sig, np.std(y[indx]))
-                y_min = np.append(y_min, np.min(y[indx]))
-                y_max = np.append(y_max, np.max(y[indx]))
-            elif x_hist[i] == 1:
-                y_bin = np.append(y_bin, y[indx])
-                y_sig = np.append(y_sig, 0.0)
-                y_min = np.append(y_min, y[indx])
-                y_max = np.append(y_max, y[indx])
-            else:
-                y_bin = np.append(y_bin, 0.0)
-                y_sig = np.append(y_sig, 0.0)
-                y_min = np.append(y_min, 0.0)
-                y_max = np.append(y_max, 0.0)
+        y_bin = stats["y_mean"][indx]
+    y_sig = stats["y_sig"][indx]
+    y_min = stats["y_min"][indx]
+    y_max = stats["y_max"][indx]
 
     return x_bin, y_bin, y_sig, y_min, y_max
 
@@ -529,6 +1367,9 @@ def area_enclosed(
      nrand - number of random points to be generated in uniform distribution (Default: 1000)
 
      method - generate spherical or rectangular distribution of random points (Default: sphere)
+
+     full - kept for backwards compatibility, all random points are now matched to their nearest
+            point at once with a KD-tree
      
      plot - plot overlap (Default: False)
 
@@ -542,10 +1383,11 @@ def area_enclosed(
 
     """
 
+    tree = cKDTree(np.array([x, y]).T)
+
     if thresh is None:
-        z = np.zeros(len(x))
-        rmin = minimum_distance(np.array([x, y, z]).T)
-        thresh = np.amax(rmin)
+        rmin, nindx = tree.query(tree.data, k=2)
+        thresh = np.amax(rmin[:, 1])
 
     if method == "rectangle":
         xmin, xmax = np.amin(x), np.amax(x)
@@ -579,21 +1421,7 @@ def area_enclosed(
         xrand = rrand * np.cos(phirand)
         yrand = rrand * np.sin(phirand)
 
-    drmin = np.array([])
-    if full:
-        xrfull = np.tile(xrand, len(x))
-        yrfull = np.tile(yrand, len(x))
-
-        xfull = np.repeat(x, nrand)
-        yfull = np.repeat(y, nrand)
-
-        dr = np.sqrt((xrfull - xfull) ** 2.0 + (yrfull - yfull) ** 2.0)
-        dr = dr.reshape(len(x), nrand)
-        drmin = np.amin(dr, 0)
-    else:
-        for i in range(0, nrand):
-            dr = np.sqrt((xrand[i] - x) ** 2.0 + (yrand[i] - y) ** 2.0)
-            drmin = np.append(drmin, np.amin(dr))
+    drmin, nindx = tree.query(np.array([xrand, yrand]).T)
 
     indx = drmin < thresh
 
@@ -609,7 +1437,218 @@ def area_enclosed(
     return area
 
 
-@numba.njit
+def pairwise_block_size(n, block_size=None, max_memory=6.4e7):
+    """
+    NAME:
+
+       pairwise_block_size
+
+    PURPOSE:
+
+       Find the number of stars per block when summing over pairs of stars in blocks
+       --> A block of b x b pairs needs a few temporary b x b float64 arrays
+
+    INPUT:
+
+       n - number of stars
+
+       block_size - requested block size (default: None, set by max_memory)
+
+       max_memory - maximum memory in bytes to use for the temporary arrays of a block (default: 6.4e7)
+
+    OUTPUT:
+
+       block_size
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+    """
+    if block_size is None:
+        block_size = int(np.sqrt(max_memory / (4.0 * 8.0)))
+
+    return int(max(1, min(block_size, n)))
+
+
+def pairwise_distance_blocks(x, block_size=None, max_memory=6.4e7):
+    """
+    NAME:
+
+       pairwise_distance_blocks
+
+    PURPOSE:
+
+       Step through the distances between all pairs of points in blocks of i x j points,
+       only visiting blocks with j >= i. In diagonal blocks (i0 == j0) every pair appears twice
+       and the distance of a point to itself is set to infinity
+
+    INPUT:
+
+       x=[x,y,z].T
+
+       block_size - number of points per block (default: None, set by max_memory)
+
+       max_memory - maximum memory in bytes to use per block (default: 6.4e7)
+
+    OUTPUT:
+
+       generator of (i0,i1,j0,j1,dr), where dr[k,l] is the distance between point i0+k and point j0+l
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+    """
+    x = np.asarray(x, dtype=float)
+    n = len(x)
+    nb = pairwise_block_size(n, block_size, max_memory)
+
+    for i0 in range(0, n, nb):
+        i1 = min(i0 + nb, n)
+        for j0 in range(i0, n, nb):
+            j1 = min(j0 + nb, n)
+
+            dr2 = np.zeros((i1 - i0, j1 - j0))
+            for k in range(x.shape[1]):
+                dx = x[i0:i1, k][:, np.newaxis] - x[j0:j1, k][np.newaxis, :]
+                dr2 += dx * dx
+            dr = np.sqrt(dr2)
+
+            if i0 == j0:
+                np.fill_diagonal(dr, np.inf)
+
+            yield i0, i1, j0, j1, dr
+
+
+def blocked_potential_energy(x, m, softening=0.0, block_size=None, max_memory=6.4e7):
+    """
+    NAME:
+
+       blocked_potential_energy
+
+    PURPOSE:
+
+       Find potential energy for each star in a cluster using blocks of vectorized numpy operations
+       --> Without softening, pairs of stars at the same position are skipped
+
+    INPUT:
+
+       x=[x,y,z].T
+
+       m - masses
+
+       softening - Plummer softening length (default: 0.0)
+
+       block_size - number of stars per block (default: None, set by max_memory)
+
+       max_memory - maximum memory in bytes to use per block (default: 6.4e7)
+
+    OUTPUT:
+
+       energy
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+    """
+    m = np.asarray(m, dtype=float)
+    energy = np.zeros(len(m))
+
+    for i0, i1, j0, j1, dr in pairwise_distance_blocks(x, block_size, max_memory):
+        # The distance of each star to itself is infinite, so only pairs at the same position
+        # need to be skipped, and only without softening
+        if softening > 0.0:
+            rinv = 1.0 / np.sqrt(dr ** 2.0 + softening ** 2.0)
+        else:
+            rinv = np.zeros(dr.shape)
+            indx = dr > 0.0
+            rinv[indx] = 1.0 / dr[indx]
+
+        energy[i0:i1] += np.dot(rinv, m[j0:j1])
+        if i0 != j0:
+            energy[j0:j1] += np.dot(m[i0:i1], rinv)
+
+    return -m * energy
+
+
+def blocked_weighted_inverse_distance_sum(
+    x, m, block_size=None, max_memory=6.4e7
+):
+    """
+    NAME:
+
+       blocked_weighted_inverse_distance_sum
+
+    PURPOSE:
+
+       Find the sum of the mass weighted inverse distance between all pairs of stars using
+       blocks of vectorized numpy operations
+
+    INPUT:
+
+       x=[x,y,z].T
+
+       m - masses
+
+       block_size - number of stars per block (default: None, set by max_memory)
+
+       max_memory - maximum memory in bytes to use per block (default: 6.4e7)
+
+    OUTPUT:
+
+       weighted inverse distance sum
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+    """
+    m = np.asarray(m, dtype=float)
+    weighted_sum = 0.0
+
+    for i0, i1, j0, j1, dr in pairwise_distance_blocks(x, block_size, max_memory):
+        partial_sum = np.dot(m[i0:i1], np.dot(1.0 / dr, m[j0:j1]))
+        if i0 == j0:
+            partial_sum *= 0.5
+        weighted_sum += partial_sum
+
+    return weighted_sum
+
+
+def blocked_minimum_distance(x, block_size=None, max_memory=6.4e7):
+    """
+    NAME:
+
+       blocked_minimum_distance
+
+    PURPOSE:
+
+       Find distance to each point's nearest neighbour using blocks of vectorized numpy operations
+
+    INPUT:
+
+       x=[x,y,z].T
+
+       block_size - number of points per block (default: None, set by max_memory)
+
+       max_memory - maximum memory in bytes to use per block (default: 6.4e7)
+
+    OUTPUT:
+
+       distance to nearest neighbour
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+    """
+    min_distance = np.full(len(x), np.inf)
+
+    for i0, i1, j0, j1, dr in pairwise_distance_blocks(x, block_size, max_memory):
+        min_distance[i0:i1] = np.minimum(min_distance[i0:i1], np.amin(dr, axis=1))
+        if i0 != j0:
+            min_distance[j0:j1] = np.minimum(min_distance[j0:j1], np.amin(dr, axis=0))
+
+    return min_distance
+
+
 def minimum_distance(x):
     """
     NAME:
@@ -619,6 +1658,7 @@ def minimum_distance(x):
     PURPOSE:
 
        Find distance to each point's nearest neighbour
+       --> Uses a KD-tree, so the cost scales as O(N log N)
 
     INPUT:
 
@@ -632,21 +1672,12 @@ def minimum_distance(x):
 
        2019 - Written - Webb (UofT)
     """
-    min_distance = [-1.0] * len(x)
-    for i in range(len(x) - 1):
-        for j in range(i + 1, len(x)):
-            r = distance(x[i], x[j])
-            if min_distance[i] < 0:
-                min_distance[i] = r
-            else:
-                min_distance[i] = np.minimum(min_distance[i], r)
+    x = np.asarray(x, dtype=float)
+    tree = cKDTree(x)
+    # Each point is its own closest neighbour, so take the second closest
+    dist, nindx = tree.query(x, k=2)
 
-            if min_distance[j] < 0:
-                min_distance[j] = r
-            else:
-                min_distance[j] = np.minimum(min_distance[j], r)
-
-    return min_distance
+    return dist[:, 1]
 
 
 @numba.njit
@@ -681,3 +1712,131 @@ def distance(x1, x2):
     r = (dx * dx + dy * dy + dz * dz) ** 0.5
 
     return r
+
+
+@numba.njit
+def shrinking_sphere_centre(m, x, y, z, vx, vy, vz, rmin, nmax=100, nmin=100):
+    """
+    NAME:
+
+       shrinking_sphere_centre
+
+    PURPOSE:
+
+       Find the centre of density of a collection of points with a shrinking sphere, where the
+       centre of mass of all points within rlim is found and rlim is reduced by 20 percent each iteration
+       --> Points are sorted by their distance from a reference centre, and cumulative sums of mass weighted
+           positions and velocities are kept. After the centre has moved a distance s from the reference,
+           points closer than rlim-s are all inside the sphere and are summed with a single lookup, so only
+           points between rlim-s and rlim+s need to be checked. Points are re-sorted about the current centre
+           once s becomes large compared to rlim, keeping only points that can fall in a later sphere.
+       --> Gives the same centre as the masking approach in StarCluster.find_centre_of_density to within round-off
+
+    INPUT:
+
+       m - masses
+
+       x,y,z - positions relative to the starting centre
+
+       vx,vy,vz - velocities relative to the starting centre
+
+       rmin - minimum radius of the sphere
+
+       nmax - maximum number of iterations (default: 100)
+
+       nmin - stop once the sphere contains nmin stars or fewer (default: 100)
+
+    OUTPUT:
+
+       xdc,ydc,zdc,vxdc,vydc,vzdc - centre relative to the starting centre
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+    """
+    xdc, ydc, zdc = 0.0, 0.0, 0.0
+    vxdc, vydc, vzdc = 0.0, 0.0, 0.0
+
+    rlim = np.sqrt(np.amax(x ** 2.0 + y ** 2.0 + z ** 2.0))
+    n = 0
+
+    cand = np.arange(len(m))
+    xref, yref, zref = 0.0, 0.0, 0.0
+    rkeep = 2.0 * rlim
+    resort = True
+
+    while (rlim > rmin) and (n < nmax):
+        if resort:
+            # Sorted stars only cover rkeep about the old reference, start from all stars if that is not enough
+            s = np.sqrt((xdc - xref) ** 2.0 + (ydc - yref) ** 2.0 + (zdc - zref) ** 2.0)
+            if s + 2.0 * rlim > rkeep:
+                cand = np.arange(len(m))
+
+            xref, yref, zref = xdc, ydc, zdc
+
+            r = np.sqrt(
+                (x[cand] - xref) ** 2.0 + (y[cand] - yref) ** 2.0 + (z[cand] - zref) ** 2.0
+            )
+            order = np.argsort(r)
+            r = r[order]
+            cand = cand[order]
+
+            rkeep = 2.0 * rlim
+            ncand = np.searchsorted(r, rkeep * (1.0 + 1.0e-10), side="right")
+            r = r[:ncand]
+            cand = cand[:ncand]
+
+            msum = np.zeros(ncand + 1)
+            xsum, ysum, zsum = np.zeros(ncand + 1), np.zeros(ncand + 1), np.zeros(ncand + 1)
+            vxsum, vysum, vzsum = np.zeros(ncand + 1), np.zeros(ncand + 1), np.zeros(ncand + 1)
+            for k in range(ncand):
+                i = cand[k]
+                msum[k + 1] = msum[k] + m[i]
+                xsum[k + 1] = xsum[k] + m[i] * x[i]
+                ysum[k + 1] = ysum[k] + m[i] * y[i]
+                zsum[k + 1] = zsum[k] + m[i] * z[i]
+                vxsum[k + 1] = vxsum[k] + m[i] * vx[i]
+                vysum[k + 1] = vysum[k] + m[i] * vy[i]
+                vzsum[k + 1] = vzsum[k] + m[i] * vz[i]
+
+            resort = False
+
+        # Distance the centre has moved since stars were sorted
+        s = np.sqrt((xdc - xref) ** 2.0 + (ydc - yref) ** 2.0 + (zdc - zref) ** 2.0)
+
+        lo = np.searchsorted(r, (rlim - s) * (1.0 - 1.0e-10))
+        hi = np.searchsorted(r, (rlim + s) * (1.0 + 1.0e-10), side="right")
+
+        nc = lo
+        mc = msum[lo]
+        xc, yc, zc = xsum[lo], ysum[lo], zsum[lo]
+        vxc, vyc, vzc = vxsum[lo], vysum[lo], vzsum[lo]
+
+        for k in range(lo, hi):
+            i = cand[k]
+            r2 = (x[i] - xdc) ** 2.0 + (y[i] - ydc) ** 2.0 + (z[i] - zdc) ** 2.0
+            if r2 < rlim ** 2:
+                nc += 1
+                mc += m[i]
+                xc += m[i] * x[i]
+                yc += m[i] * y[i]
+                zc += m[i] * z[i]
+                vxc += m[i] * vx[i]
+                vyc += m[i] * vy[i]
+                vzc += m[i] * vz[i]
+
+        if (mc > 0) and (nc > nmin):
+            xdc, ydc, zdc = xc / mc, yc / mc, zc / mc
+            vxdc, vydc, vzdc = vxc / mc, vyc / mc, vzc / mc
+        else:
+            break
+
+        rlim *= 0.8
+        n += 1
+
+        s = np.sqrt((xdc - xref) ** 2.0 + (ydc - yref) ** 2.0 + (zdc - zref) ** 2.0)
+        # Re-sorting keeps rlim+s below rkeep and stops the band of stars that need checking from growing
+        if s > 0.5 * rlim:
+            resort = True
+
+    return xdc, ydc, zdc, vxdc, vydc, vzdc
@@ -0,0 +1,405 @@
+# Binary tables of values found for each snapshot of a simulation
+
+import numpy as np
+import os
+import json
+
+
+class TableWriter(object):
+    """
+    NAME:
+
+       TableWriter
+
+    PURPOSE:
+
+       Write values found for each snapshot (e.g. by extrct_out) to a binary table that can be appended to
+       --> The table has a fixed set of columns, each holding a value or an array of values per row.
+           If columns are not given, they are set by the first row written (or by declare_columns)
+       --> Missing values are written as NaN, as are missing elements of arrays shorter than their column.
+           Arrays longer than their column raise a ValueError, so columns holding arrays whose length can
+           change from row to row (e.g. profiles) should be given their largest width
+       --> Rows are kept in memory and written in chunks of chunksize rows (and when the table is flushed or closed)
+       --> The file starts with a header line giving the columns, followed by rows of float64 values
+       --> Tables are read with read_table
+
+    INPUT:
+
+       filename - name of file
+
+       columns - list of column names, or (name,width) for columns holding width values per row (default: None)
+
+       chunksize - number of rows kept in memory before they are written (default: 1000)
+
+       append - add rows to the end of an existing file, using its columns (default: True)
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+
+    def __init__(self, filename, columns=None, chunksize=1000, append=True):
+
+        self.filename = filename
+        self.chunksize = chunksize
+        self.names = []
+        self.widths = []
+        self.rows = None
+        self.nrows = 0
+
+        if append and os.path.isfile(filename) and os.path.getsize(filename) > 0:
+            names, widths, header_size, nrows = read_table_header(filename)
+            if columns is not None and table_columns(columns) != (names, widths):
+                print("COLUMNS DIFFER FROM EXISTING TABLE, USING COLUMNS OF ", filename)
+            self.set_columns(list(zip(names, widths)))
+
+            # Remove an incomplete row left by an interrupted write
+            size = header_size + nrows * self.rowsize * 8
+            if os.path.getsize(filename) != size:
+                with open(filename, "r+b") as fileout:
+                    fileout.truncate(size)
+
+            self.fileout = open(filename, "ab")
+        else:
+            self.fileout = open(filename, "wb")
+            if columns is not None:
+                self.set_columns(columns)
+                self.write_header()
+
+    def set_columns(self, columns):
+        """
+        NAME:
+
+           set_columns
+
+        PURPOSE:
+
+           Set the columns of the table
+
+        INPUT:
+
+           columns - list of column names, or (name,width) for columns holding width values per row
+
+        OUTPUT:
+
+           None
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        self.names, self.widths = table_columns(columns)
+        self.starts = np.append(0, np.cumsum(self.widths)).astype(int)
+        self.rowsize = int(self.starts[-1])
+        self.rows = np.full((self.chunksize, self.rowsize), np.nan)
+        self.nrows = 0
+
+    def declare_columns(self, columns):
+        """
+        NAME:
+
+           declare_columns
+
+        PURPOSE:
+
+           Set the columns of the table if they have not been set yet, so they are not set by the first
+           row written (e.g. by writers of profiles, whose length can change from row to row)
+
+        INPUT:
+
+           columns - list of column names, or (name,width) for columns holding width values per row
+
+        OUTPUT:
+
+           None
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        if len(self.names) == 0:
+            self.set_columns(columns)
+            self.write_header()
+        elif table_columns(columns) != (self.names, self.widths):
+            print("COLUMNS DIFFER FROM EXISTING TABLE, USING COLUMNS OF ", self.filename)
+
+    def write_header(self):
+        header = json.dumps(
+            {"columns": [[name, width] for name, width in zip(self.names, self.widths)]}
+        )
+        self.fileout.write((header + "\n").encode())
+
+    def write(self, values):
+        """
+        NAME:
+
+           write
+
+        PURPOSE:
+
+           Add a row to the table
+
+        INPUT:
+
+           values - dictionary of column names and values (missing columns are set to NaN)
+
+        OUTPUT:
+
+           None
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        if len(self.names) == 0:
+            self.set_columns([(name, np.size(values[name])) for name in values])
+            self.write_header()
+
+        row = self.rows[self.nrows]
+        row[:] = np.nan
+
+        for name in values:
+            if name not in self.names:
+                print("NO COLUMN NAMED ", name, " IN ", self.filename)
+                continue
+
+            i = self.names.index(name)
+            if values[name] is None:
+                continue
+
+            value = np.asarray(values[name], dtype=float).ravel()
+            if len(value) > self.widths[i]:
+                raise ValueError(
+                    "%d VALUES OF %s DO NOT FIT IN ITS COLUMN OF WIDTH %d IN %s"
+                    % (len(value), name, self.widths[i], self.filename)
+                )
+            row[self.starts[i] : self.starts[i] + len(value)] = value
+
+        self.nrows += 1
+        if self.nrows == self.chunksize:
+            self.flush()
+
+    def write_rows(self, values):
+        """
+        NAME:
+
+           write_rows
+
+        PURPOSE:
+
+           Add many rows to the table at once
+
+        INPUT:
+
+           values - dictionary of column names and arrays of values, one per row (or one array per row for
+                    columns with width > 1)
+
+        OUTPUT:
+
+           None
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        if len(self.names) == 0:
+            self.set_columns(
+                [(name, int(np.prod(np.shape(values[name])[1:]))) for name in values]
+            )
+            self.write_header()
+
+        self.flush()
+
+        nrows = max([len(values[name]) for name in values])
+        rows = np.full((nrows, self.rowsize), np.nan)
+
+        for name in values:
+            if name not in self.names:
+                print("NO COLUMN NAMED ", name, " IN ", self.filename)
+                continue
+
+            i = self.names.index(name)
+            value = np.asarray(values[name], dtype=float).reshape(len(values[name]), -1)
+            if value.shape[1] > self.widths[i]:
+                raise ValueError(
+                    "%d VALUES OF %s DO NOT FIT IN ITS COLUMN OF WIDTH %d IN %s"
+                    % (value.shape[1], name, self.widths[i], self.filename)
+                )
+            width = value.shape[1]
+            rows[: len(value), self.starts[i] : self.starts[i] + width] = value
+
+        self.fileout.write(rows.tobytes())
+
+    def flush(self):
+        """
+        NAME:
+
+           flush
+
+        PURPOSE:
+
+           Write rows kept in memory to the file
+
+        INPUT:
+
+           None
+
+        OUTPUT:
+
+           None
+
+        HISTORY:
+
+           2020 - Written - Webb (UofT)
+
+        """
+        if self.nrows > 0:
+            self.fileout.write(self.rows[: self.nrows].tobytes())
+            self.nrows = 0
+        self.fileout.flush()
+
+    def close(self):
+        if not self.fileout.closed:
+            self.flush()
+            self.fileout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except:
+            pass
+
+
+def table_columns(columns):
+    """
+    NAME:
+
+       table_columns
+
+    PURPOSE:
+
+       Split a list of columns of a table into names and widths
+
+    INPUT:
+
+       columns - list of column names, or (name,width) for columns holding width values per row
+
+    OUTPUT:
+
+       names,widths
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    names = []
+    widths = []
+    for column in columns:
+        if isinstance(column, str):
+            names.append(column)
+            widths.append(1)
+        else:
+            names.append(str(column[0]))
+            widths.append(int(column[1]))
+
+    return names, widths
+
+
+def read_table_header(filename):
+    """
+    NAME:
+
+       read_table_header
+
+    PURPOSE:
+
+       Read the columns of a table written by TableWriter
+
+    INPUT:
+
+       filename - name of file
+
+    OUTPUT:
+
+       names,widths,header_size,nrows - header_size is the size of the header in bytes,
+                                        nrows is the number of complete rows
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    with open(filename, "rb") as filein:
+        header = filein.readline()
+
+    names, widths = table_columns(json.loads(header.decode())["columns"])
+    nrows = (os.path.getsize(filename) - len(header)) // (8 * int(np.sum(widths)))
+
+    return names, widths, len(header), nrows
+
+
+def read_table(filename, columns=None, mmap=False):
+    """
+    NAME:
+
+       read_table
+
+    PURPOSE:
+
+       Read a table written by TableWriter
+       --> An incomplete last row, left by an interrupted write, is ignored
+
+    INPUT:
+
+       filename - name of file
+
+       columns - names of columns to return (default: None, all columns)
+
+       mmap - memory-map the file instead of reading it (default: False)
+
+    OUTPUT:
+
+       table - dictionary of column names and arrays (of shape (nrows,width) for columns with width > 1)
+
+    HISTORY:
+
+       2020 - Written - Webb (UofT)
+
+    """
+    names, widths, header_size, nrows = read_table_header(filename)
+    rowsize = int(np.sum(widths))
+
+    if mmap:
+        data = np.memmap(
+            filename, dtype=float, mode="r", offset=header_size, shape=(nrows, rowsize)
+        )
+    else:
+        data = np.fromfile(
+            filename, dtype=float, count=nrows * rowsize, offset=header_size
+        ).reshape(nrows, rowsize)
+
+    if columns is None:
+        columns = names
+
+    starts = np.append(0, np.cumsum(widths)).astype(int)
+    table = {}
+    for name in columns:
+        i = names.index(name)
+        if widths[i] == 1:
+            table[name] = data[:, starts[i]]
+        else:
+            table[name] = data[:, starts[i] : starts[i + 1]]
+
+    return table